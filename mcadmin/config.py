@@ -1,4 +1,5 @@
 import logging
+import os
 from configparser import ConfigParser
 
 _LOGGER = logging.getLogger(__name__)
@@ -6,10 +7,30 @@ _CONFIG_PATH = 'config.ini'
 
 # Sections
 _SECT_MAIN = 'MAIN'
+# Prefix of the sections of the server instances, followed by the ID of the instance: [server:<id>]
+_SECT_SERVER_PREFIX = 'server:'
 
 # Fields
 # [MAIN]
 _F_USE_JAR = 'use_server_jar'
+_F_STREAM_HOST = 'stream_host'
+_F_STREAM_PORT = 'stream_port'
+_F_JAR_STORE = 'jar_store'
+_F_JAR_STORE_KEEP_UNUSED = 'jar_store_keep_unused'
+_F_JAR_STORE_PARALLEL = 'jar_store_parallel_downloads'
+_F_SERVER_LIST_SOURCE = 'server_list_source'
+_F_SERVER_LIST_TTL = 'server_list_ttl'
+# [server:<id>]
+_F_DIRECTORY = 'directory'
+# _F_USE_JAR
+
+# Instance used when no server sections are configured. It keeps the directory and jar MCAdmin used before it could
+# manage more than one server.
+DEFAULT_SERVER_ID = 'default'
+_DEFAULT_SERVER_DIR = 'server_files'
+
+# Directory that the instances without a configured directory are kept in, in a subdirectory named after their ID
+_SERVERS_DIR = 'servers'
 
 
 class Config:
@@ -18,7 +39,14 @@ class Config:
         self._path = path
         self._config = ConfigParser()
         self._config[_SECT_MAIN] = {
-            _F_USE_JAR: ''
+            _F_USE_JAR: '',
+            _F_STREAM_HOST: '127.0.0.1',
+            _F_STREAM_PORT: '5001',
+            _F_JAR_STORE: 'jars',
+            _F_JAR_STORE_KEEP_UNUSED: '5',
+            _F_JAR_STORE_PARALLEL: '1',
+            _F_SERVER_LIST_SOURCE: 'https://web.archive.org/web/20190130100707/https://mcversions.net/',
+            _F_SERVER_LIST_TTL: '86400',
         }
 
     def load(self):
@@ -36,11 +64,83 @@ class Config:
         if save:
             self.save()
 
-    def set_use_jar(self, value, **kwargs):
-        self._set(_SECT_MAIN, _F_USE_JAR, value, **kwargs)
+    def get_jar_store_dir(self):
+        """
+        :return str: Directory of the jar store shared by every server
+        """
+        return self._config[_SECT_MAIN][_F_JAR_STORE]
+
+    def get_jar_store_keep_unused(self):
+        """
+        :return int: Amount of jars that no server uses to keep in the jar store
+        """
+        return int(self._config[_SECT_MAIN][_F_JAR_STORE_KEEP_UNUSED])
+
+    def get_jar_store_parallel(self):
+        """
+        :return int: Amount of ranges of a server executable to download at once. Downloads are sequential if 1.
+        """
+        return max(1, int(self._config[_SECT_MAIN][_F_JAR_STORE_PARALLEL]))
+
+    def get_server_list_source(self):
+        """
+        :return str: URL or path of the list of server executables: an HTML page of download links or a JSON version
+                     manifest
+        """
+        return self._config[_SECT_MAIN][_F_SERVER_LIST_SOURCE]
+
+    def get_server_list_ttl(self):
+        """
+        :return int: Amount of seconds after which the list of server executables is checked for changes
+        """
+        return int(self._config[_SECT_MAIN][_F_SERVER_LIST_TTL])
+
+    def server_ids(self):
+        """
+        :return list: IDs of the configured server instances, in the order they are configured
+        """
+        ids = [section[len(_SECT_SERVER_PREFIX):] for section in self._config.sections()
+               if section.startswith(_SECT_SERVER_PREFIX)]
+        return ids or [DEFAULT_SERVER_ID]
+
+    def _server_section(self, server_id):
+        """
+        :return str: Name of the section of a server instance. The section, and the fields missing from it, are created
+                     with their defaults.
+        """
+        section = _SECT_SERVER_PREFIX + server_id
+        if section not in self._config:
+            self._config[section] = {}
+        if server_id == DEFAULT_SERVER_ID:
+            defaults = {_F_DIRECTORY: _DEFAULT_SERVER_DIR, _F_USE_JAR: self._config[_SECT_MAIN][_F_USE_JAR]}
+        else:
+            defaults = {_F_DIRECTORY: os.path.join(_SERVERS_DIR, server_id), _F_USE_JAR: ''}
+        for field, value in defaults.items():
+            self._config[section].setdefault(field, value)
+        return section
+
+    def get_server_dir(self, server_id):
+        return self._config[self._server_section(server_id)][_F_DIRECTORY]
+
+    def set_use_jar(self, server_id, value, **kwargs):
+        self._set(self._server_section(server_id), _F_USE_JAR, value, **kwargs)
+
+    def get_use_jar(self, server_id):
+        return self._config[self._server_section(server_id)][_F_USE_JAR]
+
+    def get_stream_host(self):
+        """
+        :return str: Address the asyncio streaming tier binds to. Only local pages can reach it unless this is set to
+                     a wider address, such as 0.0.0.0.
+        """
+        return self._config[_SECT_MAIN][_F_STREAM_HOST]
 
-    def get_use_jar(self):
-        return self._config[_SECT_MAIN][_F_USE_JAR]
+    def get_stream_port(self):
+        """
+        :return int or None: Port of the asyncio streaming tier, or None if the tier is disabled.
+        """
+        port = self._config[_SECT_MAIN][_F_STREAM_PORT]
+        return int(port) if port else None
 
 
 CONFIG = Config(_CONFIG_PATH)
@@ -1,5 +1,14 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, validators
+from wtforms import StringField, validators, ValidationError
+
+from mcadmin.io.files.banned_players import parse_duration
+
+
+def _validate_duration(form, field):
+    try:
+        parse_duration(field.data)
+    except ValueError:
+        raise ValidationError('Please enter a duration such as 30m, 12h, 7d or 1w 2d, or nothing for a permanent ban.')
 
 
 class BanPlayerForm(FlaskForm):
@@ -13,6 +22,12 @@ class BanPlayerForm(FlaskForm):
         validators=[
             validators.Length(-1, 300, 'Please limit the ban reason to 300 characters.')
         ])
+    duration = StringField(
+        'Duration',
+        validators=[
+            validators.Optional(),
+            _validate_duration
+        ])
 
 
 class PardonPlayerForm(FlaskForm):
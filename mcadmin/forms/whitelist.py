@@ -1,5 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, validators
+from flask_wtf.file import FileField, FileRequired
+from wtforms import StringField, SelectField, validators
 
 OPERATION_ADD = 'add',
 OPERATION_REMOVE = 'remove'
@@ -12,3 +13,23 @@ class WhitelistForm(FlaskForm):
             validators.DataRequired('Please specify a name.')
         ]
     )
+
+
+class WhitelistImportForm(FlaskForm):
+    file = FileField(
+        'File',
+        validators=[
+            FileRequired('Please choose a file to import.')
+        ]
+    )
+    format = SelectField(
+        'Format',
+        choices=[
+            ('', 'From the file extension'),
+            ('csv', 'CSV (name,uuid)'),
+            ('txt', 'One name per line'),
+            ('json', 'JSON'),
+        ],
+        # Checked by the route, which also accepts a missing format
+        validate_choice=False
+    )
@@ -0,0 +1,280 @@
+"""
+Downloads large files, such as server executables, over HTTP.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import requests
+
+_LOGGER = logging.getLogger(__name__)
+
+# Amount of bytes written at once
+_CHUNK_SIZE = 64 * 1024
+
+# Default maximum amount of times a download is attempted before giving up
+_MAX_ATTEMPTS = 3
+
+# Maximum amount of seconds to wait between attempts
+_MAX_BACKOFF_SECONDS = 10
+
+# Seconds to wait for the server to connect or send data before an attempt fails
+_TIMEOUT = 30
+
+# Files smaller than this are not split into parallel ranges
+_MIN_PARALLEL_SIZE = 4 * 1024 * 1024
+
+# Suffix of the file a download is written to until it is complete and verified
+_PART_EXT = '.part'
+
+
+class DownloadError(IOError):
+    """
+    Raised when a file could not be downloaded.
+    """
+
+
+class IntegrityError(DownloadError):
+    """
+    Raised when a downloaded file does not have the expected size or hash.
+    """
+
+
+def download(url, dest, sha1=None, size=None, parallel=1, attempts=_MAX_ATTEMPTS, progress=None):
+    """
+    Downloads a file.
+
+    The file is streamed to `<dest>.part` in chunks, so it is never held in memory. If the connection fails, the next
+    attempt resumes where the last one stopped with a Range request; a `.part` file left by an earlier run is resumed
+    the same way. Once complete, the file is checked against `sha1` and `size` and then renamed to `dest`, so `dest`
+    only ever holds a complete file.
+
+    :param str url: URL of the file
+    :param str dest: Path to write the file to
+    :param str sha1: Expected SHA-1 of the file, in hex. Not checked if None.
+    :param int size: Expected size of the file in bytes. Not checked if None, unless the server sends a Content-Length.
+    :param int parallel: Amount of ranges to download at once. Only used if the server supports Range requests and the
+                         file is large enough; the download is sequential otherwise.
+    :param int attempts: Maximum amount of attempts
+    :param progress: Function called with (bytes downloaded, total bytes or None) as the download advances
+    :raises DownloadError: If the file could not be downloaded in `attempts` attempts
+    :raises IntegrityError: If the downloaded file does not match `sha1` or `size`
+    """
+    part = dest + _PART_EXT
+    reporter = _Progress(progress)
+
+    if parallel > 1:
+        total = _parallel_size(url)
+        if total is not None and (size is None or size == total):
+            _download_parallel(url, part, total, parallel, attempts, reporter)
+            try:
+                _finish(part, dest, sha1, total)
+            except IntegrityError:
+                os.remove(part)
+                raise
+            return
+
+    resumed = os.path.exists(part)
+    total = _download_sequential(url, part, attempts, reporter)
+    try:
+        _finish(part, dest, sha1, size if size is not None else total)
+    except IntegrityError as e:
+        os.remove(part)
+        if not resumed:
+            raise
+        # The part file left by an earlier run may have been corrupt, or of another file; start over once.
+        _LOGGER.warning('%s; downloading %s again from the start' % (e, url))
+        total = _download_sequential(url, part, attempts, reporter)
+        _finish(part, dest, sha1, size if size is not None else total)
+
+
+def _finish(part, dest, sha1, size):
+    """
+    Verifies a completely downloaded file and moves it into place.
+
+    :raises IntegrityError: If the file does not match
+    """
+    actual_size = os.path.getsize(part)
+    if size is not None and actual_size != size:
+        raise IntegrityError('Expected %d bytes but got %d' % (size, actual_size))
+
+    if sha1 is not None:
+        digest = hashlib.sha1()
+        with open(part, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        if digest.hexdigest().lower() != sha1.lower():
+            raise IntegrityError('Expected SHA-1 %s but got %s' % (sha1, digest.hexdigest()))
+
+    os.replace(part, dest)
+
+
+def _backoff(attempt):
+    time.sleep(min(2 ** attempt, _MAX_BACKOFF_SECONDS))
+
+
+def _download_sequential(url, part, attempts, reporter):
+    """
+    Downloads a file to `part`, resuming from what it already holds.
+
+    :return int or None: Size of the file according to the server, if it said
+    """
+    total = None
+    for attempt in range(attempts):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': 'bytes=%d-' % offset} if offset else {}
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=_TIMEOUT) as response:
+                if response.status_code == 416:
+                    # Nothing left to download past the end of the part file
+                    return total
+                response.raise_for_status()
+
+                if response.status_code == 206:
+                    total = _content_range_total(response.headers.get('Content-Range'))
+                    mode = 'ab'
+                else:
+                    # The server ignored the Range header and sent the whole file.
+                    offset = 0
+                    mode = 'wb'
+                    length = response.headers.get('Content-Length')
+                    total = int(length) if length and length.isdigit() else None
+
+                reporter.set(offset, total)
+                with open(part, mode) as f:
+                    for chunk in response.iter_content(_CHUNK_SIZE):
+                        f.write(chunk)
+                        reporter.add(len(chunk))
+            return total
+        except (requests.RequestException, OSError) as e:
+            _LOGGER.warning('Download of %s failed at attempt %d of %d: %s' % (url, attempt + 1, attempts, e))
+            if attempt + 1 < attempts:
+                _backoff(attempt)
+    raise DownloadError('Failed to download %s after %d attempts' % (url, attempts))
+
+
+def _content_range_total(content_range):
+    """
+    >>> _content_range_total('bytes 100-199/200')
+    200
+    >>> _content_range_total('bytes 100-199/*') is None
+    True
+    """
+    if not content_range:
+        return None
+    total = content_range.rsplit('/', 1)[-1]
+    return int(total) if total.isdigit() else None
+
+
+def _parallel_size(url):
+    """
+    :return int or None: Size of the file, if the server supports Range requests and it is worth splitting
+    """
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        _LOGGER.debug('HEAD %s failed, downloading sequentially: %s' % (url, e))
+        return None
+    length = response.headers.get('Content-Length', '')
+    if response.headers.get('Accept-Ranges') != 'bytes' or not length.isdigit():
+        return None
+    return int(length) if int(length) >= _MIN_PARALLEL_SIZE else None
+
+
+def _download_parallel(url, part, total, parallel, attempts, reporter):
+    """
+    Downloads a file of known size to `part` as `parallel` ranges on as many threads. Each range is retried and resumed
+    on its own.
+    """
+    with open(part, 'wb') as f:
+        f.truncate(total)
+    reporter.set(0, total)
+
+    step = -(-total // parallel)
+    ranges = [(start, min(start + step, total)) for start in range(0, total, step)]
+    errors = []
+
+    def fetch(start, end):
+        position = start
+        for attempt in range(attempts):
+            try:
+                headers = {'Range': 'bytes=%d-%d' % (position, end - 1)}
+                with requests.get(url, headers=headers, stream=True, timeout=_TIMEOUT) as response:
+                    if response.status_code != 206:
+                        raise DownloadError('Expected a partial response but got HTTP %d' % response.status_code)
+                    with open(part, 'r+b') as f:
+                        f.seek(position)
+                        for chunk in response.iter_content(_CHUNK_SIZE):
+                            chunk = chunk[:end - position]
+                            f.write(chunk)
+                            position += len(chunk)
+                            reporter.add(len(chunk))
+                if position == end:
+                    return
+                raise DownloadError('Range ended %d bytes early' % (end - position))
+            except (requests.RequestException, OSError) as e:
+                _LOGGER.warning('Download of %s bytes %d-%d failed at attempt %d of %d: %s' % (
+                    url, start, end - 1, attempt + 1, attempts, e))
+                if attempt + 1 < attempts:
+                    _backoff(attempt)
+        errors.append(DownloadError('Failed to download %s bytes %d-%d after %d attempts' % (
+            url, start, end - 1, attempts)))
+
+    threads = [threading.Thread(target=fetch, args=range_, name='download', daemon=True) for range_ in ranges]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        # A parallel download cannot tell which parts of the file are missing, so it is not resumed.
+        os.remove(part)
+        raise errors[0]
+
+
+class _Progress:
+    """
+    Adds up the bytes downloaded, from any thread, and reports them to a progress callback.
+    """
+
+    def __init__(self, callback):
+        self._callback = callback
+        self._LOCK = threading.Lock()
+        self._done = 0
+        self._total = None
+
+    def set(self, done, total):
+        with self._LOCK:
+            self._done, self._total = done, total
+        self._report(done, total)
+
+    def add(self, amount):
+        with self._LOCK:
+            self._done += amount
+            done, total = self._done, self._total
+        self._report(done, total)
+
+    def _report(self, done, total):
+        if self._callback is not None:
+            self._callback(done, total)
+
+
+def log_progress(name):
+    """
+    :param str name: What is being downloaded
+    :return: A progress callback for download() that logs every 10%
+    """
+    logged = [-1]
+
+    def callback(done, total):
+        if not total:
+            return
+        tenth = done * 10 // total
+        if tenth != logged[0]:
+            logged[0] = tenth
+            _LOGGER.info('Downloading %s: %d%%' % (name, tenth * 10))
+
+    return callback
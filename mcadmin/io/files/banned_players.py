@@ -1,11 +1,16 @@
-import os
-from datetime import datetime
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 
-from mcadmin.io.files.files import EntryConflictError, EntryNotFoundError, JsonListFileIO
+from mcadmin.io.files.files import EntryConflictError, EntryNotFoundError, PlayerListFileIO
 from mcadmin.io.mc_profile import mc_uuid
-from mcadmin.io.server.server import SERVER
 
-_BANNED_PLAYERS_FILEPATH = os.path.join(SERVER.DIR, 'banned-players.json')
+_LOGGER = logging.getLogger(__name__)
+
 _UUID = 'uuid'
 _NAME = 'name'
 _CREATED = 'created'
@@ -15,50 +20,133 @@ _REASON = 'reason'
 _FOREVER = 'forever'
 _DEFAULT_BAN_REASON = 'Banned by an operator.'
 
+_MOJANG_TIME_FORMAT = '%Y-%m-%d %H:%M:%S %z'
+
+# Seconds to wait before pardoning lapsed bans again when writing the ban list failed
+_RETRY_SECONDS = 60
+
+# A ban duration, such as "30m", "12h", "7d" or "1w 2d"
+_DURATION = re.compile(r'\s*(\d+)\s*([smhdw])\s*', re.IGNORECASE)
+_DURATION_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+# Longest ban duration, so that the expiry stays within the range of datetime
+_MAX_DURATION = timedelta(days=36500)
+
 
 def mojang_time_format(dt):
     """
-    Formats datetime to Mojang's format.
+    Formats datetime to Mojang's format. Aware datetimes are converted to UTC first.
     :param datetime dt: datetime
 
     >>> mojang_time_format(datetime(2010, 4, 25, 23, 43, 20))
     '2010-04-25 23:43:20 +0000'
+    >>> mojang_time_format(datetime(2010, 4, 26, 1, 43, 20, tzinfo=timezone(timedelta(hours=2))))
+    '2010-04-25 23:43:20 +0000'
     """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
     return dt.strftime('%Y-%m-%d %H:%M:%S +0000')
 
 
-class _BannedPlayersFileIO(JsonListFileIO):
-    def __init__(self):
-        super().__init__(_BANNED_PLAYERS_FILEPATH)
+def parse_mojang_time(text):
+    """
+    :param str text: A time in Mojang's format, or "forever"
+    :return datetime or None: The time, as an aware datetime, or None if it is "forever"
+    :raises ValueError: If the text is neither
+
+    >>> parse_mojang_time('2010-04-26 01:43:20 +0200') == datetime(2010, 4, 25, 23, 43, 20, tzinfo=timezone.utc)
+    True
+    >>> parse_mojang_time('forever') is None
+    True
+    """
+    if text == _FOREVER:
+        return None
+    return datetime.strptime(text, _MOJANG_TIME_FORMAT)
+
+
+def parse_duration(text):
+    """
+    :param str text: A duration made of amounts of seconds (s), minutes (m), hours (h), days (d) and weeks (w)
+    :return timedelta: The duration
+    :raises ValueError: If the text is not a duration, or the duration is longer than _MAX_DURATION
+
+    >>> parse_duration('1w 2d')
+    datetime.timedelta(days=9)
+    >>> parse_duration('90m')
+    datetime.timedelta(seconds=5400)
+    >>> parse_duration('1000000000d')
+    Traceback (most recent call last):
+    ...
+    ValueError: Durations may not be longer than 36500 days
+    """
+    parts = _DURATION.findall(text)
+    if not parts or ''.join(_DURATION.sub('', text).split()):
+        raise ValueError('Not a duration: %s' % text)
+    try:
+        duration = sum((timedelta(**{_DURATION_UNITS[unit.lower()]: int(amount)}) for amount, unit in parts),
+                       timedelta())
+    except OverflowError:
+        duration = None
+    if duration is None or duration > _MAX_DURATION:
+        raise ValueError('Durations may not be longer than %d days' % _MAX_DURATION.days)
+    return duration
+
+
+def _expiry(entry):
+    """
+    :param dict entry: An entry of a ban list
+    :return datetime or None: When the ban lapses, or None if it is permanent or its expiry cannot be parsed
+    """
+    try:
+        return parse_mojang_time(entry.get(_EXPIRES, _FOREVER))
+    except ValueError:
+        return None
+
+
+class BannedPlayersFileIO(PlayerListFileIO):
+    """
+    The banned-players.json file of a server.
+
+    Entries are found through the name and UUID index of PlayerListFileIO. Temporary bans are handed to BAN_EXPIRY every
+    time the file is indexed, which pardons them when they lapse.
+    """
 
-    def ban(self, name, reason=None):
+    def ban(self, name, reason=None, duration=None):
         """
         Bans a player.
 
         :param str name: Name of the user to ban
         :param str reason: Reason for the ban
+        :param timedelta duration: How long the ban lasts. The ban is permanent if None.
 
         :raises EntryConflictError: If the player is already banned
         :raises ProfileAPIError: If the Mojang API responds erroneously
         :raises UUIDNotFoundError: If UUID for username was not found
+        :raises ValueError: If the duration is longer than _MAX_DURATION
         """
-        list_ = self.reads()
-
-        if self._is_banned(name, list_):
-            raise EntryConflictError('Player %s is already banned.', name)
+        if duration is not None and duration > _MAX_DURATION:
+            raise ValueError('Durations may not be longer than %d days' % _MAX_DURATION.days)
+        if self._is_banned(name):
+            raise EntryConflictError('Player %s is already banned.' % name)
 
         uuid = mc_uuid(name)
+        now = datetime.now(timezone.utc)
         new_entry = {
             _UUID: uuid,
             _NAME: name,
-            _CREATED: mojang_time_format(datetime.now()),
+            _CREATED: mojang_time_format(now),
             _SOURCE: 'MCAdmin',
-            _EXPIRES: _FOREVER,
+            _EXPIRES: _FOREVER if duration is None else mojang_time_format(now + duration),
             _REASON: _DEFAULT_BAN_REASON if reason is None or reason == '' else reason
         }
 
-        list_.append(new_entry)
-        self.write(list_)
+        with self._LOCK:
+            if self._is_banned(name) or self._is_active(self.find_uuid(uuid)):
+                raise EntryConflictError('Player %s is already banned.' % name)
+            # A lapsed ban that has not been pardoned yet is replaced
+            stale = {id(self.find_name(name)), id(self.find_uuid(uuid))}
+            list_ = [e for e in self.entries() if id(e) not in stale]
+            list_.append(new_entry)
+            self.write(list_)
 
     def pardon(self, name):
         """
@@ -67,40 +155,140 @@ class _BannedPlayersFileIO(JsonListFileIO):
         :param str name: Username of the user to pardon.
         :raises EntryNotFoundError: If the player is not found in the ban list
         """
-        list_ = self.reads()
+        with self._LOCK:
+            entry = self.find_name(name)
+            if entry is None:
+                raise EntryNotFoundError('%s not found in the ban list.' % name)
+
+            self.write([e for e in self.entries() if e is not entry])
 
-        found = False
-        for i, e in enumerate(list_):
-            if e[_NAME].casefold() == name.casefold():
-                found = True
-                del list_[i]
-                break
+    def pardon_expired(self, names, now=None):
+        """
+        Pardons the bans of the players that have lapsed, with a single write.
 
-        if not found:
-            raise EntryNotFoundError('%s not found in the ban list.' % name)
+        :param names: Names of the players whose bans may have lapsed. Others are not looked at.
+        :param datetime now: Aware time to compare the expiries to. Defaults to now.
+        :return list: The names of the players that were pardoned
+        """
+        now = now or datetime.now(timezone.utc)
+        with self._LOCK:
+            lapsed = {}
+            for name in names:
+                entry = self.find_name(name)
+                expires = _expiry(entry) if entry is not None else None
+                if expires is not None and expires <= now:
+                    lapsed[id(entry)] = entry
+            if lapsed:
+                self.write([e for e in self.entries() if id(e) not in lapsed])
+            return [entry[_NAME] for entry in lapsed.values()]
 
-        self.write(list_)
+    def _index(self, list_, key):
+        super()._index(list_, key)
+        bans = []
+        for entry in self._entries:
+            expires = _expiry(entry)
+            if expires is not None and entry.get(_NAME):
+                bans.append((entry[_NAME], expires))
+        if bans:
+            BAN_EXPIRY.schedule(self, bans)
+
+    @staticmethod
+    def _is_active(entry):
+        """
+        :return bool: True if the entry is a ban that has not lapsed
+        """
+        if entry is None:
+            return False
+        expires = _expiry(entry)
+        return expires is None or expires > datetime.now(timezone.utc)
 
     # noinspection PyProtectedMember
     def _is_banned(self, name, list_=None):
         """
-        Returns true if the specified name is contained in the ban list.
+        Returns true if the specified name is banned, that is, it is in the ban list and its ban has not lapsed.
 
         :param name: Name of the person to ban
-        :param list_: Ban list to use. Will read list from disk if not specified.
-        :return bool: True if the specified name is contained in the ban list.
+        :param list_: Ban list to use. Will use the cached ban list if not specified.
+        :return bool: True if the specified name is banned.
 
-        >>> o = _BannedPlayersFileIO()
+        >>> o = BannedPlayersFileIO('banned-players.json')
         >>> o._is_banned('john', [{_NAME: 'Mack'}, {_NAME: 'John'}])
         True
 
-        >>> o = _BannedPlayersFileIO()
+        >>> o = BannedPlayersFileIO('banned-players.json')
         >>> o._is_banned('bob', [{_NAME: 'John'}, {_NAME: 'Jack'}])
         False
+
+        >>> o._is_banned('jack', [{_NAME: 'Jack', _EXPIRES: '2010-04-25 23:43:20 +0000'}])
+        False
         """
         if list_ is None:
-            list_ = self.reads()
-        return any([e for e in list_ if e[_NAME].casefold() == name.casefold()])
+            return self._is_active(self.find_name(name))
+        return any(self._is_active(e) for e in list_ if e[_NAME].casefold() == name.casefold())
+
+
+class _BanExpiryScheduler:
+    """
+    Pardons temporary bans when they lapse.
+
+    Expiries are kept in a min-heap, so a single thread sleeps until the earliest one instead of scanning the ban lists
+    periodically. Bans that lapse at the same time are pardoned with one write per ban list. Heap entries are not
+    removed when a ban is pardoned or changed early; the ban list is checked again when they come up.
+    """
+
+    def __init__(self):
+        self._heap = []
+        # (id of the ban list, casefolded name, expiry) of every scheduled ban, so that indexing a ban list again does
+        # not schedule its bans twice
+        self._scheduled = set()
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, banned_players, bans):
+        """
+        :param BannedPlayersFileIO banned_players: Ban list of the bans
+        :param bans: Iterable of (name, aware datetime of the expiry)
+        """
+        with self._cond:
+            earliest = self._heap[0][0] if self._heap else None
+            for name, expires in bans:
+                key = (id(banned_players), name.casefold(), expires.timestamp())
+                if key in self._scheduled:
+                    continue
+                self._scheduled.add(key)
+                heapq.heappush(self._heap, (key[2], next(self._counter), banned_players, name, key))
+
+            if not self._heap:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name='ban-expiry', daemon=True)
+                self._thread.start()
+            elif earliest is None or self._heap[0][0] < earliest:
+                self._cond.notify()
+
+    def _worker(self):
+        while True:
+            due = {}
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._cond.wait(self._heap[0][0] - time.time() if self._heap else None)
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, banned_players, name, key = heapq.heappop(self._heap)
+                    self._scheduled.discard(key)
+                    due.setdefault(banned_players, []).append(name)
+
+            # The ban lists are written without holding the heap, since indexing them schedules their bans
+            for banned_players, names in due.items():
+                try:
+                    pardoned = banned_players.pardon_expired(names)
+                    if pardoned:
+                        _LOGGER.info('Temporary bans lapsed: %s' % ', '.join(pardoned))
+                except (OSError, ValueError) as e:
+                    _LOGGER.error('Could not pardon the lapsed bans of %s: %s' % (', '.join(names), e))
+                    retry = datetime.now(timezone.utc) + timedelta(seconds=_RETRY_SECONDS)
+                    self.schedule(banned_players, ((name, retry) for name in names))
 
 
-BANNED_PLAYERS = _BannedPlayersFileIO()
+BAN_EXPIRY = _BanExpiryScheduler()
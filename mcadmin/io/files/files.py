@@ -1,13 +1,34 @@
 """
 This module concerns I/O operations on the server.properties file of Minecraft Server.
 """
+import contextlib
 import json
 import os
+import re
+import stat
+import tempfile
+import threading
 
 import yaml
 
 from mcadmin.exception import PublicError
 
+# A line of a .properties file: the key and value are separated by `=`, `:` or whitespace
+_PROPERTY = re.compile(r'(?P<key>(?:\\.|[^\\=:\s])*)\s*[=:\s]?\s*(?P<value>.*)')
+_ESCAPE = re.compile(r'\\(.)')
+_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'f': '\f'}
+
+# Mode of files created by FileIO.write()
+_DEFAULT_MODE = 0o644
+
+# Path -> lock of the file. Every FileIO of the same file shares its lock.
+_FILE_LOCKS = {}
+_FILE_LOCKS_LOCK = threading.Lock()
+
+# Fields of the entries of player lists
+_NAME = 'name'
+_UUID = 'uuid'
+
 
 class EntryConflictError(PublicError):
     """
@@ -21,9 +42,66 @@ class EntryNotFoundError(PublicError):
     """
 
 
+def file_lock(filepath):
+    """
+    :param str filepath: Path to a file
+    :return threading.RLock: The lock of the file, shared by everything in this process that writes it through FileIO
+    """
+    key = os.path.normcase(os.path.realpath(filepath))
+    with _FILE_LOCKS_LOCK:
+        if key not in _FILE_LOCKS:
+            _FILE_LOCKS[key] = threading.RLock()
+        return _FILE_LOCKS[key]
+
+
+def atomic_write(filepath, content):
+    """
+    Writes text to a file so that readers see either the old or the new content, and never a part of it: the content is
+    written to a temporary file in the same directory, flushed to the disk and renamed over the file. The file keeps its
+    permissions.
+
+    :param str filepath: Path to the file
+    :param str content: Content
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    try:
+        mode = stat.S_IMODE(os.stat(filepath).st_mode)
+    except FileNotFoundError:
+        mode = _DEFAULT_MODE
+
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filepath) + '.', suffix='.tmp')
+    try:
+        with open(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, filepath)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+    # Make the rename itself durable. Directories cannot be opened on Windows, where this is not needed.
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
 class FileIO:
     """
     Utility class for performing basic operations on files.
+
+    Writes are atomic (see atomic_write()) and hold the lock of the file, so concurrent writers cannot interleave.
+    Read-modify-write sequences should hold `self._LOCK` so that no update is lost. Within `batch()`, writes are kept
+    in memory and only the last one is written, when the batch ends.
     """
 
     def __init__(self, filepath):
@@ -34,28 +112,66 @@ class FileIO:
         if os.path.isdir(filepath):
             raise OSError('Got directory path but expected a file path: ' + filepath)
         self._filepath = filepath
+        self._LOCK = file_lock(filepath)
+        self._batch_depth = 0
+        self._pending = None
 
     def exists(self):
         """
         :return: True if the file exists.
         """
-        return os.path.exists(self._filepath)
+        return self._pending is not None or os.path.exists(self._filepath)
 
     def read(self):
         """
-        :return: The content of the file.
+        :return: The content of the file, including the writes of the batch in progress.
         :raises FileNotFoundError: If the file does not exist
         """
-        with open(self._filepath, 'r') as f:
-            return f.read()
+        with self._LOCK:
+            if self._pending is not None:
+                return self._pending
+            with open(self._filepath, 'r') as f:
+                return f.read()
 
     def write(self, content):
         """
-        Writes content to the file.
-        :raises FileNotFoundError: If the file does not exist
+        Writes content to the file, atomically. Within a batch, the content is written when the batch ends.
+        :raises FileNotFoundError: If the directory of the file does not exist
         """
-        with open(self._filepath, 'w') as f:
-            f.write(content)
+        with self._LOCK:
+            if self._batch_depth:
+                self._pending = content
+            else:
+                self._write_file(content)
+
+    def _write_file(self, content):
+        atomic_write(self._filepath, content)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Holds the lock of the file and coalesces the writes made until the end of the `with` block into one. Batches
+        can be nested; the file is written when the outermost one ends, even if it ends with an exception.
+
+        >>> import tempfile
+        >>> f = FileIO(os.path.join(tempfile.mkdtemp(), 'batch.txt'))
+        >>> with f.batch():
+        ...     f.write('a')
+        ...     f.write(f.read() + 'b')
+        ...     f.exists(), os.path.exists(f._filepath)
+        (True, False)
+        >>> f.read()
+        'ab'
+        """
+        with self._LOCK:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._pending is not None:
+                    content, self._pending = self._pending, None
+                    self._write_file(content)
 
     def delete(self):
         """
@@ -119,6 +235,113 @@ class JsonListFileIO(JsonFileIO):
         return self.read()
 
 
+class PlayerListFileIO(JsonListFileIO):
+    """
+    For the JSON lists of players that Minecraft Server keeps, such as whitelist.json and banned-players.json. Every
+    entry has a name and a UUID.
+
+    The parsed list is cached and indexed by casefolded name and by UUID until the file changes, so lookups do not
+    touch the disk past a stat() and do not scan the list. Changes the Minecraft Server makes to the file are seen on
+    the next read.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_key = None
+        self._entries = ()
+        self._by_name = {}
+        self._by_uuid = {}
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """
+        :param listener: Function called with the entries before and after every write made through this object, while
+                         the lock of the file is held. Changes other processes make to the file are not reported.
+        """
+        self._listeners.append(listener)
+
+    def entries(self):
+        """
+        :return tuple: The entries, in the order of the file. Empty if the file does not exist. The entries are shared
+                       by every caller and must not be modified.
+        """
+        with self._LOCK:
+            if self._pending is not None:
+                # Written in the batch in progress
+                return self._entries
+            try:
+                stat_ = os.stat(self._filepath)
+            except FileNotFoundError:
+                self._index([], None)
+                return self._entries
+            key = (stat_.st_mtime_ns, stat_.st_size)
+            if key != self._cache_key:
+                self._index(self.read(), key)
+            return self._entries
+
+    def reads(self):
+        """
+        :return list: The entries. An empty list if the file doesn't exist.
+        """
+        return list(self.entries())
+
+    def find_name(self, name):
+        """
+        :param str name: Name of a player, in any case
+        :return dict or None: The entry of the player
+        """
+        with self._LOCK:
+            self.entries()
+            return self._by_name.get(name.casefold())
+
+    def find_uuid(self, uuid):
+        """
+        :param str uuid: UUID of a player, with or without dashes
+        :return dict or None: The entry of the player
+        """
+        with self._LOCK:
+            self.entries()
+            return self._by_uuid.get(_uuid_key(uuid))
+
+    def write(self, o):
+        """
+        Writes the entries to the file and caches them, so that the next read does not parse the file again. Within a
+        batch, reads return the entries written last.
+
+        :param list o: The entries
+        """
+        with self._LOCK:
+            before = self.entries() if self._listeners else ()
+            super().write(o)
+            self._index(o, self._cache_key)
+            for listener in self._listeners:
+                listener(before, self._entries)
+
+    def _write_file(self, content):
+        try:
+            super()._write_file(content)
+        except BaseException:
+            # The cached entries were not written
+            self._cache_key = None
+            raise
+        stat_ = os.stat(self._filepath)
+        self._cache_key = (stat_.st_mtime_ns, stat_.st_size)
+
+    def _index(self, list_, key):
+        self._entries = tuple(list_)
+        self._by_name = {entry[_NAME].casefold(): entry for entry in list_ if entry.get(_NAME)}
+        self._by_uuid = {_uuid_key(entry[_UUID]): entry for entry in list_ if entry.get(_UUID)}
+        self._cache_key = key
+
+
+def _uuid_key(uuid):
+    """
+    >>> _uuid_key('069A79F4-44E9-4726-A5BE-FCA90E38AAF5')
+    '069a79f444e94726a5befca90e38aaf5'
+    """
+    return uuid.replace('-', '').lower()
+
+
 class YamlFileIO(FileIO):
     """
     Perform I/O operations on YAML files with automatic serialization and deserialization of YAML objects.
@@ -154,3 +377,60 @@ class YamlFileIO(FileIO):
         if not self.exists():
             return dict()
         return self.read()
+
+
+class PropertiesFileIO(FileIO):
+    """
+    Perform I/O operations on Java .properties files, such as server.properties.
+
+    `read()` and `write()` work on the text of the file so that comments and ordering are kept; `properties()` parses
+    it. The parsed properties are cached until the file changes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_key = None
+        self._cache = {}
+
+    def properties(self):
+        """
+        :return dict: The properties, as strings. Empty if the file does not exist.
+        """
+        try:
+            stat_ = os.stat(self._filepath)
+        except FileNotFoundError:
+            return dict()
+        key = (stat_.st_mtime_ns, stat_.st_size)
+        if key != self._cache_key:
+            self._cache = parse_properties(self.read())
+            self._cache_key = key
+        return dict(self._cache)
+
+    def get(self, name, default=None):
+        """
+        :param str name: Name of the property
+        :param default: Returned if the property is not set
+        :return str: Value of the property
+        """
+        return self.properties().get(name, default)
+
+
+def parse_properties(text):
+    """
+    Parses the content of a .properties file. Line continuations are not supported.
+
+    >>> parse_properties('#comment\\nenable-rcon=true\\nmotd=A Minecraft Server\\nrcon.password = p\\\\=ss\\n')
+    {'enable-rcon': 'true', 'motd': 'A Minecraft Server', 'rcon.password': 'p=ss'}
+    """
+    properties = dict()
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line[0] in '#!':
+            continue
+        match = _PROPERTY.match(line)
+        properties[_unescape(match.group('key'))] = _unescape(match.group('value'))
+    return properties
+
+
+def _unescape(text):
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), text)
@@ -0,0 +1,263 @@
+"""
+A store of server executables shared by every server directory.
+"""
+import collections
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+
+from mcadmin.config import CONFIG
+from mcadmin.io import jobs
+from mcadmin.io.download import download, log_progress
+from mcadmin.io.files.files import JsonFileIO
+
+_LOGGER = logging.getLogger(__name__)
+
+_OBJECTS_DIR = 'objects'
+_TMP_DIR = 'tmp'
+_INDEX_JSON = 'index.json'
+
+# Fields of the index
+_NAMES = 'names'
+_OBJECTS = 'objects'
+_SIZE = 'size'
+_LAST_USED = 'last_used'
+_LINKS = 'links'
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+class _JarStore:
+    """
+    Keeps one copy of every server executable, named after its SHA-1, and links it into the server directories that use
+    it.
+
+    The index maps the full name of every version (e.g. minecraft_server-1.12.2.jar) to its hash, so looking a version
+    up does not touch the disk, and keeps the links made to each object. An object's reference count is the amount of
+    those links that still point to it; objects no server links to are kept for later, up to `keep_unused` of them,
+    and the least recently used ones are deleted first.
+
+    Links are hard links where possible, so that deleting the store does not break the servers, then symbolic links,
+    then copies. Copies are not tracked.
+    """
+
+    def __init__(self, directory, keep_unused, parallel=1):
+        """
+        :param str directory: Directory to keep the store in. Created when the first jar is stored.
+        :param int keep_unused: Amount of unused objects to keep
+        :param int parallel: Amount of ranges of a jar to download at once. See download().
+        """
+        self._dir = directory
+        self._keep_unused = keep_unused
+        self._parallel = parallel
+        self._LOCK = threading.RLock()
+        # Full name -> lock held while downloading it, so that servers fetching the same version share one download
+        self._FETCH_LOCKS = collections.defaultdict(threading.Lock)
+
+        self._index_file = JsonFileIO(os.path.join(directory, _INDEX_JSON))
+        try:
+            index = self._index_file.reads()
+        except ValueError as e:
+            _LOGGER.error('Jar store index is corrupt; starting over: %s' % e)
+            index = {}
+        self._names = index.get(_NAMES, {})
+        self._objects = index.get(_OBJECTS, {})
+
+    def has(self, full_name):
+        """
+        :param str full_name: Full name of a version
+        :return bool: True if the store holds the jar of the version
+        """
+        sha1 = self._names.get(full_name)
+        return sha1 is not None and sha1 in self._objects
+
+    def fetch(self, full_name, url, sha1=None, size=None):
+        """
+        Downloads a version into the store, unless it is already there.
+
+        :param str full_name: Full name of the version
+        :param str url: Link to download it from
+        :param str sha1: Expected SHA-1 of the jar, if known
+        :param int size: Expected size of the jar, if known
+        :raises IOError: If the download fails
+        """
+        with self._LOCK:
+            fetch_lock = self._FETCH_LOCKS[full_name]
+        with fetch_lock:
+            if self.has(full_name):
+                return
+            # A .part file left by an interrupted download of the version is resumed.
+            tmp = os.path.join(self._dir, _TMP_DIR, full_name)
+            os.makedirs(os.path.dirname(tmp), exist_ok=True)
+            _LOGGER.info('Downloading %s from %s...' % (full_name, url))
+            log = log_progress(full_name)
+            phase = 'Downloading %s' % full_name
+
+            def progress(done, total):
+                log(done, total)
+                jobs.report(phase, done, total)
+
+            download(url, tmp, sha1=sha1, size=size, parallel=self._parallel, progress=progress)
+            with self._LOCK:
+                self._ingest(tmp, full_name, move=True)
+                self._save()
+
+    def adopt(self, path, full_name):
+        """
+        Puts a jar that already is in a server directory into the store, and replaces it with a link to the store's copy
+        if the store already had it.
+
+        :param str path: Path of the jar
+        :param str full_name: Full name of its version
+        """
+        with self._LOCK:
+            sha1 = self._names.get(full_name)
+            if sha1 in self._objects and _same_file(path, self._object_path(sha1)):
+                self._add_link(sha1, path)
+                self._save()
+                return
+
+            sha1 = self._ingest(path, full_name, move=False)
+            if _same_file(path, self._object_path(sha1)):
+                self._add_link(sha1, path)
+            else:
+                self._link_object(sha1, path)
+            self._save()
+
+    def link(self, full_name, server_dir):
+        """
+        Links a version in the store into a server directory.
+
+        :param str full_name: Full name of the version. The link is named after it.
+        :param str server_dir: The server directory
+        :return str: Path of the link
+        :raises KeyError: If the store does not hold the version
+        """
+        with self._LOCK:
+            sha1 = self._names[full_name]
+            path = os.path.join(server_dir, full_name)
+            if not _same_file(path, self._object_path(sha1)):
+                self._link_object(sha1, path)
+            self._objects[sha1][_LAST_USED] = time.time()
+            self._collect_garbage()
+            self._save()
+            return path
+
+    def release(self, full_name, server_dir):
+        """
+        Removes the link to a version from a server directory, if it is one.
+
+        :param str full_name: Full name of the version
+        :param str server_dir: The server directory
+        """
+        with self._LOCK:
+            sha1 = self._names.get(full_name)
+            path = os.path.abspath(os.path.join(server_dir, full_name))
+            if sha1 is None or sha1 not in self._objects or path not in self._objects[sha1][_LINKS]:
+                return
+            os.remove(path)
+            self._objects[sha1][_LINKS].remove(path)
+            self._collect_garbage()
+            self._save()
+
+    def _object_path(self, sha1):
+        return os.path.join(self._dir, _OBJECTS_DIR, sha1[:2], sha1 + '.jar')
+
+    def _ingest(self, path, full_name, move):
+        """
+        Adds a file to the objects, unless an object with the same content exists.
+
+        :param bool move: Move the file into the store instead of linking or copying it
+        :return str: SHA-1 of the file
+        """
+        sha1 = _sha1(path)
+        obj = self._object_path(sha1)
+        if sha1 not in self._objects or not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            if move:
+                os.replace(path, obj)
+            else:
+                try:
+                    os.link(path, obj)
+                except OSError:
+                    shutil.copy2(path, obj)
+            self._objects[sha1] = {_SIZE: os.path.getsize(obj), _LAST_USED: time.time(), _LINKS: []}
+        elif move:
+            os.remove(path)
+        self._names[full_name] = sha1
+        return sha1
+
+    def _link_object(self, sha1, path):
+        """
+        Makes `path` a hard link, symbolic link or copy of an object, replacing whatever is at `path` at once.
+        """
+        obj = self._object_path(sha1)
+        tmp = path + '.link'
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        try:
+            os.link(obj, tmp)
+        except OSError:
+            try:
+                os.symlink(os.path.abspath(obj), tmp)
+            except OSError:
+                shutil.copy2(obj, tmp)
+                os.replace(tmp, path)
+                return
+        os.replace(tmp, path)
+        self._add_link(sha1, path)
+
+    def _add_link(self, sha1, path):
+        links = self._objects[sha1][_LINKS]
+        path = os.path.abspath(path)
+        if path not in links:
+            links.append(path)
+        self._objects[sha1][_LAST_USED] = time.time()
+
+    def _collect_garbage(self):
+        """
+        Forgets the links that no longer point to their object, and deletes the least recently used objects past
+        `keep_unused` that nothing links to.
+        """
+        unused = []
+        for sha1, obj in self._objects.items():
+            obj[_LINKS] = [link for link in obj[_LINKS] if _same_file(link, self._object_path(sha1))]
+            if not obj[_LINKS]:
+                unused.append(sha1)
+
+        unused.sort(key=lambda sha1: self._objects[sha1][_LAST_USED], reverse=True)
+        for sha1 in unused[self._keep_unused:]:
+            _LOGGER.info('Deleting unused jar %s from the jar store' % sha1)
+            try:
+                os.remove(self._object_path(sha1))
+            except FileNotFoundError:
+                pass
+            del self._objects[sha1]
+        self._names = {name: sha1 for name, sha1 in self._names.items() if sha1 in self._objects}
+
+    def _save(self):
+        try:
+            self._index_file.write({_NAMES: self._names, _OBJECTS: self._objects})
+        except OSError as e:
+            _LOGGER.error('Could not save the jar store index: %s' % e)
+
+
+JAR_STORE = _JarStore(CONFIG.get_jar_store_dir(), CONFIG.get_jar_store_keep_unused(), CONFIG.get_jar_store_parallel())
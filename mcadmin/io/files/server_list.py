@@ -1,48 +1,250 @@
+import email.utils
+import json
 import logging
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import lxml.html
 import requests
 
-from mcadmin.io.files.files import YamlFileIO
+from mcadmin.config import CONFIG
+from mcadmin.io.files.files import YamlFileIO, JsonFileIO
+from mcadmin.io.files.version_index import VersionIndex, VersionEntry, version_of
 
 _LOGGER = logging.getLogger(__name__)
 _FILEPATH = 'server_list.yml'
+# Validators of the last response of the source and when it was last checked
+_META_FILEPATH = 'server_list.meta.json'
+
+# Fields of the meta file
+_SOURCE = 'source'
+_ETAG = 'etag'
+_LAST_MODIFIED = 'last_modified'
+_CHECKED = 'checked'
+# Per-version files of the manifest that were read, by URL: {sha1, etag, last_modified, server}
+_VERSION_FILES = 'version_files'
+_SERVER = 'server'
+
+# Fields of an entry of the server list that carries more than a link
+_URL = 'url'
+_SHA1 = 'sha1'
+_SIZE = 'size'
+_RELEASED = 'released'
+
+# Seconds to wait for the source to answer
+_TIMEOUT = 30
+
+# Types of the versions of a manifest that are listed. Old alphas and betas have no server executables.
+_MANIFEST_TYPES = ('release', 'snapshot')
+
+# Amount of per-version files of a manifest read at once
+_MANIFEST_WORKERS = 8
 
 
 class _ServerList(YamlFileIO):
+    """
+    The list of server executables. It is shared by every server instance.
+
+    The list is indexed once every time the file changes, so reading it costs a stat() of the file. Once the list is
+    older than the configured TTL, reading it starts a refresh in the background and returns the list at hand; the
+    refresh sends the ETag and Last-Modified of the previous response, so an unchanged source costs a 304.
+    """
+
     def __init__(self, *args, **kwargs):
         super().__init__(_FILEPATH, *args, **kwargs)
+        self._meta = JsonFileIO(_META_FILEPATH)
+        # Servers starting at the same time wait for a single update instead of each downloading the list.
+        self._UPDATE_LOCK = threading.Lock()
+        self._cache_key = None
+        self._cache = None  # type: VersionIndex
+        # (source, time) of the last check of the source, read from the meta file once
+        self._checked = None
 
     def _update_if_not_exists(self):
-        if not self.exists():
-            self.update()
+        with self._UPDATE_LOCK:
+            if not self.exists():
+                self.update()
+
+    def _refresh_if_stale(self):
+        """
+        Starts a background update if the list was last checked longer than the TTL ago, unless one is running.
+        """
+        if self._checked is None:
+            meta = self._read_meta()
+            self._checked = (meta.get(_SOURCE), meta.get(_CHECKED, 0))
+        source, checked = self._checked
+        if source == CONFIG.get_server_list_source() and time.time() - checked < CONFIG.get_server_list_ttl():
+            return
+        if not self._UPDATE_LOCK.acquire(blocking=False):
+            return
+
+        def refresh():
+            try:
+                self.update()
+            except (requests.RequestException, OSError, ValueError) as e:
+                _LOGGER.error('Could not update the server executable repository: %s' % e)
+                # Try again after the TTL instead of on every read
+                self._checked = (CONFIG.get_server_list_source(), time.time())
+            finally:
+                self._UPDATE_LOCK.release()
+
+        threading.Thread(target=refresh, name='server-list-refresh', daemon=True).start()
+
+    def _read_meta(self):
+        try:
+            return self._meta.reads()
+        except ValueError:
+            return dict()
 
     def update(self):
         """
         Update the server list.
 
         Implementation notes:
-            It gets an HTML page from mcversions.net that contains all links to all Minecraft Server versions.
-            Then it parses that list to YAML and writes it to FILENAME.
+            The source is set in the config. It is either the URL or the path of
+            - an HTML page that contains download links to Minecraft Server versions (a.btn.server), like the one of
+              mcversions.net, or
+            - a JSON version manifest, like Mojang's version_manifest_v2.json: {"versions": [{"id": <version>,
+              "type": <type>, "url": <per-version file>, "sha1": <sha1 of that file>}]}. The server download of each
+              release and snapshot is read from its per-version file: {"downloads": {"server": {"url", "sha1",
+              "size"}}}. Versions that embed "downloads" in the manifest are not looked up. Versions without a server
+              download are skipped.
+            Then it parses that list to YAML and writes it to FILENAME. Nothing is written if the source has not changed
+            since the last update.
+
+            Per-version files are read again only when their hash in the manifest changes, with the ETag and
+            Last-Modified of the previous response if the manifest has no hashes.
 
             The format of the list is:
 
             {
-                <version>: <link>
+                <full_name>: <link>
+                <full_name>: {url: <link>, sha1: <sha1>, size: <size>, released: <release time, if known>}
                 ...
             }
+
+        :raises ValueError: If the source lists no server executables. The current list is kept.
         """
-        _LOGGER.info('Updating Minecraft server executable link repository...')
-        page = requests.get('https://web.archive.org/web/20190130100707/https://mcversions.net/')
-        _LOGGER.info('Got list, length: %s.' % len(page.text))
+        source = CONFIG.get_server_list_source()
+        meta = self._read_meta()
+        if meta.get(_SOURCE) != source:
+            meta = {_SOURCE: source}
+
+        _LOGGER.info('Updating Minecraft server executable link repository from %s...' % source)
+        with requests.Session() as session:
+            if re.match(r'https?://', source):
+                text = self._get(session, source, meta)
+            else:
+                text = self._read_local(source, meta)
+
+            if text is not None and text.lstrip().startswith('{'):
+                version_files = {}
+                failures = []
+                d = parse_manifest(text, self._version_file_reader(session, source, meta, version_files, failures))
+                meta[_VERSION_FILES] = version_files
+                if failures:
+                    # The manifest is read again by the next update, which only requests the missing files.
+                    _LOGGER.warning('Could not read the version files of %s' % ', '.join(failures))
+                    meta.pop(_ETAG, None)
+                    meta.pop(_LAST_MODIFIED, None)
+            elif text is not None:
+                d = parse_html(text)
+
+        if text is not None:
+            _LOGGER.info('Got list, length: %s.' % len(text))
+            if not d:
+                # E.g. the page changed its layout. The validators are not saved, so the next update parses it again.
+                raise ValueError('%s does not list any server executables; keeping the current list' % source)
+            _LOGGER.debug('Writing to ' + _FILEPATH)
+            self.write(d)
+            _LOGGER.info('Server executable repository updated!')
+        else:
+            _LOGGER.info('Server executable repository is up to date.')
+
+        meta[_CHECKED] = time.time()
+        self._meta.write(meta)
+        self._checked = (source, meta[_CHECKED])
+
+    @staticmethod
+    def _get(session, url, meta):
+        """
+        :param requests.Session session: Session to send the request with
+        :return str or None: The body of the source, or None if it has not changed since the response `meta` is about
+        """
+        headers = {}
+        if meta.get(_ETAG):
+            headers['If-None-Match'] = meta[_ETAG]
+        if meta.get(_LAST_MODIFIED):
+            headers['If-Modified-Since'] = meta[_LAST_MODIFIED]
+
+        response = session.get(url, headers=headers, timeout=_TIMEOUT)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        meta[_ETAG] = response.headers.get('ETag')
+        meta[_LAST_MODIFIED] = response.headers.get('Last-Modified')
+        return response.text
+
+    def _version_file_reader(self, session, source, meta, version_files, failures):
+        """
+        :param requests.Session session: Session to read remote files with
+        :param str source: The manifest. Relative per-version URLs of a local manifest are relative to its directory.
+        :param dict meta: The meta of the last update, whose per-version files are reused
+        :param dict version_files: Filled with the per-version files read, by URL, to save in the meta
+        :param list failures: Filled with the versions whose file could not be read, and was not read before
+        :return: A `fetch` function for parse_manifest()
+        """
+        previous = meta.get(_VERSION_FILES) or {}
+
+        def fetch(version):
+            url = version['url']
+            cached = previous.get(url)
+            if cached is not None and version.get(_SHA1) and cached.get(_SHA1) == version[_SHA1]:
+                version_files[url] = cached
+                return cached[_SERVER]
 
-        tree = lxml.html.fromstring(page.text)
-        d = {x.get('download'): x.get('href') for x in tree.cssselect('a.btn.server')}
+            # Without a hash in the manifest, the file is requested again with the validators of its last response.
+            file_meta = {_SHA1: version.get(_SHA1)}
+            if cached is not None and not version.get(_SHA1):
+                file_meta.update({_ETAG: cached.get(_ETAG), _LAST_MODIFIED: cached.get(_LAST_MODIFIED)})
+            try:
+                if re.match(r'https?://', url):
+                    text = self._get(session, url, file_meta)
+                else:
+                    with open(os.path.join(os.path.dirname(source), url), 'r') as f:
+                        text = f.read()
+                if text is None:
+                    version_files[url] = cached
+                    return cached[_SERVER]
+                server = (json.loads(text).get('downloads') or {}).get(_SERVER)
+            except (requests.RequestException, OSError, ValueError, AttributeError) as e:
+                _LOGGER.warning('Could not read the version file of %s: %s' % (version['id'], e))
+                if cached is not None:
+                    version_files[url] = cached
+                    return cached[_SERVER]
+                failures.append(version['id'])
+                return None
+            file_meta[_SERVER] = server
+            version_files[url] = file_meta
+            return server
 
-        _LOGGER.debug('Writing to ' + _FILEPATH)
-        self.write(d)
-        _LOGGER.info('Server executable repository updated!')
+        return fetch
+
+    @staticmethod
+    def _read_local(path, meta):
+        """
+        :return str or None: The content of the source, or None if it has not changed since `meta` was written
+        """
+        last_modified = email.utils.formatdate(os.path.getmtime(path), usegmt=True)
+        if meta.get(_LAST_MODIFIED) == last_modified:
+            return None
+        with open(path, 'r') as f:
+            text = f.read()
+        meta[_LAST_MODIFIED] = last_modified
+        return text
 
     def load(self):
         """
@@ -51,6 +253,37 @@ class _ServerList(YamlFileIO):
         self._update_if_not_exists()
         return self.read()
 
+    def index(self):
+        """
+        :return VersionIndex: Index of the versions in the list. It is built once every time the list changes.
+        """
+        try:
+            stat = os.stat(self._filepath)
+        except FileNotFoundError:
+            self._update_if_not_exists()
+            stat = os.stat(self._filepath)
+        self._refresh_if_stale()
+
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._cache_key:
+            return self._cache
+
+        entries = []
+        for full_name, entry in self.read().items():
+            version = version_of(full_name)
+            if version is None:
+                _LOGGER.warning('Ignoring %s in the server list: the name does not have a version' % full_name)
+                continue
+            if isinstance(entry, dict):
+                entries.append(VersionEntry(version, full_name, entry[_URL], entry.get(_SHA1), entry.get(_SIZE),
+                                            entry.get(_RELEASED)))
+            else:
+                entries.append(VersionEntry(version, full_name, entry, None, None))
+
+        self._cache = VersionIndex(entries)
+        self._cache_key = key
+        return self._cache
+
     def versions(self):
         """
             :returns: A dictionary of all Minecraft versions, their full name and their respective server links in the
@@ -60,40 +293,83 @@ class _ServerList(YamlFileIO):
                     'snapshot': [(version, full_name, link)]
                 }
 
-                The "stable" list is ordered by version number in descending order.
-                The "snapshot" list is not ordered due to Mojang's weird snapshot versioning system.
+                Both lists are ordered by version in descending order. See version_index.version_key().
+                The dictionary is shared by every caller until the list changes and cannot be modified.
             """
-        stable = []
-        snapshot = []
-
-        for full_name, link in self.load().items():
-            version = full_name.split('-', 1)[1].rsplit('.', 1)[0]
-            entry = (version, full_name, link)
-
-            if self._is_stable(version):
-                stable.append(entry)
-            else:
-                snapshot.append(entry)
-
-        # Sort the list of stable versions in descending order
-        # lambda x :: x => tuple(version, full_name, link) :: x -> [int]
-        stable.sort(key=lambda x: [int(y) for y in x[0].split('.')], reverse=True)
-
-        return {
-            'stable': stable,
-            'snapshot': snapshot,
-        }
-
-    @staticmethod
-    def _is_stable(version: str):
-        return re.fullmatch(r'[0-9.]+', version)
+        return self.index().versions
 
     def latest_stable_version(self):
         """
         Returns the latest stable version of Minecraft.
         :return: (version, full_name, link)
         """
-        return self.versions()['stable'][0]
+        return self.index().versions['stable'][0]
+
+
+def parse_html(text):
+    """
+    :param str text: An HTML page with download links to server executables
+    :return dict: {full_name: link}
+    """
+    tree = lxml.html.fromstring(text)
+    return {x.get('download'): x.get('href') for x in tree.cssselect('a.btn.server')}
+
+
+def parse_manifest(text, fetch=None):
+    """
+    :param str text: A JSON version manifest
+    :param fetch: Function that takes an entry of the manifest that does not embed its downloads, and returns the
+                  server download ({url, sha1, size}) of its per-version file, or None. Such entries are skipped if
+                  None.
+    :return dict: {full_name: {url, sha1, size, released}}. "released" is left out if the manifest has no release time.
+    :raises ValueError: If the text is not a version manifest
+
+    The versions of Mojang's manifests point to per-version files:
+
+    >>> manifest = json.dumps({'latest': {'release': '1.12.2', 'snapshot': '1.12.2'}, 'versions': [
+    ...     {'id': '1.12.2', 'type': 'release', 'url': 'https://example.com/1.12.2.json', 'sha1': 'f',
+    ...      'releaseTime': '2017-09-18T08:39:46+00:00'},
+    ...     {'id': 'b1.7.3', 'type': 'old_beta', 'url': 'https://example.com/b1.7.3.json', 'sha1': 'g'},
+    ... ]})
+    >>> files = {'https://example.com/1.12.2.json': {'downloads': {'server': {'url': 'u', 'sha1': 's', 'size': 1}}}}
+    >>> parse_manifest(manifest, lambda version: files[version['url']]['downloads']['server'])
+    {'minecraft_server-1.12.2.jar': {'url': 'u', 'sha1': 's', 'size': 1, 'released': '2017-09-18T08:39:46+00:00'}}
+
+    Versions may embed their downloads instead:
+
+    >>> parse_manifest('{"versions": [{"id": "1.12.2", '
+    ...                '"downloads": {"server": {"url": "u", "sha1": "s", "size": 1}}}]}')
+    {'minecraft_server-1.12.2.jar': {'url': 'u', 'sha1': 's', 'size': 1}}
+    """
+    manifest = json.loads(text)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('versions'), list):
+        raise ValueError('Not a version manifest: no "versions" list')
+
+    versions = [version for version in manifest['versions'] if isinstance(version, dict) and version.get('id') and
+                version.get('type', 'release') in _MANIFEST_TYPES]
+    servers = {}
+    pending = []
+    for version in versions:
+        server = (version.get('downloads') or {}).get(_SERVER)
+        if server is not None:
+            servers[version['id']] = server
+        elif fetch is not None and version.get(_URL):
+            pending.append(version)
+    if pending:
+        with ThreadPoolExecutor(max_workers=_MANIFEST_WORKERS, thread_name_prefix='server-list') as executor:
+            servers.update(zip([version['id'] for version in pending], executor.map(fetch, pending)))
+
+    d = {}
+    for version in versions:
+        server = servers.get(version['id'])
+        if not server or not server.get(_URL):
+            continue
+        entry = d['minecraft_server-%s.jar' % version['id']] = {_URL: server[_URL],
+                                                                _SHA1: server.get(_SHA1),
+                                                                _SIZE: server.get(_SIZE)}
+        if version.get('releaseTime'):
+            entry[_RELEASED] = version['releaseTime']
+    return d
 
 
 SERVER_LIST = _ServerList()
@@ -0,0 +1,247 @@
+"""
+An index of the Minecraft versions in the server list, ordered from the newest to the oldest.
+"""
+import bisect
+import collections
+import re
+import types
+
+# A version in the index.
+# version: Version number, e.g. "1.12.2", "1.14-pre1" or "18w01a"
+# full_name: Name of its server executable, e.g. "minecraft_server-1.12.2.jar"
+# link: Where to download the executable from
+# sha1, size: Hash and size of the executable, or None if the server list does not have them
+# released: When the version was released, in ISO 8601 format, or None if the server list does not say
+VersionEntry = collections.namedtuple('VersionEntry', 'version full_name link sha1 size released', defaults=(None,))
+
+# Ranks of the version formats. Formats of a higher rank are newer.
+_RANK_UNKNOWN = -1
+_RANK_RELEASE = 1
+
+# Stages of a release. Snapshots come before pre-releases, which come before release candidates, which come before the
+# release.
+_STAGE_SNAPSHOT = -1
+_STAGE_PRE = 0
+_STAGE_RC = 1
+_STAGE_RELEASE = 2
+_STAGES = {'pre': _STAGE_PRE, 'pre-release': _STAGE_PRE, 'rc': _STAGE_RC, 'release candidate': _STAGE_RC}
+
+# 1.12.2, 1.14-pre1, 1.14 Pre-Release 1, 1.16-rc1, 1.16 Release Candidate 1
+_RELEASE = re.compile(r'(?P<nums>\d+(?:\.\d+)+)(?:[- ](?P<stage>pre-release|pre|release candidate|rc) ?(?P<n>\d+))?',
+                      re.IGNORECASE)
+# 18w01a
+_SNAPSHOT = re.compile(r'(?P<year>\d{2})w(?P<week>\d{2})(?P<letter>[a-z])')
+
+# (year, week) of the first snapshot of each development cycle, and the release the cycle led to. The snapshots of a
+# week lead to the release of the last cycle that started at or before it.
+_SNAPSHOT_CYCLES = (
+    ((11, 47), (1, 1)),
+    ((12, 1), (1, 2)),
+    ((12, 15), (1, 3)),
+    ((12, 32), (1, 4)),
+    ((12, 49), (1, 4, 6)),
+    ((13, 1), (1, 5)),
+    ((13, 11), (1, 5, 1)),
+    ((13, 16), (1, 6)),
+    ((13, 36), (1, 7)),
+    ((13, 47), (1, 7, 4)),
+    ((14, 2), (1, 8)),
+    ((15, 31), (1, 9)),
+    ((16, 14), (1, 9, 3)),
+    ((16, 20), (1, 10)),
+    ((16, 32), (1, 11)),
+    ((16, 50), (1, 11, 1)),
+    ((17, 6), (1, 12)),
+    ((17, 31), (1, 12, 1)),
+    ((17, 43), (1, 13)),
+    ((18, 43), (1, 14)),
+    ((19, 34), (1, 15)),
+    ((20, 6), (1, 16)),
+    ((20, 45), (1, 17)),
+    ((21, 37), (1, 18)),
+    ((22, 11), (1, 19)),
+    ((22, 24), (1, 19, 1)),
+    ((22, 42), (1, 19, 3)),
+    ((23, 3), (1, 19, 4)),
+    ((23, 12), (1, 20)),
+    ((23, 31), (1, 20, 2)),
+    ((23, 40), (1, 20, 3)),
+    ((24, 3), (1, 20, 5)),
+    ((24, 18), (1, 21)),
+    ((24, 33), (1, 21, 2)),
+    ((24, 44), (1, 21, 4)),
+    ((25, 2), (1, 21, 5)),
+    ((25, 15), (1, 21, 6)),
+    ((25, 31), (1, 21, 9)),
+)
+_SNAPSHOT_CYCLE_WEEKS = tuple(week for week, _ in _SNAPSHOT_CYCLES)
+# (year, week) of the last release of _SNAPSHOT_CYCLES. Later snapshots lead to a release the table does not know.
+_SNAPSHOT_CYCLES_END = (25, 40)
+
+
+def _cycle_release(year, week):
+    """
+    :return tuple or None: Numbers of the release that the snapshots of a week lead to, or None if the week is past
+                           _SNAPSHOT_CYCLES_END
+
+    >>> _cycle_release(18, 1), _cycle_release(17, 42), _cycle_release(26, 1)
+    ((1, 13), (1, 12, 1), None)
+    """
+    if (year, week) > _SNAPSHOT_CYCLES_END:
+        return None
+    i = max(bisect.bisect_right(_SNAPSHOT_CYCLE_WEEKS, (year, week)) - 1, 0)
+    return _SNAPSHOT_CYCLES[i][1]
+
+
+def version_key(version, release=None):
+    """
+    Sort key of a version number. Releases are ordered by number and stage. A weekly snapshot is ordered with the
+    release it leads to, before its pre-releases, and by year, week and letter among the other snapshots of that
+    release. Versions of a format the index does not know are ordered by their text, before every release.
+
+    :param str version: Version number
+    :param tuple release: Numbers of the release that a snapshot leads to, e.g. (1, 13). Looked up in _SNAPSHOT_CYCLES
+                          if None. Snapshots past the table are ordered after its last release.
+    :return tuple: (rank, numbers, stage, stage number, text)
+
+    >>> versions = ['1.13', '18w01a', '1.9', '1.13-pre1', 'b1.7.3', '1.13-rc1', '1.12.2', '1.13 Pre-Release 2',
+    ...             '17w50a']
+    >>> sorted(versions, key=version_key)
+    ['b1.7.3', '1.9', '1.12.2', '17w50a', '18w01a', '1.13-pre1', '1.13 Pre-Release 2', '1.13-rc1', '1.13']
+    """
+    match = _RELEASE.fullmatch(version)
+    if match:
+        nums = tuple(int(num) for num in match.group('nums').split('.'))
+        if match.group('stage'):
+            return _RANK_RELEASE, nums, _STAGES[match.group('stage').lower()], int(match.group('n')), version
+        return _RANK_RELEASE, nums, _STAGE_RELEASE, 0, version
+
+    match = _SNAPSHOT.fullmatch(version)
+    if match:
+        year, week = int(match.group('year')), int(match.group('week'))
+        if release is None:
+            # Past the table, the snapshot leads to a release after the last one in it: (1, 21, 9, 0) comes after
+            # (1, 21, 9) and before any newer release.
+            release = _cycle_release(year, week) or _SNAPSHOT_CYCLES[-1][1] + (0,)
+        return _RANK_RELEASE, release, _STAGE_SNAPSHOT, (year, week, match.group('letter')), version
+
+    return _RANK_UNKNOWN, (), 0, 0, version
+
+
+def _release_of_snapshot(version, released, releases, newest):
+    """
+    :param str version: Version number of a snapshot
+    :param released: When the snapshot was released, or None if unknown
+    :param list releases: (release time, numbers) of the releases of the index that have a release time, oldest first
+    :param tuple newest: Numbers of the newest release of the index, or None if it has none
+    :return tuple or None: Numbers of the release that the snapshot leads to, or None to let version_key() decide. Past
+                           _SNAPSHOT_CYCLES, it is the first release after the snapshot, or a release after the newest
+                           one if there is none.
+    """
+    match = _SNAPSHOT.fullmatch(version)
+    if match is None or _cycle_release(int(match.group('year')), int(match.group('week'))) is not None:
+        return None
+    if released is not None:
+        i = bisect.bisect_right(releases, (released,))
+        if i < len(releases):
+            return releases[i][1]
+    return newest + (0,) if newest is not None else None
+
+
+def version_of(full_name):
+    """
+    :param str full_name: Full name of a version
+    :return str or None: Its version number, or None if the name is not of the form <name>-<version>.jar
+
+    >>> version_of('minecraft_server-1.14-pre1.jar')
+    '1.14-pre1'
+    """
+    if '-' not in full_name:
+        return None
+    return full_name.split('-', 1)[1].rsplit('.', 1)[0]
+
+
+def is_stable(version):
+    """
+    :param str version: Version number
+    :return bool: True if the version is a release, not a pre-release, release candidate or snapshot
+
+    >>> is_stable('1.12.2'), is_stable('1.13-pre1'), is_stable('18w01a')
+    (True, False, False)
+    """
+    key = version_key(version)
+    return key[0] == _RANK_RELEASE and key[2] == _STAGE_RELEASE
+
+
+class VersionIndex:
+    """
+    Immutable index of versions, built once every time the server list changes and shared by everything that reads it.
+
+    Versions are looked up by full name or by version number in O(1), and listed from the newest to the oldest.
+    """
+
+    def __init__(self, entries):
+        """
+        :param entries: The VersionEntry of every version
+        """
+        entries = list(entries)
+        # Releases with a release time, oldest first, to place the snapshots that _SNAPSHOT_CYCLES does not know
+        releases = sorted((entry.released, version_key(entry.version)[1]) for entry in entries
+                          if entry.released and is_stable(entry.version))
+        newest = max((version_key(entry.version)[1] for entry in entries if is_stable(entry.version)), default=None)
+        keys = {entry.full_name: version_key(entry.version, _release_of_snapshot(entry.version, entry.released,
+                                                                                 releases, newest))
+                for entry in entries}
+
+        ordered = sorted(entries, key=lambda entry: keys[entry.full_name], reverse=True)
+        self.all = tuple(ordered)
+        self.stable = tuple(entry for entry in ordered if is_stable(entry.version))
+        self.by_full_name = types.MappingProxyType({entry.full_name: entry for entry in ordered})
+        self.by_version = types.MappingProxyType({entry.version: entry for entry in ordered})
+        self._keys = types.MappingProxyType(keys)
+        # Keys of `all` and `stable`, oldest first, to bisect
+        self._ascending = {
+            False: tuple(reversed([self._keys[entry.full_name] for entry in self.all])),
+            True: tuple(reversed([self._keys[entry.full_name] for entry in self.stable])),
+        }
+
+        # The format of _ServerList.versions()
+        self.versions = types.MappingProxyType({
+            'stable': tuple((entry.version, entry.full_name, entry.link) for entry in self.stable),
+            'snapshot': tuple((entry.version, entry.full_name, entry.link) for entry in ordered
+                              if not is_stable(entry.version)),
+        })
+
+    def __len__(self):
+        return len(self.all)
+
+    def get(self, full_name):
+        """
+        :param str full_name: Full name of a version
+        :return VersionEntry or None: The version, if it is in the index
+        """
+        return self.by_full_name.get(full_name)
+
+    def latest(self, n=1, stable=True):
+        """
+        :param int n: Amount of versions
+        :param bool stable: Only list releases
+        :return tuple: The `n` newest versions, newest first
+        """
+        return (self.stable if stable else self.all)[:n]
+
+    def newer_than(self, name, stable=True):
+        """
+        :param str name: Full name or version number of a version. It does not have to be in the index.
+        :param bool stable: Only list releases
+        :return tuple: The versions newer than the version, newest first
+        """
+        if name in self._keys:
+            key = self._keys[name]
+        elif name in self.by_version:
+            key = self._keys[self.by_version[name].full_name]
+        else:
+            key = version_key(version_of(name) if name.endswith('.jar') and version_of(name) else name)
+        keys = self._ascending[stable]
+        newer = len(keys) - bisect.bisect_right(keys, key)
+        return (self.stable if stable else self.all)[:newer]
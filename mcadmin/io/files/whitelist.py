@@ -1,17 +1,40 @@
-import os
+import csv
+import io
+import json
+import uuid as uuid_
 
-from mcadmin.io.files.files import EntryConflictError, EntryNotFoundError, JsonListFileIO
-from mcadmin.io.server.server import SERVER
+from mcadmin.io import jobs
+from mcadmin.io.files.files import EntryConflictError, EntryNotFoundError, PlayerListFileIO, _uuid_key
+from mcadmin.io.mc_profile import mc_uuids, is_valid_username, UUIDNotFoundError
 
-_FILEPATH = os.path.join(SERVER.DIR, 'whitelist.json')
 _UUID = 'uuid'
 _NAME = 'name'
 
+# Formats of imports and exports
+FORMAT_CSV = 'csv'  # name,uuid rows. The header row and the uuid column are optional on import.
+FORMAT_TEXT = 'txt'  # One name per line. Blank lines and lines starting with # are skipped on import.
+FORMAT_JSON = 'json'  # A list of names or of {"name", "uuid"} objects, like whitelist.json
+FORMATS = (FORMAT_CSV, FORMAT_TEXT, FORMAT_JSON)
 
-class _WhitelistFileIO(JsonListFileIO):
+# Outcomes of the entries of an import
+STATUS_ADDED = 'added'
+STATUS_CONFLICT = 'conflict'  # Already whitelisted
+STATUS_DUPLICATE = 'duplicate'  # Earlier in the same import
+STATUS_INVALID = 'invalid'  # Not a valid name or UUID
+STATUS_NOT_FOUND = 'not_found'  # No Minecraft account has the name
+STATUS_ERROR = 'error'  # The UUID could not be looked up
 
-    def __init__(self):
-        super().__init__(_FILEPATH)
+# Maximum amount of entries in an import
+MAX_IMPORT_ENTRIES = 10000
+
+# Amount of characters read at once from a JSON import
+_JSON_CHUNK_SIZE = 64 * 1024
+
+
+class WhitelistFileIO(PlayerListFileIO):
+    """
+    The whitelist.json file of a server.
+    """
 
     def add(self, username, uuid):
         """
@@ -22,19 +45,18 @@ class _WhitelistFileIO(JsonListFileIO):
 
         :raises EntryConflictError: If an entry of with that username/uuid already exists
         """
-        list_ = self.reads()
-
-        for x in list_:
-            if x[_NAME] == username:
+        with self._LOCK:
+            if self.find_name(username) is not None:
                 raise EntryConflictError('An entry with name %s already exists' % username)
-            elif x[_UUID] == uuid:
+            if self.find_uuid(uuid) is not None:
                 raise EntryConflictError('An entry with UUID %s already exists' % uuid)
 
-        list_.append({
-            _UUID: uuid,
-            _NAME: username
-        })
-        self.write(list_)
+            list_ = self.reads()
+            list_.append({
+                _UUID: uuid,
+                _NAME: username
+            })
+            self.write(list_)
 
     def remove(self, name):
         """
@@ -44,19 +66,218 @@ class _WhitelistFileIO(JsonListFileIO):
 
         :raises EntryNotFoundError: If an entry by the given name does not exist
         """
-        list_ = self.reads()
+        with self._LOCK:
+            entry = self.find_name(name)
+            if entry is None:
+                raise EntryNotFoundError('Not found in whitelist: %s' % name)
+
+            self.write([x for x in self.entries() if x is not entry])
+
+    def import_players(self, players):
+        """
+        Adds many players to the whitelist with a single write.
+
+        Players without a UUID have it looked up in batches. Players that are already whitelisted are not
+        looked up.
+
+        :param players: Iterable of (name, UUID or None), such as parse_import() returns
+        :return list: A {"name", "uuid", "status", "error"} dict for every entry, in order. "status" is one of the
+                      STATUS_ constants and "error" is None unless the status is STATUS_ERROR or STATUS_INVALID.
+        :raises ValueError: If the entries cannot be parsed or there are more than MAX_IMPORT_ENTRIES
+        """
+        report = []
+        seen = set()
+        for count, (name, uuid) in enumerate(players):
+            if count == MAX_IMPORT_ENTRIES:
+                raise ValueError('An import may not have more than %d entries' % MAX_IMPORT_ENTRIES)
+            result = {_NAME: name, _UUID: None, 'status': None, 'error': None}
+            report.append(result)
+
+            if not is_valid_username(name):
+                result['status'], result['error'] = STATUS_INVALID, 'Not a valid Minecraft name'
+                continue
+            if uuid:
+                try:
+                    result[_UUID] = str(uuid_.UUID(uuid))
+                except ValueError:
+                    result['status'], result['error'] = STATUS_INVALID, 'Not a valid UUID: %s' % uuid
+                    continue
+            if name.casefold() in seen:
+                result['status'] = STATUS_DUPLICATE
+            elif self.find_name(name) is not None:
+                result['status'] = STATUS_CONFLICT
+            seen.add(name.casefold())
+
+        unresolved = [result for result in report if result['status'] is None and result[_UUID] is None]
+        lookups = zip(unresolved, mc_uuids(result[_NAME] for result in unresolved))
+        for done, (result, (name, uuid, error)) in enumerate(lookups, 1):
+            jobs.report('Looking up UUIDs', done, len(unresolved))
+            if isinstance(error, UUIDNotFoundError):
+                result['status'] = STATUS_NOT_FOUND
+            elif error is not None:
+                result['status'], result['error'] = STATUS_ERROR, str(error)
+            else:
+                result[_UUID] = uuid
+
+        with self._LOCK:
+            list_ = self.reads()
+            # UUIDs added by this import. Entries already in the whitelist are found through its index.
+            added = set()
+            for result in report:
+                if result['status'] is not None:
+                    continue
+                # The whitelist may have changed during the lookups
+                key = _uuid_key(result[_UUID])
+                if self.find_name(result[_NAME]) is not None or self.find_uuid(result[_UUID]) is not None or \
+                        key in added:
+                    result['status'] = STATUS_CONFLICT
+                    continue
+                list_.append({_UUID: result[_UUID], _NAME: result[_NAME]})
+                added.add(key)
+                result['status'] = STATUS_ADDED
+            if any(result['status'] == STATUS_ADDED for result in report):
+                self.write(list_)
+        return report
+
+    def export(self, format_):
+        """
+        :param str format_: One of FORMATS
+        :return: Generator of the whitelist in the format, in chunks of text. It exports the whitelist as it was when
+                 the generator was created.
+        """
+        return _export(self.entries(), format_)
+
+
+def parse_import(stream, format_):
+    """
+    Parses the entries of an import lazily, as they are read from a text stream.
+
+    :param stream: Text stream to read
+    :param str format_: One of FORMATS
+    :return: Generator of (name, UUID or None)
+    :raises ValueError: If the stream cannot be parsed, when the generator reaches the error
+
+    >>> list(parse_import(io.StringIO('name,uuid\\nAlice,069a79f4-44e9-4726-a5be-fca90e38aaf5\\nBob\\n'), 'csv'))
+    [('Alice', '069a79f4-44e9-4726-a5be-fca90e38aaf5'), ('Bob', None)]
+    >>> list(parse_import(io.StringIO('Alice\\n\\n# comment\\n Bob \\n'), 'txt'))
+    [('Alice', None), ('Bob', None)]
+    >>> list(parse_import(io.StringIO('["Alice", {"name": "Bob", "uuid": "u"}]'), 'json'))
+    [('Alice', None), ('Bob', 'u')]
+    """
+    if format_ == FORMAT_CSV:
+        return _parse_csv(stream)
+    if format_ == FORMAT_TEXT:
+        return _parse_text(stream)
+    if format_ == FORMAT_JSON:
+        return _parse_json(stream)
+    raise ValueError('Unknown format: %s' % format_)
+
+
+def _parse_csv(stream):
+    try:
+        yield from _parse_csv_rows(csv.reader(stream))
+    except csv.Error as e:
+        raise ValueError('Invalid CSV: %s' % e)
+
+
+def _parse_csv_rows(rows):
+    name_column, uuid_column = 0, 1
+    for i, row in enumerate(rows):
+        row = [cell.strip() for cell in row]
+        if not any(row):
+            continue
+        if i == 0 and _NAME in (cell.casefold() for cell in row):
+            header = [cell.casefold() for cell in row]
+            name_column = header.index(_NAME)
+            uuid_column = header.index(_UUID) if _UUID in header else None
+            continue
+        uuid = row[uuid_column] if uuid_column is not None and uuid_column < len(row) else None
+        yield row[name_column] if name_column < len(row) else '', uuid or None
+
+
+def _parse_text(stream):
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line, None
+
+
+def _parse_json(stream):
+    for item in _iter_json_array(stream):
+        if isinstance(item, str):
+            yield item, None
+        elif isinstance(item, dict) and isinstance(item.get(_NAME), str):
+            yield item[_NAME], item.get(_UUID) or None
+        else:
+            raise ValueError('Expected a name or an object with a name but got %s' % json.dumps(item))
+
+
+def _iter_json_array(stream):
+    """
+    Parses a JSON array one element at a time, reading the stream as needed, so that the whole array is never in memory.
+
+    >>> list(_iter_json_array(io.StringIO(' [1, {"a": [2]} ,"x"] ')))
+    [1, {'a': [2]}, 'x']
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+
+    def skip_whitespace(need):
+        # Returns the buffer without leading whitespace, reading until it has at least `need` characters or the stream
+        # ends.
+        nonlocal buffer, eof
+        buffer = buffer.lstrip()
+        while len(buffer) < need and not eof:
+            chunk = stream.read(_JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer = (buffer + chunk).lstrip()
+        return buffer
 
-        found = False
-        for i, x in enumerate(list_):
-            if x[_NAME] == name:
-                found = True
-                del list_[i]
-                break
+    if skip_whitespace(1)[:1] != '[':
+        raise ValueError('Expected a JSON array')
+    buffer = buffer[1:]
+    if skip_whitespace(1)[:1] == ']':
+        return
 
-        if not found:
-            raise EntryNotFoundError('Not found in whitelist: %s' % name)
+    while True:
+        while True:
+            try:
+                item, end = decoder.raw_decode(skip_whitespace(1))
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(buffer) or eof:
+                    break
+            except ValueError:
+                if eof:
+                    raise ValueError('Invalid JSON array')
+            chunk = stream.read(_JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+        yield item
+        buffer = buffer[end:]
 
-        self.write(list_)
+        separator = skip_whitespace(1)[:1]
+        buffer = buffer[1:]
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError('Expected , or ] in the JSON array')
 
 
-WHITELIST = _WhitelistFileIO()
+def _export(entries, format_):
+    if format_ == FORMAT_CSV:
+        yield '%s,%s\r\n' % (_NAME, _UUID)
+        for entry in entries:
+            row = io.StringIO()
+            csv.writer(row).writerow([entry.get(_NAME, ''), entry.get(_UUID, '')])
+            yield row.getvalue()
+    elif format_ == FORMAT_TEXT:
+        for entry in entries:
+            yield entry.get(_NAME, '') + '\n'
+    elif format_ == FORMAT_JSON:
+        yield '['
+        for i, entry in enumerate(entries):
+            yield ('' if i == 0 else ',') + '\n    ' + json.dumps({_UUID: entry.get(_UUID), _NAME: entry.get(_NAME)})
+        yield '\n]\n'
+    else:
+        raise ValueError('Unknown format: %s' % format_)
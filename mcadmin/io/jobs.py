@@ -0,0 +1,205 @@
+"""
+Runs slow actions, such as starting a server that has to download its jar, on a bounded pool of worker threads instead
+of the request thread, and publishes their progress.
+"""
+import collections
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from mcadmin.io.server.broker import Broker
+
+_LOGGER = logging.getLogger(__name__)
+
+# Topic of the events of EVENTS. The item of every event is the Job that changed.
+TOPIC_JOB = 'job'
+
+# Amount of jobs that run at once
+_WORKERS = 4
+
+# Maximum amount of jobs that are queued or running. Submitting more raises JobQueueFullError.
+_MAX_UNFINISHED = 64
+
+# Amount of finished jobs that are kept so that their outcome can be looked up
+_KEEP_FINISHED = 100
+
+# Minimum amount of seconds between two progress events of a job within the same phase
+_PROGRESS_INTERVAL = 0.25
+
+# States of a job
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Published when a job changes. Jobs are followed by the clients that submitted them.
+EVENTS = Broker()
+
+# The job that runs on the current thread
+_CURRENT = threading.local()
+
+
+class JobQueueFullError(Exception):
+    """
+    Raised when submitting a job while _MAX_UNFINISHED jobs are queued or running.
+    """
+
+
+class Job:
+    """
+    An action running in the background, and its progress.
+    """
+
+    def __init__(self, key, name):
+        """
+        :param key: Jobs with equal keys do the same thing. Submitting a job while one with the same key is unfinished
+                    returns that job instead.
+        :param str name: What the job does, for people
+        """
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.name = name
+        self.state = QUEUED
+        self.phase = None  # type: str or None
+        self.done = None  # type: int or None
+        self.total = None  # type: int or None
+        self.eta = None  # type: float or None
+        self.error = None  # type: str or None
+        self.result = None
+        self.created = time.time()
+        self.finished = None  # type: float or None
+        self._phase_start = None
+        self._phase_start_done = 0
+        self._published = 0
+
+    def progress(self, phase=None, done=None, total=None):
+        """
+        Reports the progress of the job. The estimated time left is worked out from the rate of `done` since the phase
+        started.
+
+        :param str phase: What the job is doing, e.g. "Downloading minecraft_server-1.12.2.jar". Unchanged if None.
+        :param int done: Amount of work done in the phase, e.g. bytes downloaded
+        :param int total: Amount of work of the phase, if known
+        """
+        now = time.monotonic()
+        new_phase = phase is not None and phase != self.phase
+        if new_phase:
+            self.phase = phase
+            self.done = self.total = self.eta = None
+            self._phase_start, self._phase_start_done = now, done or 0
+        if done is not None:
+            self.done, self.total = done, total
+            elapsed = now - (self._phase_start or now)
+            rate = (done - self._phase_start_done) / elapsed if elapsed > 0 else 0
+            self.eta = round((total - done) / rate, 1) if total and rate > 0 else None
+
+        complete = total is not None and done == total
+        if new_phase or complete or now - self._published >= _PROGRESS_INTERVAL:
+            self._published = now
+            EVENTS.publish(TOPIC_JOB, self)
+
+    def to_dict(self):
+        """
+        :return dict: The job, as sent to clients
+        """
+        return {
+            'id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'phase': self.phase,
+            'done': self.done,
+            'total': self.total,
+            'eta': self.eta,
+            'error': self.error,
+            'result': self.result,
+            'created': self.created,
+            'finished': self.finished,
+        }
+
+
+def report(phase=None, done=None, total=None):
+    """
+    Reports the progress of the job running on the current thread, if any. See Job.progress().
+    """
+    job = getattr(_CURRENT, 'job', None)
+    if job is not None:
+        job.progress(phase, done, total)
+
+
+class _JobQueue:
+    """
+    Runs jobs on a pool of _WORKERS threads. Jobs are kept by ID until _KEEP_FINISHED more have finished after them.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._jobs = collections.OrderedDict()
+        self._unfinished = {}
+        self._LOCK = threading.Lock()
+
+    def submit(self, key, name, fn, *args, **kwargs):
+        """
+        Queues a job, unless one with the same key is unfinished.
+
+        :param key: Key of the job. See Job.
+        :param str name: What the job does
+        :param fn: Function to run. Its return value becomes the result of the job, and must be JSON serializable.
+                   It may call report() to publish its progress.
+        :return Job: The job, or the unfinished job with the same key
+        :raises JobQueueFullError: If too many jobs are unfinished
+        """
+        with self._LOCK:
+            if key in self._unfinished:
+                return self._unfinished[key]
+            if len(self._unfinished) >= _MAX_UNFINISHED:
+                raise JobQueueFullError('Too many jobs are running; try again later')
+
+            job = Job(key, name)
+            self._jobs[job.id] = job
+            self._unfinished[key] = job
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=_WORKERS, thread_name_prefix='job')
+            self._executor.submit(self._run, job, fn, args, kwargs)
+
+        EVENTS.publish(TOPIC_JOB, job)
+        return job
+
+    def get(self, job_id):
+        """
+        :param str job_id: ID of a job
+        :return Job or None: The job, unless it is unknown or was forgotten
+        """
+        return self._jobs.get(job_id)
+
+    def unfinished(self):
+        """
+        :return list: The jobs that are queued or running, oldest first
+        """
+        with self._LOCK:
+            return [job for job in self._jobs.values() if job.state in (QUEUED, RUNNING)]
+
+    def _run(self, job, fn, args, kwargs):
+        job.state = RUNNING
+        EVENTS.publish(TOPIC_JOB, job)
+        _CURRENT.job = job
+        try:
+            job.result = fn(*args, **kwargs)
+            job.state = DONE
+        except Exception as e:
+            _LOGGER.exception('Job %s (%s) failed' % (job.id, job.name))
+            job.error = str(e) or type(e).__name__
+            job.state = FAILED
+        finally:
+            _CURRENT.job = None
+            job.finished = time.time()
+            with self._LOCK:
+                del self._unfinished[job.key]
+                finished = [job_id for job_id, j in self._jobs.items() if j.state in (DONE, FAILED)]
+                for job_id in finished[:-_KEEP_FINISHED]:
+                    del self._jobs[job_id]
+            EVENTS.publish(TOPIC_JOB, job)
+
+
+JOBS = _JobQueue()
@@ -1,16 +1,73 @@
 """
 Utility for getting information about a Minecraft user
 """
-import json
-from urllib.parse import urljoin
+import atexit
+import collections
+import email.utils
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
 import requests
 
 from mcadmin.exception import PublicError
+from mcadmin.io.files.files import JsonFileIO
+
+_LOGGER = logging.getLogger(__name__)
 
 _ID = 'id'
 _NAME = 'name'
-_MOJANG_USER_API = 'https://api.mojang.com/users/profiles/minecraft/'
+# Takes a JSON list of up to _BATCH_SIZE names and answers the profiles of those that exist
+_MOJANG_PROFILES_API = 'https://api.mojang.com/profiles/minecraft'
+
+# Minecraft usernames
+_USERNAME = re.compile(r'[A-Za-z0-9_]{1,16}')
+
+# Seconds to wait for the Mojang API to answer
+_TIMEOUT = 10
+
+# Seconds mc_uuid() waits for its lookup, including the time spent queued behind other lookups
+_LOOKUP_TIMEOUT = 10
+
+# Maximum amount of names per request
+_BATCH_SIZE = 10
+
+# Seconds to wait for more names before sending a batch that is not full
+_BATCH_DELAY = 0.05
+
+# Requests per second on average, and at most at once. The API allows about 600 requests per 10 minutes.
+_REQUESTS_PER_SECOND = 1
+_BURST = 10
+
+# Amount of requests in flight
+_WORKERS = 2
+
+# Maximum amount of times a batch is sent before its lookups fail
+_MAX_ATTEMPTS = 5
+
+# Maximum amount of seconds to wait between attempts, unless the API asks for more
+_MAX_BACKOFF_SECONDS = 30
+
+# Persistent store of the UUID cache
+_UUID_CACHE_JSON = 'uuid_cache.json'
+
+# Seconds a UUID that was found is cached for
+_POSITIVE_TTL = 7 * 24 * 60 * 60
+
+# Seconds a name that has no UUID is cached for. Shorter, since the name may be taken at any time.
+_NEGATIVE_TTL = 60 * 60
+
+# Amount of names kept in memory, and in the persistent store
+_MEMORY_ENTRIES = 4096
+_STORE_ENTRIES = 20000
+
+# Seconds to wait after a change before the persistent store is written, so that many lookups cost one write
+_SAVE_DELAY = 5
+
+# Connections to the Mojang API are kept alive between lookups
+_SESSION = requests.Session()
 
 
 class ProfileAPIError(PublicError):
@@ -47,32 +104,380 @@ def _format_mojang_uuid(uuid):
     return uuid[:8] + '-' + uuid[8:12] + '-' + uuid[12:16] + '-' + uuid[16:20] + '-' + uuid[20:]
 
 
+def is_valid_username(username):
+    """
+    :param str username: A name
+    :return bool: True if the name can be the name of a Minecraft account
+
+    >>> is_valid_username('Notch_2'), is_valid_username('not a name')
+    (True, False)
+    """
+    return bool(_USERNAME.fullmatch(username))
+
+
 def mc_uuid(username):
     """
-    Returns the UUID of a Minecraft username.
+    Returns the UUID of a Minecraft username. The answer comes from UUID_CACHE if it has one, and is cached otherwise.
 
     :param str username: Username to look up the UUID for
     :return str: UUID of the user
 
-    :raises ProfileAPIError: If the Mojang API responds erroneously
+    :raises ProfileAPIError: If the Mojang API responds erroneously, or not within _LOOKUP_TIMEOUT seconds
     :raises UUIDNotFoundError: If UUID for username was not found
     """
-    response = requests.get(urljoin(_MOJANG_USER_API, username))
+    try:
+        return RESOLVER.resolve(username).result(_LOOKUP_TIMEOUT)
+    except FutureTimeoutError:
+        raise ProfileAPIError('The UUID of %s could not be looked up in time; try again later' % username)
+
+
+def mc_uuid_async(username):
+    """
+    Looks up the UUID of a Minecraft username without waiting for the answer. See mc_uuid().
+
+    :param str username: Username to look up the UUID for
+    :return Future: Future of the UUID
+    """
+    return RESOLVER.resolve(username)
+
+
+def mc_uuids(usernames):
+    """
+    Looks up the UUIDs of several Minecraft usernames. They are sent to the Mojang API in batches.
+
+    :param usernames: Usernames to look up the UUIDs for
+    :return: Generator of (username, UUID or None, exception or None), in the order of `usernames`
+    """
+    futures = [(username, RESOLVER.resolve(username)) for username in usernames]
+    for username, future in futures:
+        try:
+            yield username, future.result(), None
+        except (PublicError, ValueError, requests.RequestException) as e:
+            yield username, None, e
+
+
+def _retry_after(value):
+    """
+    :param str value: Value of a Retry-After header: seconds or an HTTP date
+    :return float or None: Seconds to wait, or None if the value is missing or invalid
+
+    >>> _retry_after('5')
+    5.0
+    >>> _retry_after('Thu, 01 Jan 1970 00:00:00 GMT')
+    0.0
+    >>> _retry_after('soon') is None
+    True
+    """
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class _TokenBucket:
+    """
+    Allows `rate` requests per second on average, and bursts of up to `capacity` requests.
+    """
+
+    def __init__(self, rate, capacity):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        # No token is handed out before this time. See pause().
+        self._paused_until = 0
+        self._LOCK = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, waiting until one is available.
+        """
+        while True:
+            with self._LOCK:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self._rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Hands out no token for the given amount of seconds, e.g. when the API asks to retry later.
+        """
+        with self._LOCK:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class _UUIDResolver:
+    """
+    Looks up the UUIDs of usernames through the bulk profile API, which takes up to _BATCH_SIZE names per request.
+
+    Names that UUID_CACHE does not know are queued; worker threads send them in batches, at the pace of a token bucket,
+    and complete a Future for each. A name already in the queue shares the Future of the earlier request. Requests that
+    fail, or are rate limited, are retried with backoff; Retry-After is honoured.
+    """
+
+    def __init__(self, url, cache, rate=_REQUESTS_PER_SECOND, burst=_BURST, workers=_WORKERS):
+        """
+        :param str url: URL of the bulk profile API
+        :param _UUIDCache cache: Cache to look names up in first and to store the answers in
+        :param float rate: Average amount of requests per second
+        :param int burst: Maximum amount of requests sent at once after a quiet period
+        :param int workers: Amount of requests in flight
+        """
+        self._url = url
+        self._cache = cache
+        self._bucket = _TokenBucket(rate, burst)
+        self._workers = workers
+        self._CONDITION = threading.Condition()
+        # casefolded name -> (name, Future), in the order they were queued
+        self._pending = collections.OrderedDict()
+        self._started = False
+
+    def resolve(self, username):
+        """
+        :param str username: Username to look up
+        :return Future: Future of the UUID. It raises UUIDNotFoundError if no player has the name, and ProfileAPIError
+                        if the API could not be asked.
+        """
+        uuid, found = self._cache.cached(username)
+        if found or not is_valid_username(username):
+            future = Future()
+            if uuid is None:
+                future.set_exception(UUIDNotFoundError('No UUID found for %s' % username))
+            else:
+                future.set_result(uuid)
+            return future
+
+        key = username.casefold()
+        with self._CONDITION:
+            if key not in self._pending:
+                self._pending[key] = (username, Future())
+                self._start()
+                self._CONDITION.notify()
+            return self._pending[key][1]
+
+    def _start(self):
+        if self._started:
+            return
+        self._started = True
+        for i in range(self._workers):
+            threading.Thread(target=self._worker, name='uuid-resolver-%d' % i, daemon=True).start()
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._resolve_batch(batch)
+            except Exception as e:
+                _LOGGER.exception('Error while looking up UUIDs')
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(ProfileAPIError('Could not look up the UUID: %s' % e))
+
+    def _next_batch(self):
+        """
+        Waits for names to look up, and then a little longer for more to fill the batch.
+
+        :return list: Up to _BATCH_SIZE (name, Future)
+        """
+        with self._CONDITION:
+            while True:
+                while not self._pending:
+                    self._CONDITION.wait()
+                if len(self._pending) < _BATCH_SIZE:
+                    self._CONDITION.wait(_BATCH_DELAY)
+                # Another worker may have taken the names in the meantime
+                if self._pending:
+                    break
+            batch = []
+            while self._pending and len(batch) < _BATCH_SIZE:
+                batch.append(self._pending.popitem(last=False)[1])
+            return batch
+
+    def _resolve_batch(self, batch):
+        error = None
+        for attempt in range(_MAX_ATTEMPTS):
+            self._bucket.acquire()
+            try:
+                response = _SESSION.post(self._url, json=[name for name, _ in batch], timeout=_TIMEOUT)
+            except requests.RequestException as e:
+                error = e
+                self._bucket.pause(min(2 ** attempt, _MAX_BACKOFF_SECONDS))
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                error = 'HTTP %d' % response.status_code
+                delay = _retry_after(response.headers.get('Retry-After'))
+                if delay is None:
+                    delay = min(2 ** attempt, _MAX_BACKOFF_SECONDS)
+                # Waiting longer would stall every lookup; the batch fails instead, and the pause is capped.
+                self._bucket.pause(min(delay, _MAX_BACKOFF_SECONDS))
+                if delay > _MAX_BACKOFF_SECONDS:
+                    error = '%s, retry after %d seconds' % (error, delay)
+                    break
+                _LOGGER.warning('Profile API answered %s; retrying in %.1f seconds' % (error, delay))
+                continue
+            if response.status_code != 200:
+                error = 'HTTP %d: %s' % (response.status_code, response.text[:200])
+                break
+
+            self._complete(batch, response)
+            return
+
+        _LOGGER.error('Could not look up the UUIDs of %s: %s' % (', '.join(name for name, _ in batch), error))
+        for _, future in batch:
+            future.set_exception(ProfileAPIError('Could not look up the UUID: %s' % error))
+
+    def _complete(self, batch, response):
+        try:
+            profiles = response.json()
+            uuids = {profile[_NAME].casefold(): _format_mojang_uuid(profile[_ID]) for profile in profiles}
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise ProfileAPIError('Received erroneous response from Mojang profile API: %s (%s)' % (response.text, e))
+
+        for name, future in batch:
+            uuid = uuids.get(name.casefold())
+            self._cache.put(name, uuid)
+            if uuid is None:
+                future.set_exception(UUIDNotFoundError('No UUID found for %s' % name))
+            else:
+                future.set_result(uuid)
+
+
+class _UUIDCache:
+    """
+    Cache of the UUIDs of Minecraft usernames.
+
+    A lookup is answered by the first of:
+        1. the most recently used names, kept in memory;
+        2. the persistent store, a JSON file that survives restarts;
+        3. the sources, such as the whitelist, ban list and usercache.json of every server, which already know the UUID
+           of many players;
+        4. the Mojang API, through RESOLVER. Its answer is cached in memory and in the store.
+
+    Names that have a UUID are cached for _POSITIVE_TTL seconds, and names that do not for _NEGATIVE_TTL seconds. Names
+    are not case sensitive.
+    """
+
+    def __init__(self, filepath):
+        self._file = JsonFileIO(filepath)
+        self._LOCK = threading.Lock()
+        # casefolded name -> (UUID or None, expiry time)
+        self._memory = collections.OrderedDict()
+        self._store = None  # type: dict
+        self._sources = []
+        self._save_timer = None
+        self._dirty = False
+
+    def add_source(self, source):
+        """
+        :param source: Function that takes a name and returns its UUID, or None if it does not know it
+        """
+        self._sources.append(source)
+
+    def cached(self, username):
+        """
+        Looks a name up without asking the Mojang API.
+
+        :param str username: Name to look up
+        :return: (UUID or None, found). `found` is False if the cache does not know the name; if it is True and the UUID
+                 is None, the cache knows that no player has the name.
+        """
+        key = username.casefold()
+        now = time.time()
+        with self._LOCK:
+            self._load()
+            for tier in (self._memory, self._store):
+                if key in tier:
+                    uuid, expires = tier[key]
+                    if expires > now:
+                        self._remember(key, uuid, expires)
+                        return uuid, True
+                    del tier[key]
+
+        for source in self._sources:
+            uuid = source(username)
+            if uuid:
+                self.put(username, uuid, persist=False)
+                return uuid, True
+        return None, False
+
+    def put(self, username, uuid, persist=True):
+        """
+        Caches the UUID of a name.
+
+        :param str username: Name
+        :param str uuid: Its UUID, or None if no player has the name
+        :param bool persist: Also keep it in the persistent store
+        """
+        key = username.casefold()
+        expires = time.time() + (_POSITIVE_TTL if uuid else _NEGATIVE_TTL)
+        with self._LOCK:
+            self._remember(key, uuid, expires)
+            if persist:
+                self._load()
+                self._store[key] = (uuid, expires)
+                self._dirty = True
+                self._schedule_save()
+
+    def _remember(self, key, uuid, expires):
+        self._memory[key] = (uuid, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > _MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def _load(self):
+        if self._store is not None:
+            return
+        try:
+            data = self._file.reads()
+        except ValueError as e:
+            _LOGGER.error('UUID cache is corrupt; starting over: %s' % e)
+            data = {}
+        now = time.time()
+        self._store = {key: (uuid, expires) for key, (uuid, expires) in data.items() if expires > now}
+
+    def _schedule_save(self):
+        if self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(_SAVE_DELAY, self.save)
+        self._save_timer.daemon = True
+        self._save_timer.start()
 
-    if response.status_code is 204:
-        raise UUIDNotFoundError('No UUID found for %s' % username)
+    def save(self):
+        """
+        Writes the changes to the persistent store. Called _SAVE_DELAY seconds after the first change since the last
+        save, and when Python exits.
+        """
+        with self._LOCK:
+            self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            if len(self._store) > _STORE_ENTRIES:
+                # Forget the names that expire first
+                kept = sorted(self._store.items(), key=lambda item: item[1][1])[-_STORE_ENTRIES:]
+                self._store = dict(kept)
+            data = {key: list(value) for key, value in self._store.items()}
+        try:
+            self._file.write(data)
+        except OSError as e:
+            _LOGGER.error('Could not save the UUID cache: %s' % e)
 
-    elif response.status_code is 200:
-        response = json.loads(response.content)
 
-        if _NAME not in response or _ID not in response:
-            raise ProfileAPIError('Received erroneous response from Mojang profile API: %s' % response.content)
-        elif response[_NAME].casefold() != username.casefold():
-            raise ProfileAPIError(
-                'Mojang API may be problematic: Requested profile for %s but got username %s. The entire response '
-                'was: %s' % (username, response[_NAME], response.content))
-        else:
-            return _format_mojang_uuid(response[_ID])
+UUID_CACHE = _UUIDCache(_UUID_CACHE_JSON)
+atexit.register(UUID_CACHE.save)
 
-    else:
-        raise ValueError('Got response status %d but expected 200' % response.status_code)
+RESOLVER = _UUIDResolver(_MOJANG_PROFILES_API, UUID_CACHE)
@@ -0,0 +1,276 @@
+"""
+Client for the RCON protocol of Minecraft Server.
+
+A packet is a little-endian int32 length, followed by an int32 request ID, an int32 type, an ASCII/UTF-8 body and two
+null bytes. The server answers every packet with packets carrying the same request ID, in the order it received them,
+and splits responses longer than 4096 bytes over several packets without saying how many.
+"""
+import itertools
+import logging
+import socket
+import struct
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+_LOGGER = logging.getLogger(__name__)
+
+# Packet types
+_TYPE_RESPONSE = 0
+_TYPE_COMMAND = 2
+_TYPE_AUTH_RESPONSE = 2
+_TYPE_AUTH = 3
+
+# Request ID the server answers an authentication request with if the password is wrong
+_AUTH_FAILED_ID = -1
+
+# Packet header: length, request ID, type
+_HEADER = struct.Struct('<iii')
+
+# Largest command body the server accepts
+_MAX_COMMAND_LENGTH = 1446
+
+# Largest packet the server sends, to detect a corrupt stream
+_MAX_PACKET_LENGTH = 4096 + 10
+
+DEFAULT_PORT = 25575
+
+# Default maximum amount of seconds to wait for a connection or a response
+DEFAULT_TIMEOUT = 5
+
+
+class RconError(Exception):
+    """
+    Raised when an RCON connection fails or is closed.
+    """
+
+
+class RconAuthError(RconError):
+    """
+    Raised when the server rejects the RCON password.
+    """
+
+
+class RconTimeoutError(RconError):
+    """
+    Raised when the server does not respond to an RCON request in time.
+    """
+
+
+def encode_packet(request_id, type_, body):
+    """
+    >>> encode_packet(1, _TYPE_COMMAND, 'list')
+    b'\\x0e\\x00\\x00\\x00\\x01\\x00\\x00\\x00\\x02\\x00\\x00\\x00list\\x00\\x00'
+    """
+    payload = body.encode('utf-8') + b'\x00\x00'
+    return _HEADER.pack(len(payload) + 8, request_id, type_) + payload
+
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise RconError('Connection closed by the server')
+        data += chunk
+    return data
+
+
+def read_packet(sock):
+    """
+    Reads a packet from a socket.
+
+    :return tuple: (request ID, type, body)
+    :raise RconError: If the connection is closed or the packet is malformed
+    """
+    length, request_id, type_ = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    if not 10 <= length <= _MAX_PACKET_LENGTH:
+        raise RconError('Malformed packet of length %d' % length)
+    body = _recv_exactly(sock, length - 8)
+    return request_id, type_, body[:-2].decode('utf-8', errors='replace')
+
+
+class RconConnection:
+    """
+    An authenticated RCON connection that can have many requests in flight.
+
+    Requests are pipelined: they are written as soon as they are made, and a reader thread hands every response packet
+    to the request with the same ID. Since the end of a response is not marked, every command is followed by an empty
+    packet of type RESPONSE, which the server answers with a single packet. As responses arrive in order, the response
+    to a command is complete once the answer to the packet that follows it arrives.
+    """
+
+    def __init__(self, host, port, password, timeout=DEFAULT_TIMEOUT):
+        self._address = (host, port)
+        self._password = password
+        self._timeout = timeout
+
+        self._sock = None  # type: socket.socket or None
+        self._SEND_LOCK = threading.Lock()
+        self._ids = itertools.count(1)
+
+        # Request ID of a command -> (Future, list of the bodies received so far)
+        self._pending = {}
+        # Request ID of the packet following a command -> request ID of the command
+        self._markers = {}
+        self._PENDING_LOCK = threading.Lock()
+        self.closed = False
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    def connect(self):
+        """
+        Connects and authenticates.
+
+        :raise OSError: If the server cannot be reached
+        :raise RconAuthError: If the password is wrong
+        """
+        sock = socket.create_connection(self._address, timeout=self._timeout)
+        try:
+            auth_id = next(self._ids)
+            sock.sendall(encode_packet(auth_id, _TYPE_AUTH, self._password))
+            while True:
+                request_id, type_, _ = read_packet(sock)
+                if type_ != _TYPE_AUTH_RESPONSE:
+                    continue
+                if request_id == _AUTH_FAILED_ID:
+                    raise RconAuthError('RCON password rejected by %s:%d' % self._address)
+                if request_id == auth_id:
+                    break
+        except (OSError, RconError):
+            sock.close()
+            raise
+
+        # Reads block on the reader thread; only connecting and authenticating time out.
+        sock.settimeout(None)
+        self._sock = sock
+        threading.Thread(target=self._read_worker, name='rcon-reader', daemon=True).start()
+
+    def execute(self, command, timeout=None):
+        """
+        Runs a command.
+
+        :param str command: The command, without the leading slash
+        :param float timeout: Maximum amount of seconds to wait for the response. Defaults to the connection timeout.
+        :return str: The response
+        :raise RconTimeoutError: If the response does not arrive in time
+        :raise RconError: If the connection is closed
+        """
+        if len(command.encode('utf-8')) > _MAX_COMMAND_LENGTH:
+            raise ValueError('Command must not exceed %d bytes' % _MAX_COMMAND_LENGTH)
+
+        future = Future()
+        with self._SEND_LOCK:
+            if self.closed or self._sock is None:
+                raise RconError('Connection is closed')
+            command_id, marker_id = next(self._ids), next(self._ids)
+            with self._PENDING_LOCK:
+                self._pending[command_id] = (future, [])
+                self._markers[marker_id] = command_id
+            try:
+                self._sock.sendall(encode_packet(command_id, _TYPE_COMMAND, command) +
+                                   encode_packet(marker_id, _TYPE_RESPONSE, ''))
+            except OSError as e:
+                self.close(RconError('Could not send RCON request: %s' % e))
+
+        try:
+            return future.result(self._timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            # The response may still arrive; it is dropped by the reader since nothing waits for it anymore.
+            with self._PENDING_LOCK:
+                self._pending.pop(command_id, None)
+            raise RconTimeoutError('No response to `%s` within the timeout' % command)
+
+    def close(self, error=None):
+        """
+        Closes the connection and fails every request in flight.
+
+        :param RconError error: Exception to fail them with
+        """
+        with self._PENDING_LOCK:
+            if self.closed:
+                return
+            self.closed = True
+            pending, self._pending, self._markers = self._pending, {}, {}
+
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+
+        for future, _ in pending.values():
+            future.set_exception(error or RconError('Connection closed'))
+
+    def _read_worker(self):
+        try:
+            while not self.closed:
+                request_id, _, body = read_packet(self._sock)
+                with self._PENDING_LOCK:
+                    command_id = self._markers.pop(request_id, None)
+                    if command_id is not None:
+                        entry = self._pending.pop(command_id, None)
+                        if entry is not None:
+                            future, parts = entry
+                            future.set_result(''.join(parts))
+                    elif request_id in self._pending:
+                        self._pending[request_id][1].append(body)
+        except (OSError, RconError, struct.error) as e:
+            if not self.closed:
+                _LOGGER.warning('RCON connection to %s:%d lost: %s' % (self._address + (e,)))
+            self.close(RconError('Connection lost: %s' % e))
+
+
+class RconPool:
+    """
+    A small pool of RCON connections to one server.
+
+    Connections are opened when first needed, and every command goes to the open connection with the fewest requests in
+    flight. Connections that break are replaced by the next command.
+    """
+
+    def __init__(self, host, port, password, size=2, timeout=DEFAULT_TIMEOUT):
+        self.address = (host, port)
+        self._password = password
+        self._size = size
+        self._timeout = timeout
+        self._connections = []  # type: list[RconConnection]
+        self._LOCK = threading.Lock()
+
+    def execute(self, command, timeout=None):
+        """
+        Runs a command on one of the connections of the pool. See RconConnection.execute().
+
+        :raise OSError: If the server cannot be reached
+        :raise RconAuthError: If the password is wrong
+        """
+        connection = self._acquire()
+        try:
+            return connection.execute(command, timeout)
+        except RconTimeoutError:
+            raise
+        except RconError:
+            if not connection.closed:
+                raise
+            # The connection broke, possibly long before this command: try once more on a fresh one.
+            return self._acquire().execute(command, timeout)
+
+    def close(self):
+        with self._LOCK:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+    def _acquire(self):
+        with self._LOCK:
+            self._connections = [c for c in self._connections if not c.closed]
+            idle = [c for c in self._connections if c.in_flight == 0]
+            if idle or len(self._connections) >= self._size:
+                return (idle or sorted(self._connections, key=lambda c: c.in_flight))[0]
+
+            connection = RconConnection(self.address[0], self.address[1], self._password, self._timeout)
+            connection.connect()
+            self._connections.append(connection)
+            return connection
@@ -0,0 +1,182 @@
+"""
+Publish/subscribe fan-out of server events (console lines, status changes, ...) to any number of subscribers.
+"""
+import collections
+import logging
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# Maximum amount of events that are coalesced into a single batch
+_DEFAULT_BATCH_SIZE = 64
+
+# Maximum amount of time, in seconds, that an event waits for other events to be batched with it
+_DEFAULT_BATCH_INTERVAL = 0.05
+
+# Maximum amount of batches that may be waiting in the queue of a subscriber before it is considered too slow and
+# disconnected
+_DEFAULT_QUEUE_SIZE = 256
+
+
+class SubscriptionClosedError(Exception):
+    """
+    Raised when reading from a subscription that was closed, either by its owner or by the broker because the
+    subscriber could not keep up.
+    """
+
+
+class Subscription:
+    """
+    A subscriber's bounded queue of event batches. Obtain one with `Broker.subscribe()`.
+
+    A batch is a list of (topic, item) tuples in the order they were published.
+    """
+
+    def __init__(self, broker, topics, maxsize):
+        self._broker = broker
+        self._topics = None if topics is None else frozenset(topics)
+        self._maxsize = maxsize
+        self._batches = collections.deque()
+        self._cond = threading.Condition()
+        self.closed = False
+
+        # True if the broker closed the subscription because its queue was full
+        self.overflowed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def wants(self, topic):
+        """
+        :return bool: True if this subscription is interested in events of `topic`.
+        """
+        return self._topics is None or topic in self._topics
+
+    def get(self, timeout=None):
+        """
+        Waits for the next batch of events.
+
+        :param float timeout: Maximum amount of seconds to wait. Waits forever if None.
+        :return list or None: The next batch, or None if the timeout expired first.
+        :raises SubscriptionClosedError: If the subscription is closed and there are no batches left to read.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._batches or self.closed, timeout)
+            if self._batches:
+                return self._batches.popleft()
+            if self.closed:
+                raise SubscriptionClosedError('Subscription is closed')
+            return None
+
+    def close(self):
+        """
+        Unsubscribes from the broker. Batches that are already queued can still be read.
+        """
+        self._broker.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _offer(self, batch):
+        """
+        Queues a batch. Closes the subscription if its queue is full.
+        """
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._batches) >= self._maxsize:
+                _LOGGER.warning('Subscriber is too slow; disconnecting it.')
+                self.overflowed = True
+                self.closed = True
+                self._broker.unsubscribe(self)
+            else:
+                self._batches.append(batch)
+            self._cond.notify_all()
+
+
+class Broker:
+    """
+    Sits between the threads that produce events and the threads that consume them.
+
+    Published events are coalesced into batches: a batch is delivered once `batch_size` events are pending or once the
+    first pending event has waited `batch_interval` seconds, whichever happens first. Delivery happens on a dedicated
+    thread, so publishing never blocks on subscribers, and each subscriber is woken up at most once per batch instead of
+    once per event.
+    """
+
+    def __init__(self, batch_size=_DEFAULT_BATCH_SIZE, batch_interval=_DEFAULT_BATCH_INTERVAL,
+                 queue_size=_DEFAULT_QUEUE_SIZE):
+        """
+        :param int batch_size: Maximum amount of events per batch
+        :param float batch_interval: Maximum amount of seconds an event is held back to be batched with others
+        :param int queue_size: Default maximum amount of batches queued per subscriber
+        """
+        self._batch_size = batch_size
+        self._batch_interval = batch_interval
+        self._queue_size = queue_size
+
+        # Replaced instead of mutated, so that it can be iterated over without holding the lock.
+        self._subscribers = ()
+        self._SUBSCRIBERS_LOCK = threading.Lock()
+
+        self._pending = []
+        self._PENDING = threading.Condition()
+        self._thread = None
+
+    def subscribe(self, topics=None, maxsize=None):
+        """
+        :param topics: Topics to receive events of. Receives all topics if None.
+        :param int maxsize: Maximum amount of batches queued for the subscriber. Uses the broker's default if None.
+        :return Subscription:
+        """
+        sub = Subscription(self, topics, self._queue_size if maxsize is None else maxsize)
+        with self._SUBSCRIBERS_LOCK:
+            self._subscribers += (sub,)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._SUBSCRIBERS_LOCK:
+            self._subscribers = tuple(s for s in self._subscribers if s is not sub)
+
+    def publish(self, topic, item):
+        """
+        Publishes an event. Returns immediately.
+
+        :param str topic: Topic of the event
+        :param item: Payload of the event
+        """
+        with self._PENDING:
+            self._pending.append((topic, item))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_worker, name='broker-flush', daemon=True)
+                self._thread.start()
+            if len(self._pending) == 1 or len(self._pending) >= self._batch_size:
+                self._PENDING.notify()
+
+    def _flush_worker(self):
+        """
+        Collects pending events into batches and hands them out to the subscribers.
+        """
+        while True:
+            with self._PENDING:
+                self._PENDING.wait_for(lambda: self._pending)
+
+                deadline = time.monotonic() + self._batch_interval
+                while len(self._pending) < self._batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._PENDING.wait(remaining)
+
+                batch = self._pending[:self._batch_size]
+                del self._pending[:self._batch_size]
+
+            # noinspection PyProtectedMember
+            for sub in self._subscribers:
+                events = [e for e in batch if sub.wants(e[0])]
+                if events:
+                    sub._offer(events)
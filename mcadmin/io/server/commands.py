@@ -0,0 +1,220 @@
+"""
+Sends commands to the Minecraft Server console and collects the lines it answers with.
+"""
+import logging
+import re
+import threading
+import time
+
+from mcadmin.io.server.events import strip_prefix
+
+_LOGGER = logging.getLogger(__name__)
+
+# Default maximum amount of seconds to wait for the response to a command
+DEFAULT_TIMEOUT = 5
+
+# Default amount of seconds without a new matching line after which a response without an `until` is complete
+DEFAULT_QUIET = 0.25
+
+# Response to `list`:
+#   1.13 and newer: There are 2 of a max of 20 players online: Steve, Alex
+#   Before 1.13:    There are 2/20 players online:
+#                   Steve, Alex
+_PLAYER_LIST = re.compile(r'There are (?P<count>\d+)(?:/| of a max (?:of )?)(?P<max>\d+) players online:(?P<names>.*)')
+
+
+class CommandTimeoutError(Exception):
+    """
+    Raised when the response to a command is not complete within its timeout.
+    """
+
+    def __init__(self, message, messages=()):
+        """
+        :param str message: Error message
+        :param messages: The response lines collected before the timeout
+        """
+        super().__init__(message)
+        self.messages = list(messages)
+
+
+def matcher(match):
+    """
+    Normalizes the `match` and `until` arguments of CommandChannel.execute().
+
+    :param match: None, a regular expression string or pattern, or a function
+    :return: A function of a message that returns whether it matches
+
+    >>> matcher(r'players? online')('There are 0 of a max 20 players online:')
+    True
+    >>> matcher(None)('anything')
+    True
+    """
+    if match is None:
+        return lambda message: True
+    if isinstance(match, str):
+        match = re.compile(match)
+    if hasattr(match, 'search'):
+        return lambda message, pattern=match: pattern.search(message) is not None
+    return match
+
+
+class _Collector:
+    """
+    Collects the response to a single command, on the console reader thread, until it is complete.
+    """
+
+    def __init__(self, match, until, quiet):
+        self._match = matcher(match)
+        if until is None or callable(until) and not hasattr(until, 'search'):
+            self._until = until
+        else:
+            last_matches = matcher(until)
+            self._until = lambda messages: last_matches(messages[-1])
+        self._quiet = quiet
+
+        self._CONDITION = threading.Condition()
+        self.messages = []
+        self._complete = False
+        self._last_match = None
+
+    def offer(self, line):
+        """
+        :param ConsoleLine line: A line read after the command was sent
+        """
+        message = strip_prefix(line.text)
+        if not self._match(message):
+            return
+        with self._CONDITION:
+            if self._complete:
+                return
+            self.messages.append(message)
+            self._last_match = time.monotonic()
+            if self._until is not None and self._until(self.messages):
+                self._complete = True
+            self._CONDITION.notify_all()
+
+    def wait(self, deadline):
+        """
+        :param float deadline: time.monotonic() value after which to give up
+        :return list: The response
+        :raise CommandTimeoutError: If the response is not complete by the deadline
+        """
+        with self._CONDITION:
+            while not self._complete:
+                now = time.monotonic()
+                wake = deadline
+                if self._until is None and self._last_match is not None:
+                    # Without an `until`, the response is complete once the server goes quiet.
+                    wake = min(wake, self._last_match + self._quiet)
+                    if now >= self._last_match + self._quiet:
+                        break
+                if now >= deadline:
+                    if self._until is None and self.messages:
+                        break
+                    raise CommandTimeoutError('No complete response within the timeout', self.messages)
+                self._CONDITION.wait(wake - now)
+
+            self._complete = True
+            return list(self.messages)
+
+
+class CommandChannel:
+    """
+    Runs console commands and returns their responses.
+
+    The console has no request IDs, so the response to a command is recognised as the lines read after it is sent that
+    match a pattern. To keep responses from getting mixed up, commands are run one at a time: concurrent callers queue
+    up on a lock, and only the caller whose command is in flight receives lines.
+    """
+
+    def __init__(self, send):
+        """
+        :param send: Function that sends a line of input to the console, e.g. Server.input_line
+        """
+        self._send = send
+        self._COMMAND_LOCK = threading.Lock()
+        self._collector = None  # type: _Collector or None
+
+    def on_line(self, line):
+        """
+        Hands a console line to the command in flight, if any. Called by the server for every line it reads.
+
+        :param ConsoleLine line: The line
+        """
+        collector = self._collector
+        if collector is not None:
+            collector.offer(line)
+
+    def execute(self, command, match=None, until=None, timeout=DEFAULT_TIMEOUT, quiet=DEFAULT_QUIET):
+        """
+        Sends a command and waits for its response.
+
+        :param str command: The command, without the leading slash
+        :param match: Which lines belong to the response: a regular expression (string or pattern) searched in the
+                      message of the line (the line without its log prefix), or a function of the message. Every line
+                      read belongs to it if None.
+        :param until: When the response is complete: a regular expression searched in the message of the last matching
+                      line, or a function of the list of messages collected so far. If None, the response is complete
+                      once no matching line has been read for `quiet` seconds.
+        :param float timeout: Maximum amount of seconds to wait, including the time spent queued behind other commands
+        :param float quiet: See `until`
+        :return list: The messages of the response, in the order they were read
+        :raise CommandTimeoutError: If the response is not complete within the timeout. With no `until`, only raised if
+                                    no matching line was read at all.
+        :raise ServerNotRunningError: If the server is not running
+        """
+        deadline = time.monotonic() + timeout
+        if not self._COMMAND_LOCK.acquire(timeout=timeout):
+            raise CommandTimeoutError('Timed out waiting for other commands to finish')
+        try:
+            collector = _Collector(match, until, quiet)
+            self._collector = collector
+            try:
+                self._send(command)
+                return collector.wait(deadline)
+            finally:
+                self._collector = None
+        finally:
+            self._COMMAND_LOCK.release()
+
+
+def player_list_complete(messages):
+    """
+    `until` for the response to `list`.
+
+    >>> player_list_complete(['There are 2/20 players online:'])
+    False
+    >>> player_list_complete(['There are 2/20 players online:', 'Steve, Alex'])
+    True
+    >>> player_list_complete(['There are 0 of a max of 20 players online: '])
+    True
+    """
+    for i, message in enumerate(messages):
+        match = _PLAYER_LIST.search(message)
+        if match is not None:
+            # Newer servers list the names on the same line; older ones on the next one, unless nobody is online.
+            return bool(match.group('names').strip()) or match.group('count') == '0' or i + 1 < len(messages)
+    return False
+
+
+def parse_player_list(messages):
+    """
+    :param list messages: The response to `list`
+    :return list: The names of the players online
+
+    >>> parse_player_list(['There are 2 of a max of 20 players online: Steve, Alex'])
+    ['Steve', 'Alex']
+    >>> parse_player_list(['There are 2/20 players online:', 'Steve, Alex'])
+    ['Steve', 'Alex']
+    >>> parse_player_list(['There are 0/20 players online:'])
+    []
+    """
+    for i, message in enumerate(messages):
+        match = _PLAYER_LIST.search(message)
+        if match is None:
+            continue
+        names = match.group('names').strip()
+        if not names and match.group('count') != '0' and i + 1 < len(messages):
+            names = messages[i + 1]
+        return [name.strip() for name in names.split(',') if name.strip()]
+    raise ValueError('Not a response to `list`: %s' % messages)
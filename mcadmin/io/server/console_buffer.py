@@ -0,0 +1,93 @@
+"""
+In-memory history of the Minecraft Server console.
+"""
+import collections
+import itertools
+import threading
+
+
+class ConsoleBuffer:
+    """
+    A thread-safe ring buffer of console lines.
+
+    Every line appended to the buffer is given a sequence number that is one greater than the one of the line before
+    it. Sequence numbers are never reused, so a reader that remembers the sequence number of the last line it saw can
+    ask for everything that came after it with `since()`.
+    """
+
+    def __init__(self, maxlen, start_seq=1):
+        """
+        :param int maxlen: Maximum amount of lines kept in the buffer. Older lines are discarded first.
+        :param int start_seq: Sequence number of the first line that will be appended.
+        """
+        self._entries = collections.deque(maxlen=maxlen)
+        self._next_seq = start_seq
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def last_seq(self):
+        """
+        :return int: Sequence number of the most recently appended line, or one less than the first sequence number
+                     that will be given out if the buffer has never had anything appended to it.
+        """
+        return self._next_seq - 1
+
+    def append(self, line):
+        """
+        Appends a line to the buffer.
+
+        :param line: Line to append
+        :return int: The sequence number given to the line
+        """
+        with self._lock:
+            seq = self._next_seq
+            self._entries.append((seq, line))
+            self._next_seq += 1
+            return seq
+
+    def since(self, seq):
+        """
+        Returns the lines that come after a sequence number.
+
+        If `seq` is older than the oldest line still in the buffer, every line in the buffer is returned. If `seq` is
+        newer than the last line ever appended (for instance, because the client remembers a sequence number from a
+        previous run of MCAdmin), it is considered stale and every line in the buffer is returned as well.
+
+        :param int seq: Sequence number of the last line seen by the caller
+        :return list: (seq, line) tuples in ascending order of sequence number
+
+        >>> b = ConsoleBuffer(3)
+        >>> for line in 'abcd':
+        ...     _ = b.append(line)
+        >>> b.since(2)
+        [(3, 'c'), (4, 'd')]
+        >>> b.since(0)
+        [(2, 'b'), (3, 'c'), (4, 'd')]
+        >>> b.since(4)
+        []
+        >>> b.since(99)
+        [(2, 'b'), (3, 'c'), (4, 'd')]
+        """
+        with self._lock:
+            if not self._entries:
+                return []
+            first_seq = self._entries[0][0]
+            if seq >= self._next_seq or seq < first_seq:
+                return list(self._entries)
+            return list(itertools.islice(self._entries, seq - first_seq + 1, None))
+
+    def entries(self):
+        """
+        :return list: All (seq, line) tuples currently held by the buffer, oldest first.
+        """
+        with self._lock:
+            return list(self._entries)
+
+    def lines(self):
+        """
+        :return list: All lines currently held by the buffer, oldest first.
+        """
+        return [line for _, line in self.entries()]
@@ -0,0 +1,137 @@
+"""
+Reads the output of the Minecraft Server process.
+"""
+import codecs
+import collections
+import logging
+import os
+import selectors
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# Maximum amount of bytes read from a pipe at once
+_CHUNK_SIZE = 64 * 1024
+
+# Streams a console line can come from
+STDOUT = 'stdout'
+STDERR = 'stderr'
+
+# A line of console output.
+# text: The line, without its line terminator
+# stream: STDOUT or STDERR
+# time: When the line was read, in seconds since the epoch
+ConsoleLine = collections.namedtuple('ConsoleLine', 'text stream time')
+
+
+class _LineSplitter:
+    """
+    Decodes the output of a stream incrementally and splits it into lines.
+
+    Invalid UTF-8 is replaced instead of raising, and multibyte sequences split across two chunks are decoded
+    correctly.
+
+    >>> s = _LineSplitter(STDOUT)
+    >>> s.feed(b'one\\r\\ntw')
+    ['one']
+    >>> s.feed(b'o \\xc3')
+    []
+    >>> s.feed(b'\\xa9\\n\\xff\\nrest')
+    ['two é', '�']
+    >>> s.feed(b'', final=True)
+    ['rest']
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._partial = ''
+
+    def feed(self, data, final=False):
+        """
+        :param bytes data: A chunk of output
+        :param bool final: True if this is the last chunk of the stream
+        :return list: The lines completed by the chunk
+        """
+        text = self._decoder.decode(data, final)
+        if self._partial:
+            text = self._partial + text
+        lines = text.split('\n')
+        self._partial = lines.pop()
+        if final and self._partial:
+            lines.append(self._partial)
+            self._partial = ''
+        return [line[:-1] if line.endswith('\r') else line for line in lines]
+
+
+class ConsoleReader:
+    """
+    Drains the stdout and stderr pipes of a process on a single thread, in large chunks, and hands every line to a
+    callback as a ConsoleLine.
+
+    Both pipes have to be drained: a process that fills one of its pipes blocks on its next write to it.
+    """
+
+    def __init__(self, proc, on_line):
+        """
+        :param Popen proc: Process to read the output of. Its stdout and stderr must be pipes.
+        :param on_line: Function called with every ConsoleLine read, on the reader thread
+        """
+        self._proc = proc
+        self._on_line = on_line
+
+    def start(self):
+        """
+        Starts reading on a new thread. The thread ends once both pipes are closed.
+        """
+        threading.Thread(target=self._read_worker, name='console-reader', daemon=True).start()
+
+    def _read_worker(self):
+        pipes = ((self._proc.stdout, STDOUT), (self._proc.stderr, STDERR))
+
+        if os.name == 'nt':
+            # Windows cannot select() on pipes; fall back to a blocking thread per pipe.
+            threads = [threading.Thread(target=self._drain_blocking, args=(pipe, _LineSplitter(stream)), daemon=True)
+                       for pipe, stream in pipes]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return
+
+        with selectors.DefaultSelector() as sel:
+            for pipe, stream in pipes:
+                os.set_blocking(pipe.fileno(), False)
+                sel.register(pipe.fileno(), selectors.EVENT_READ, _LineSplitter(stream))
+
+            while sel.get_map():
+                for key, _ in sel.select():
+                    try:
+                        data = os.read(key.fd, _CHUNK_SIZE)
+                    except BlockingIOError:
+                        continue
+                    if not data:
+                        sel.unregister(key.fd)
+                    self._emit(key.data, data)
+
+        _LOGGER.debug('Console reader finished')
+
+    def _drain_blocking(self, pipe, splitter):
+        while True:
+            data = pipe.read1(_CHUNK_SIZE)
+            self._emit(splitter, data)
+            if not data:
+                return
+
+    def _emit(self, splitter, data):
+        """
+        Feeds a chunk to a splitter and passes on the completed lines. An empty chunk marks the end of the stream.
+        """
+        now = time.time()
+        for text in splitter.feed(data, final=not data):
+            try:
+                self._on_line(ConsoleLine(text, splitter.stream, now))
+            except Exception:
+                # A failing consumer must not stop the pipes from being drained.
+                _LOGGER.exception('Error while handling console line: %s' % text)
@@ -0,0 +1,200 @@
+"""
+Turns Minecraft Server console lines into typed events.
+
+Every event is a namedtuple whose first field, `line`, is the ConsoleLine it was parsed from.
+"""
+import collections
+import logging
+import re
+
+from mcadmin.io.mc_profile import is_valid_username
+
+_LOGGER = logging.getLogger(__name__)
+
+PlayerJoined = collections.namedtuple('PlayerJoined', 'line player')
+PlayerLeft = collections.namedtuple('PlayerLeft', 'line player')
+ChatMessage = collections.namedtuple('ChatMessage', 'line player message')
+PlayerDied = collections.namedtuple('PlayerDied', 'line player message')
+# millis: How far behind the server is. ticks: How many ticks it skipped, if it says.
+ServerLagging = collections.namedtuple('ServerLagging', 'line millis ticks')
+# seconds: How long the server took to start
+ServerReady = collections.namedtuple('ServerReady', 'line seconds')
+WorldSaving = collections.namedtuple('WorldSaving', 'line message')
+ExceptionRaised = collections.namedtuple('ExceptionRaised', 'line exception message')
+
+# Log prefixes, by the first character of the line they start with:
+#   1.7 and newer: [12:34:56] [Server thread/INFO]: message
+#   Spigot/Paper:  [12:34:56 INFO]: message
+#   Before 1.7:    2013-01-01 12:34:56 [INFO] message
+_PREFIXES = {
+    '[': re.compile(r'\[\d\d:\d\d:\d\d(?:\] \[[^\]]*/| )(?P<level>[A-Z]+)\]: '),
+    '2': re.compile(r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d \[(?P<level>[A-Z]+)\] '),
+}
+
+_JOINED = ' joined the game'
+_LEFT = ' left the game'
+_CHAT = re.compile(r'<(?P<player>[^>]+)> (?P<message>.*)')
+_READY = re.compile(r'Done \((?P<seconds>[\d.,]+)s\)!')
+_LAGGING = re.compile(r"Can't keep up!.*?Running (?P<millis>\d+)ms(?: or (?P<ticks>\d+) ticks)? behind"
+                      r"(?:, skipping (?P<skipped>\d+) tick)?")
+_EXCEPTION = re.compile(r'(?:Exception in thread "[^"]*" )?'
+                        r'(?P<exception>(?:[\w$]+\.)+[\w$]*(?:Exception|Error|Throwable))(?:: (?P<message>.*))?')
+
+# How vanilla death messages continue after the name of the player
+_DEATH_PHRASES = (
+    'was ', 'walked into', 'drowned', 'experienced kinetic energy', 'blew up', 'hit the ground too hard', 'fell ',
+    'went up in flames', 'went off with a bang', 'burned to death', 'tried to swim in lava', 'discovered the floor was',
+    'suffocated', 'starved to death', 'withered away', 'froze to death', 'died', 'didn\'t want to live',
+    'left the confines of this world',
+)
+
+
+def strip_prefix(text):
+    """
+    Removes the log prefix from a console line.
+
+    >>> strip_prefix('[10:00:00] [Server thread/INFO]: There are 0 of a max 20 players online: ')
+    'There are 0 of a max 20 players online: '
+    >>> strip_prefix('java.lang.NullPointerException')
+    'java.lang.NullPointerException'
+    """
+    prefix = _PREFIXES.get(text[:1])
+    match = prefix.match(text) if prefix is not None else None
+    return text if match is None else text[match.end():]
+
+
+class ConsoleParser:
+    """
+    Parses console lines into events and hands them to the functions subscribed to their type.
+
+    Lines are matched with precompiled patterns. The log prefix is matched by the pattern for the first character of
+    the line, and the message is then only matched against the patterns that can apply to its log level, after a cheap
+    string check, so that most lines cost one or two regex matches.
+
+    Death messages have no fixed shape, so the parser keeps track of who is online and only treats a message as a death
+    if it starts with the name of an online player followed by one of _DEATH_PHRASES.
+    """
+
+    def __init__(self):
+        self._subscribers = collections.defaultdict(list)
+        self._online = set()
+
+    def subscribe(self, event_type, callback):
+        """
+        :param event_type: Event class to receive, e.g. PlayerJoined
+        :param callback: Function called with every event of that type, on the console reader thread
+        """
+        self._subscribers[event_type].append(callback)
+
+    def unsubscribe(self, event_type, callback):
+        self._subscribers[event_type].remove(callback)
+
+    def reset(self):
+        """
+        Forgets who is online. Called when the server stops.
+        """
+        self._online.clear()
+
+    def feed(self, line):
+        """
+        Parses a line and dispatches its event, if any.
+
+        :param ConsoleLine line: The line
+        :return: The event, or None if the line is not one
+        """
+        event = self.parse(line)
+        if event is not None:
+            for callback in self._subscribers.get(type(event), ()):
+                try:
+                    callback(event)
+                except Exception:
+                    _LOGGER.exception('Error in %s subscriber' % type(event).__name__)
+        return event
+
+    def parse(self, line):
+        """
+        :param ConsoleLine line: The line
+        :return: The event, or None if the line is not one
+
+        >>> from mcadmin.io.server.console_reader import ConsoleLine
+        >>> p = ConsoleParser()
+        >>> p.parse(ConsoleLine('[10:00:00] [Server thread/INFO]: Steve joined the game', 'stdout', 0)).player
+        'Steve'
+        >>> p.parse(ConsoleLine('[10:00:01] [Server thread/INFO]: <Steve> hi all', 'stdout', 0)).message
+        'hi all'
+        >>> p.parse(ConsoleLine('[10:00:01] [Server thread/INFO]: <Steve> Alex joined the game', 'stdout', 0))[1:]
+        ('Steve', 'Alex joined the game')
+        >>> p.parse(ConsoleLine('[10:00:01] [Server thread/INFO]: [Server] Alex left the game', 'stdout', 0)) is None
+        True
+        >>> p.parse(ConsoleLine('[10:00:02] [Server thread/INFO]: Steve was slain by Zombie', 'stdout', 0)).message
+        'Steve was slain by Zombie'
+        >>> p.parse(ConsoleLine('[10:00:03] [Server thread/INFO]: Alex was slain by Zombie', 'stdout', 0)) is None
+        True
+        >>> e = p.parse(ConsoleLine("[10:00:04 WARN]: Can't keep up! Is the server overloaded? "
+        ...                         "Running 2345ms or 46 ticks behind", 'stdout', 0))
+        >>> e.millis, e.ticks
+        (2345, 46)
+        >>> p.parse(ConsoleLine('2013-01-01 10:00:05 [INFO] Done (3.14s)! For help, type "help"', 'stdout', 0)).seconds
+        3.14
+        >>> p.parse(ConsoleLine('java.lang.NullPointerException: oops', 'stderr', 0)).exception
+        'java.lang.NullPointerException'
+        """
+        text = line.text
+        prefix = _PREFIXES.get(text[:1])
+        match = prefix.match(text) if prefix is not None else None
+        if match is None:
+            # Unprefixed lines are usually stack traces printed by the JVM
+            return self._parse_exception(line, text)
+
+        level = match.group('level')
+        message = text[match.end():]
+        if level == 'INFO':
+            return self._parse_info(line, message)
+        if level == 'WARN' and message.startswith("Can't keep up!"):
+            match = _LAGGING.match(message)
+            if match is not None:
+                ticks = match.group('ticks') or match.group('skipped')
+                return ServerLagging(line, int(match.group('millis')), int(ticks) if ticks else None)
+        return self._parse_exception(line, message)
+
+    def _parse_info(self, line, message):
+        # Chat comes first, so that players cannot fake joins and leaves by saying "<name> joined the game"
+        if message.startswith('<'):
+            match = _CHAT.match(message)
+            if match is not None:
+                return ChatMessage(line, match.group('player'), match.group('message'))
+
+        if message.endswith(_JOINED):
+            player = message[:-len(_JOINED)]
+            if is_valid_username(player):
+                self._online.add(player)
+                return PlayerJoined(line, player)
+
+        if message.endswith(_LEFT):
+            player = message[:-len(_LEFT)]
+            if is_valid_username(player):
+                self._online.discard(player)
+                return PlayerLeft(line, player)
+
+        if message.startswith('Done ('):
+            match = _READY.match(message)
+            if match is not None:
+                return ServerReady(line, float(match.group('seconds').replace(',', '.')))
+
+        if message.startswith(('Saving', 'Saved the game')):
+            return WorldSaving(line, message)
+
+        player, _, rest = message.partition(' ')
+        if player in self._online and rest.startswith(_DEATH_PHRASES):
+            return PlayerDied(line, player, message)
+
+        return None
+
+    @staticmethod
+    def _parse_exception(line, message):
+        if 'Exception' not in message and 'Error' not in message and 'Throwable' not in message:
+            return None
+        match = _EXCEPTION.match(message)
+        if match is None:
+            return None
+        return ExceptionRaised(line, match.group('exception'), match.group('message'))
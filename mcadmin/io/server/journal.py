@@ -0,0 +1,358 @@
+"""
+Persistent history of the Minecraft Server console.
+"""
+import bisect
+import glob
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from mcadmin.io.server.console_reader import ConsoleLine
+
+_LOGGER = logging.getLogger(__name__)
+
+# A segment is closed and a new one started once it grows past this many bytes
+_SEGMENT_SIZE = 8 * 1024 * 1024
+
+# Maximum amount of segments kept on disk. The oldest segments are deleted first.
+_MAX_SEGMENTS = 64
+
+# One record out of this many is added to the offset index of its segment
+_INDEX_INTERVAL = 64
+
+# Maximum amount of seconds appended records may stay in the write buffer
+_FLUSH_INTERVAL = 1
+
+# Offset index entry: seq, time, byte offset of the record in the segment
+_INDEX_ENTRY = struct.Struct('<Qdq')
+
+_LOG_EXT = '.log'
+_IDX_EXT = '.idx'
+
+
+def _encode(seq, line):
+    """
+    >>> _encode(7, ConsoleLine('a\\tb', 'stdout', 1.5))
+    b'7\\t1.5\\tstdout\\ta\\tb\\n'
+    """
+    return ('%d\t%r\t%s\t%s\n' % (seq, line.time, line.stream, line.text)).encode('utf-8')
+
+
+def _decode(record):
+    """
+    >>> _decode(b'7\\t1.5\\tstdout\\ta\\tb\\n')
+    (7, ConsoleLine(text='a\\tb', stream='stdout', time=1.5))
+    """
+    seq, time_, stream, text = record.decode('utf-8', errors='replace').rstrip('\n').split('\t', 3)
+    return int(seq), ConsoleLine(text, stream, float(time_))
+
+
+class _Segment:
+    """
+    A journal file holding a contiguous run of records, and its sparse offset index.
+    """
+
+    def __init__(self, path, first_seq):
+        self.path = path
+        self.first_seq = first_seq
+        self.index_path = path[:-len(_LOG_EXT)] + _IDX_EXT
+
+        # Parallel lists, so that they can be bisected
+        self.seqs = []
+        self.times = []
+        self.offsets = []
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def load_index(self):
+        with open(self.index_path, 'rb') as f:
+            for seq, time_, offset in _INDEX_ENTRY.iter_unpack(f.read()):
+                self._add_index_entry(seq, time_, offset)
+
+    def rebuild_index(self):
+        """
+        Rebuilds the index by scanning the segment. Also drops a partially written record at the end of the segment.
+
+        Records end at \\n only; the text of a line may contain other line breaks, such as \\r.
+
+        :return int: The amount of records in the segment
+
+        >>> import tempfile
+        >>> journal = ConsoleJournal(tempfile.mkdtemp())
+        >>> for seq in range(1, 140):
+        ...     journal.append(seq, ConsoleLine('a\\rb' if seq % 2 else 'plain', 'stdout', seq))
+        >>> journal._flush()
+        >>> segment = _Segment(journal._segments[0].path, 1)
+        >>> segment.rebuild_index(), segment.seqs
+        (139, [1, 65, 129])
+        >>> ConsoleJournal(journal._dir).tail(1)
+        [(139, ConsoleLine(text='a\\rb', stream='stdout', time=139.0))]
+        """
+        self.seqs, self.times, self.offsets = [], [], []
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                _LOGGER.warning('Dropping partially written record at the end of %s' % self.path)
+                f.truncate(end)
+
+        entries = b''
+        offset = 0
+        count = 0
+        while offset < end:
+            record_end = data.index(b'\n', offset) + 1
+            if count % _INDEX_INTERVAL == 0:
+                seq, line = _decode(data[offset:record_end])
+                self._add_index_entry(seq, line.time, offset)
+                entries += _INDEX_ENTRY.pack(seq, line.time, offset)
+            offset = record_end
+            count += 1
+        with open(self.index_path, 'wb') as f:
+            f.write(entries)
+        return count
+
+    def _add_index_entry(self, seq, time_, offset):
+        self.seqs.append(seq)
+        self.times.append(time_)
+        self.offsets.append(offset)
+
+    def map(self):
+        """
+        :return mmap.mmap or None: A read-only map of the segment, or None if it is empty.
+        """
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ConsoleJournal:
+    """
+    Appends every console line to segmented files on disk, and reads pages of them back.
+
+    Each record is one line of text, `seq<TAB>time<TAB>stream<TAB>text`, and every segment has a sparse index of the
+    sequence number, time and byte offset of one record out of _INDEX_INTERVAL. Reads bisect the segments and the index
+    to find where to start, then read records from a memory map of the segment, so a page costs O(page) no matter how
+    much history there is.
+    """
+
+    def __init__(self, directory):
+        """
+        :param str directory: Directory to keep the segments in. Created if it does not exist.
+        """
+        self._dir = directory
+        self._LOCK = threading.RLock()
+        self._segments = []  # type: list[_Segment]
+        self._file = None
+        self._index_file = None
+        self._records_in_segment = 0
+        self._last_flush = 0
+        self.last_seq = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def append(self, seq, line):
+        """
+        Appends a line to the journal.
+
+        :param int seq: Sequence number of the line. Must be greater than that of the last line appended.
+        :param ConsoleLine line: The line
+        """
+        with self._LOCK:
+            if not self._segments or self._file.tell() >= _SEGMENT_SIZE:
+                self._rotate(seq)
+
+            segment = self._segments[-1]
+            if self._records_in_segment % _INDEX_INTERVAL == 0:
+                # noinspection PyProtectedMember
+                segment._add_index_entry(seq, line.time, self._file.tell())
+                self._index_file.write(_INDEX_ENTRY.pack(seq, line.time, self._file.tell()))
+
+            self._file.write(_encode(seq, line))
+            self._records_in_segment += 1
+            self.last_seq = seq
+
+            if time.monotonic() - self._last_flush >= _FLUSH_INTERVAL:
+                self._flush()
+
+    @property
+    def first_seq(self):
+        """
+        :return int: Sequence number of the oldest line kept in the journal, or one past the last line if it is empty
+        """
+        with self._LOCK:
+            return self._segments[0].first_seq if self._segments else self.last_seq + 1
+
+    def after(self, seq, limit):
+        """
+        :param int seq: Sequence number to page forward from
+        :param int limit: Maximum amount of lines to return
+        :return list: The (seq, ConsoleLine) tuples of the first `limit` lines with a sequence number greater than
+                      `seq`, oldest first.
+        """
+        with self._LOCK:
+            return self._read_forward(self._locate(lambda s: s.seqs, lambda r: r[0], seq + 1), limit)
+
+    def before(self, seq, limit):
+        """
+        :param int seq: Sequence number to page backwards from. Pages back from the end of the journal if None.
+        :param int limit: Maximum amount of lines to return
+        :return list: The (seq, ConsoleLine) tuples of the last `limit` lines with a sequence number lower than `seq`,
+                      oldest first.
+        """
+        with self._LOCK:
+            position = self._end() if seq is None else self._locate(lambda s: s.seqs, lambda r: r[0], seq)
+            return self._read_backward(position, limit)
+
+    def since(self, timestamp, limit):
+        """
+        :param float timestamp: Time to page forward from, in seconds since the epoch
+        :param int limit: Maximum amount of lines to return
+        :return list: The (seq, ConsoleLine) tuples of the first `limit` lines read at or after `timestamp`, oldest
+                      first.
+        """
+        with self._LOCK:
+            return self._read_forward(self._locate(lambda s: s.times, lambda r: r[1].time, timestamp), limit)
+
+    def until(self, timestamp, limit):
+        """
+        :param float timestamp: Time to page backwards from, in seconds since the epoch
+        :param int limit: Maximum amount of lines to return
+        :return list: The (seq, ConsoleLine) tuples of the last `limit` lines read before `timestamp`, oldest first.
+        """
+        with self._LOCK:
+            return self._read_backward(self._locate(lambda s: s.times, lambda r: r[1].time, timestamp), limit)
+
+    def seq_at(self, timestamp):
+        """
+        :param float timestamp: Time in seconds since the epoch
+        :return int: Sequence number of the first line read at or after `timestamp`, or one past the last line if there
+                     is none.
+        """
+        records = self.since(timestamp, 1)
+        return records[0][0] if records else self.last_seq + 1
+
+    def tail(self, limit):
+        """
+        :return list: The (seq, ConsoleLine) tuples of the last `limit` lines, oldest first.
+        """
+        return self.before(None, limit)
+
+    def _open(self):
+        paths = sorted(glob.glob(os.path.join(self._dir, '*' + _LOG_EXT)))
+        self._segments = [_Segment(path, int(os.path.basename(path)[:-len(_LOG_EXT)])) for path in paths]
+        if not self._segments:
+            return
+
+        # Older segments were closed properly; the last one may have been cut short.
+        for segment in self._segments[:-1]:
+            segment.load_index()
+        last = self._segments[-1]
+        self._records_in_segment = last.rebuild_index()
+        self.last_seq = last.first_seq + self._records_in_segment - 1 if self._records_in_segment else \
+            last.first_seq - 1
+
+        self._file = open(last.path, 'ab')
+        self._index_file = open(last.index_path, 'ab')
+
+    def _rotate(self, first_seq):
+        """
+        Closes the current segment, starts a new one and deletes the oldest segments past _MAX_SEGMENTS.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._index_file.close()
+
+        path = os.path.join(self._dir, '%020d%s' % (first_seq, _LOG_EXT))
+        segment = _Segment(path, first_seq)
+        self._segments.append(segment)
+        self._file = open(segment.path, 'ab')
+        self._index_file = open(segment.index_path, 'ab')
+        self._records_in_segment = 0
+
+        while len(self._segments) > _MAX_SEGMENTS:
+            oldest = self._segments.pop(0)
+            _LOGGER.info('Deleting old console journal segment %s' % oldest.path)
+            os.remove(oldest.path)
+            os.remove(oldest.index_path)
+
+    def _flush(self):
+        if self._file is not None:
+            self._file.flush()
+            self._index_file.flush()
+        self._last_flush = time.monotonic()
+
+    def _end(self):
+        """
+        :return tuple: Position just past the last record
+        """
+        if not self._segments:
+            return 0, 0
+        self._flush()
+        return len(self._segments) - 1, self._segments[-1].size()
+
+    def _locate(self, keys, record_key, value):
+        """
+        Finds the position of the first record whose key is at least `value`.
+
+        :param keys: Function that returns the index keys (seqs or times) of a segment
+        :param record_key: Function that returns the key of a decoded record
+        :param value: Key to look for
+        :return tuple: (segment number, byte offset) of the record, or the end position if there is no such record
+        """
+        self._flush()
+
+        # Last segment whose first key is lower than the value; the record is either in it or at the start of the next.
+        firsts = [keys(s)[0] if keys(s) else float('inf') for s in self._segments]
+        i = max(bisect.bisect_left(firsts, value) - 1, 0)
+
+        while i < len(self._segments):
+            segment = self._segments[i]
+            j = max(bisect.bisect_left(keys(segment), value) - 1, 0)
+            offset = segment.offsets[j] if segment.offsets else 0
+            mm = segment.map()
+            if mm is not None:
+                with mm:
+                    while offset < len(mm):
+                        end = mm.find(b'\n', offset) + 1
+                        if record_key(_decode(mm[offset:end])) >= value:
+                            return i, offset
+                        offset = end
+            i += 1
+        return self._end()
+
+    def _read_forward(self, position, limit):
+        records = []
+        i, offset = position
+        while i < len(self._segments) and len(records) < limit:
+            mm = self._segments[i].map()
+            if mm is not None:
+                with mm:
+                    while offset < len(mm) and len(records) < limit:
+                        end = mm.find(b'\n', offset) + 1
+                        records.append(_decode(mm[offset:end]))
+                        offset = end
+            i, offset = i + 1, 0
+        return records
+
+    def _read_backward(self, position, limit):
+        records = []
+        i, end = position
+        while i >= 0 and len(records) < limit:
+            mm = self._segments[i].map() if self._segments else None
+            if mm is not None:
+                with mm:
+                    while end > 0 and len(records) < limit:
+                        start = mm.rfind(b'\n', 0, end - 1) + 1
+                        records.append(_decode(mm[start:end]))
+                        end = start
+            i -= 1
+            if i >= 0:
+                end = self._segments[i].size()
+        records.reverse()
+        return records
@@ -0,0 +1,208 @@
+"""
+Mirrors the changes MCAdmin makes to the whitelist and the ban list into the running server, which otherwise keeps the
+lists it read at startup.
+"""
+import collections
+import logging
+import re
+import threading
+
+from mcadmin.io.mc_profile import is_valid_username
+from mcadmin.io.server.commands import CommandTimeoutError
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds to wait after a change for more changes to send along with it
+_DELAY = 0.2
+
+# Seconds to wait for the server to confirm a command
+_TIMEOUT = 5
+
+# Fields of the entries of player lists
+_NAME = 'name'
+_EXPIRES = 'expires'
+_REASON = 'reason'
+_FOREVER = 'forever'
+
+# Responses to the commands. "Nothing changed" means the server already had the change, e.g. from the console.
+#   1.13 and newer: Reloaded the whitelist / Banned Steve: Griefing / Unbanned Steve
+#   Before 1.13:    Reloaded the whitelist / Banned player Steve / Unbanned player Steve
+_WHITELIST_RELOADED = re.compile(r'Reloaded the whitelist')
+_BAN_RESPONSE = r'Banned (?:player )?{name}\b|Nothing changed'
+_PARDON_RESPONSE = r'Unbanned (?:player )?{name}\b|Nothing changed'
+
+# Operations on the ban list of the server
+_BAN = 'ban'
+_PARDON = 'pardon'
+
+
+class ListSync:
+    """
+    Listens to the writes of the whitelist and ban list of a server and sends the commands that make the running server
+    pick them up.
+
+    Changes are coalesced: they are sent _DELAY seconds after the first one, so an import or a batch of lapsed bans
+    costs a single `whitelist reload`, and a player banned and pardoned in between is only pardoned. Every command
+    waits for the server to confirm it on the console (or over RCON); commands that are not confirmed are logged.
+    Changes made while the server is not running are dropped, since the server reads the files when it starts.
+
+    The whitelist is reloaded from the file, which MCAdmin has already written. The ban list has no reload command, so
+    bans and pardons are sent one by one. The server then rewrites banned-players.json from its own list, in which every
+    ban is permanent, so the expiries of the temporary bans MCAdmin made are written back afterwards.
+    """
+
+    def __init__(self, server):
+        """
+        :param Server server: The server to send the commands to
+        """
+        self._server = server
+        self._LOCK = threading.Lock()
+        # Lets a single flush run at a time, so commands are sent in the order the changes were made
+        self._FLUSH_LOCK = threading.Lock()
+        self._timer = None
+        self._whitelist_changed = False
+        # Casefolded name -> (_BAN or _PARDON, name, reason). Only the last operation on a player is sent.
+        self._bans = collections.OrderedDict()
+        # Casefolded name -> expiry of the temporary bans MCAdmin made, in Mojang's format
+        self._expiries = {}
+
+    def on_whitelist_change(self, before, after):
+        """
+        Listener of the writes of the whitelist. See PlayerListFileIO.add_listener().
+        """
+        if _names(before) != _names(after):
+            with self._LOCK:
+                self._whitelist_changed = True
+                self._schedule()
+
+    def on_ban_list_change(self, before, after):
+        """
+        Listener of the writes of the ban list. See PlayerListFileIO.add_listener().
+        """
+        previous = {entry.get(_NAME, '').casefold(): entry for entry in before}
+        new = _names(after)
+        with self._LOCK:
+            for entry in after:
+                key = entry.get(_NAME, '').casefold()
+                if not key or entry == previous.get(key):
+                    continue
+                # Made or changed by MCAdmin
+                if entry.get(_EXPIRES, _FOREVER) != _FOREVER:
+                    self._expiries[key] = entry[_EXPIRES]
+                else:
+                    self._expiries.pop(key, None)
+                if key not in previous:
+                    self._bans[key] = (_BAN, entry[_NAME], entry.get(_REASON))
+                    self._bans.move_to_end(key)
+            for key, entry in previous.items():
+                if key and key not in new:
+                    self._expiries.pop(key, None)
+                    self._bans[key] = (_PARDON, entry[_NAME], None)
+                    self._bans.move_to_end(key)
+            if self._bans:
+                self._schedule()
+
+    def flush(self):
+        """
+        Sends the pending changes to the server now.
+
+        :return list: (command, confirmed) of every command sent
+        """
+        with self._FLUSH_LOCK:
+            with self._LOCK:
+                self._timer = None
+                whitelist_changed, self._whitelist_changed = self._whitelist_changed, False
+                bans, self._bans = list(self._bans.values()), collections.OrderedDict()
+
+            commands = []
+            if whitelist_changed:
+                commands.append(('whitelist reload', _WHITELIST_RELOADED))
+            for operation, name, reason in bans:
+                if not is_valid_username(name):
+                    _LOGGER.warning('Not sending `%s` for %s: not a valid Minecraft name' % (operation, name))
+                elif operation == _BAN:
+                    command = 'ban %s %s' % (name, _one_line(reason)) if reason else 'ban %s' % name
+                    commands.append((command.strip(), _BAN_RESPONSE.format(name=re.escape(name))))
+                else:
+                    commands.append(('pardon %s' % name, _PARDON_RESPONSE.format(name=re.escape(name))))
+            if not commands:
+                return []
+
+            # Wait for a batch of writes of the ban list in progress to reach the file
+            with self._server.banned_players.batch():
+                pass
+
+            results = self._send(commands)
+            if bans and any(confirmed for _, confirmed in results):
+                self._restore_expiries()
+            return results
+
+    def _send(self, commands):
+        # Imported here, since the server module imports this one
+        from mcadmin.io.server.server import ServerNotRunningError
+
+        results = []
+        for i, (command, response) in enumerate(commands):
+            try:
+                messages = self._server.command(command, match=response, until=response, timeout=_TIMEOUT)
+            except ServerNotRunningError:
+                _LOGGER.debug('Server %s is not running; it will read the lists when it starts' % self._server.id)
+                return results + [(command, False) for command, _ in commands[i:]]
+            except CommandTimeoutError:
+                messages = []
+
+            # Only the confirmations match
+            confirmed = bool(messages)
+            if confirmed:
+                _LOGGER.info('Server %s: `%s`: %s' % (self._server.id, command, messages[-1]))
+            else:
+                _LOGGER.warning('Server %s did not confirm `%s` within %s seconds' % (
+                    self._server.id, command, _TIMEOUT))
+            results.append((command, confirmed))
+        return results
+
+    def _restore_expiries(self):
+        """
+        Writes the expiries of the temporary bans back into the ban list the server rewrote.
+        """
+        banned_players = self._server.banned_players
+        with banned_players.batch():
+            with self._LOCK:
+                expiries = dict(self._expiries)
+            if not expiries:
+                return
+            changed = False
+            list_ = []
+            for entry in banned_players.entries():
+                expires = expiries.get(entry.get(_NAME, '').casefold())
+                if expires is not None and entry.get(_EXPIRES) != expires:
+                    entry = dict(entry, **{_EXPIRES: expires})
+                    changed = True
+                list_.append(entry)
+            if changed:
+                banned_players.write(list_)
+
+    def _schedule(self):
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(_DELAY, self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            _LOGGER.exception('Could not send the list changes to server %s' % self._server.id)
+
+
+def _names(entries):
+    return {entry.get(_NAME, '').casefold() for entry in entries} - {''}
+
+
+def _one_line(text):
+    """
+    >>> _one_line('Griefing\\nop me')
+    'Griefing op me'
+    """
+    return ' '.join(text.split())
@@ -0,0 +1,135 @@
+"""
+Keeps the Minecraft Server instances managed by MCAdmin.
+"""
+import atexit
+import collections
+import logging
+import re
+import threading
+
+from mcadmin.config import CONFIG
+from mcadmin.io.server.server import Server, ServerAlreadyRunningError, ServerNotRunningError
+
+_LOGGER = logging.getLogger(__name__)
+
+# IDs are used in URLs and directory names
+_SERVER_ID = re.compile(r'[A-Za-z0-9_-]+')
+
+
+class ServerNotFoundError(KeyError):
+    """
+    Raised when looking up a server instance that does not exist.
+    """
+
+
+class _ServerManager:
+    """
+    Registry of the server instances configured in the config, by ID.
+
+    Every instance has its own directory, jar, files and console threads. Resources that do not belong to any server,
+    such as the server list, are shared by all of them.
+    """
+
+    def __init__(self):
+        self._servers = collections.OrderedDict()
+        self._LOCK = threading.Lock()
+
+    def load(self):
+        """
+        Creates an instance for every server in the config that does not have one yet.
+        """
+        with self._LOCK:
+            for server_id in CONFIG.server_ids():
+                if server_id in self._servers:
+                    continue
+                if not _SERVER_ID.fullmatch(server_id):
+                    _LOGGER.error('Ignoring server "%s": IDs may only contain letters, digits, _ and -' % server_id)
+                    continue
+                self._servers[server_id] = Server(server_id, CONFIG.get_server_dir(server_id))
+                _LOGGER.info('Loaded server %s from %s' % (server_id, self._servers[server_id].DIR))
+
+    def get(self, server_id):
+        """
+        :param str server_id: ID of the instance
+        :return Server: The instance
+        :raise ServerNotFoundError: If there is no instance by that ID
+        """
+        try:
+            return self._servers[server_id]
+        except KeyError:
+            raise ServerNotFoundError(server_id)
+
+    def servers(self):
+        """
+        :return list: Every instance, in the order they are configured
+        """
+        return list(self._servers.values())
+
+    def start_all(self, server_ids=None, **kwargs):
+        """
+        Starts servers in parallel. See Server.autostart() for the arguments.
+
+        :param server_ids: IDs of the servers to start. Every server that is not running if None.
+        :return dict: The exception that starting each server raised, or None if it started, by server ID
+        """
+        servers = self._select(server_ids, lambda server: not server.is_running())
+        return self._run_all(servers, lambda server: server.autostart(**kwargs))
+
+    def stop_all(self, server_ids=None):
+        """
+        Stops servers in parallel.
+
+        :param server_ids: IDs of the servers to stop. Every server that is running if None.
+        :return dict: The exception that stopping each server raised, or None if it stopped, by server ID
+        """
+        servers = self._select(server_ids, lambda server: server.is_running())
+        return self._run_all(servers, lambda server: server.stop())
+
+    def _select(self, server_ids, default_filter):
+        if server_ids is None:
+            return [server for server in self.servers() if default_filter(server)]
+        return [self.get(server_id) for server_id in server_ids]
+
+    @staticmethod
+    def _run_all(servers, action):
+        if not servers:
+            return {}
+
+        results = {}
+
+        def run(server):
+            try:
+                action(server)
+                results[server.id] = None
+            except (ServerAlreadyRunningError, ServerNotRunningError) as e:
+                results[server.id] = e
+            except Exception as e:
+                _LOGGER.exception('Error while starting or stopping server %s' % server.id)
+                results[server.id] = e
+
+        # Stopping can take up to _SIGTERM_WAIT_SECONDS per server, so every server gets its own thread. These are plain
+        # threads rather than an executor, which refuses new work once the interpreter is exiting (see
+        # _on_program_exit()).
+        threads = [threading.Thread(target=run, args=(server,), name='server-manager-%s' % server.id)
+                   for server in servers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {server.id: results[server.id] for server in servers}
+
+    def _on_program_exit(self):
+        """
+        Stops every running server before exiting the Python interpreter.
+        """
+        if any(server.is_running() for server in self.servers()):
+            _LOGGER.info('Python is exiting: terminating server processes.')
+            self.stop_all()
+
+
+SERVER_MANAGER = _ServerManager()
+SERVER_MANAGER.load()
+
+# Register the _on_program_exit function to be ran before the Python interpreter quits.
+# noinspection PyProtectedMember
+atexit.register(SERVER_MANAGER._on_program_exit)
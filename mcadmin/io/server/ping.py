@@ -0,0 +1,221 @@
+"""
+Asks the Minecraft Server for its status the way the multiplayer screen of the game does (Server List Ping).
+"""
+import collections
+import json
+import logging
+import socket
+import struct
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 25565
+
+# Amount of seconds between two pings
+_POLL_INTERVAL = 5
+
+# Maximum amount of seconds to wait for the server to answer a ping
+_TIMEOUT = 3
+
+# Protocol version sent in the handshake. -1 asks the server to answer whatever its version is.
+_PROTOCOL_VERSION = -1
+
+# Handshake state to switch to
+_STATE_STATUS = 1
+
+# Largest status response accepted, in bytes
+_MAX_RESPONSE_LENGTH = 1024 * 1024
+
+# Result of a ping.
+# latency: Round trip time of the ping packet, in milliseconds
+# version: Name of the server version, e.g. "1.12.2"
+# protocol: Protocol version number of the server
+# players_online, players_max: Player counts reported by the server
+# motd: Message of the day, as plain text
+# time: When the ping was answered, in seconds since the epoch
+PingResult = collections.namedtuple('PingResult', 'latency version protocol players_online players_max motd time')
+
+
+class PingError(Exception):
+    """
+    Raised when the server does not answer a ping, or answers it with something that is not a status.
+    """
+
+
+def encode_varint(value):
+    """
+    Encodes an int32 the way the Minecraft protocol does: 7 bits at a time, least significant first.
+
+    >>> encode_varint(300)
+    b'\\xac\\x02'
+    >>> encode_varint(-1)
+    b'\\xff\\xff\\xff\\xff\\x0f'
+    """
+    value &= 0xFFFFFFFF
+    data = b''
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            data += struct.pack('B', byte | 0x80)
+        else:
+            return data + struct.pack('B', byte)
+
+
+def read_varint(read):
+    """
+    :param read: Function that returns exactly the amount of bytes asked for
+    :return int: The decoded value
+
+    >>> import io
+    >>> read_varint(io.BytesIO(b'\\xac\\x02').read)
+    300
+    """
+    value = 0
+    for i in range(5):
+        byte = read(1)[0]
+        value |= (byte & 0x7F) << 7 * i
+        if not byte & 0x80:
+            return value - (1 << 32) if value & 0x80000000 else value
+    raise PingError('VarInt is too long')
+
+
+def _packet(packet_id, payload=b''):
+    data = encode_varint(packet_id) + payload
+    return encode_varint(len(data)) + data
+
+
+def _string(text):
+    data = text.encode('utf-8')
+    return encode_varint(len(data)) + data
+
+
+def motd_text(description):
+    """
+    Flattens the description of a status response, which is either a string or a chat component, into plain text.
+
+    >>> motd_text({'text': 'A ', 'extra': [{'text': 'Minecraft', 'bold': True}, ' Server']})
+    'A Minecraft Server'
+    """
+    if isinstance(description, str):
+        return description
+    if not isinstance(description, dict):
+        return ''
+    return description.get('text', '') + ''.join(motd_text(extra) for extra in description.get('extra', ()))
+
+
+def ping(host, port=DEFAULT_PORT, timeout=_TIMEOUT):
+    """
+    Pings a server.
+
+    :param str host: Address of the server
+    :param int port: Port of the server
+    :param float timeout: Maximum amount of seconds to wait for each step
+    :return PingResult: What the server answered
+    :raise OSError: If the server cannot be reached
+    :raise PingError: If the server answers with something that is not a status
+    """
+    with socket.create_connection((host, port), timeout=timeout) as sock, sock.makefile('rb') as stream:
+        def read(size):
+            data = stream.read(size)
+            if len(data) != size:
+                raise PingError('Connection closed by the server')
+            return data
+
+        handshake = encode_varint(_PROTOCOL_VERSION) + _string(host) + struct.pack('>H', port) + \
+            encode_varint(_STATE_STATUS)
+        sock.sendall(_packet(0x00, handshake) + _packet(0x00))
+
+        length = read_varint(read)
+        if not 0 < length <= _MAX_RESPONSE_LENGTH:
+            raise PingError('Invalid status response length %d' % length)
+        payload = read(length)
+        try:
+            # Packet ID, then the JSON string. Both start with a VarInt; IDs and lengths are read the same way.
+            offset = 0
+            for _ in range(2):
+                while payload[offset] & 0x80:
+                    offset += 1
+                offset += 1
+            status = json.loads(payload[offset:].decode('utf-8'))
+        except (IndexError, ValueError) as e:
+            raise PingError('Invalid status response: %s' % e)
+
+        sent = time.monotonic()
+        sock.sendall(_packet(0x01, struct.pack('>q', int(sent * 1000))))
+        read(read_varint(read))
+        latency = (time.monotonic() - sent) * 1000
+
+    if not isinstance(status, dict):
+        raise PingError('Invalid status response: %s' % status)
+    version = status.get('version') or {}
+    players = status.get('players') or {}
+    return PingResult(latency=round(latency, 1),
+                      version=version.get('name'),
+                      protocol=version.get('protocol'),
+                      players_online=players.get('online'),
+                      players_max=players.get('max'),
+                      motd=motd_text(status.get('description', '')),
+                      time=time.time())
+
+
+class StatusPoller:
+    """
+    Pings the server on a background thread every _POLL_INTERVAL seconds and keeps the last result.
+
+    Readers get the cached result, so any amount of viewers costs one ping per interval. `on_change` is called when the
+    server starts or stops answering, or answers with different counts, version or MOTD; changes of latency alone are
+    not reported, but are kept in the cached result.
+    """
+
+    def __init__(self, address, on_change=None):
+        """
+        :param address: Function that returns the (host, port) to ping. Called before every ping, so that changes to
+                        the configuration apply without a restart.
+        :param on_change: Function called without arguments, on the poller thread, when the result changes
+        """
+        self._address = address
+        self._on_change = on_change
+        self._wake = threading.Event()
+        self.result = None  # type: PingResult or None
+        self.error = None  # type: str or None
+
+    def start(self):
+        """
+        Starts polling on a new thread.
+        """
+        threading.Thread(target=self._poll_worker, name='status-poller', daemon=True).start()
+
+    def poke(self):
+        """
+        Makes the poller ping right away instead of at the end of the current interval, e.g. when the server starts.
+        """
+        self._wake.set()
+
+    def _poll_worker(self):
+        while True:
+            self._wake.clear()
+            self.poll()
+            self._wake.wait(_POLL_INTERVAL)
+
+    def poll(self):
+        """
+        Pings the server once and updates the cached result.
+        """
+        try:
+            result, error = ping(*self._address()), None
+        except (OSError, PingError) as e:
+            result, error = None, str(e)
+
+        changed = self._key(result) != self._key(self.result)
+        self.result, self.error = result, error
+        if changed and self._on_change is not None:
+            self._on_change()
+
+    @staticmethod
+    def _key(result):
+        if result is None:
+            return None
+        return result.version, result.protocol, result.players_online, result.players_max, result.motd
@@ -0,0 +1,258 @@
+"""
+Full-text search over the console journal.
+"""
+import array
+import bisect
+import logging
+import re
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+# Words, optionally joined by dots so that class names such as java.lang.NullPointerException are kept whole
+_TOKEN = re.compile(r'[\w$]+(?:\.[\w$]+)*')
+
+# Separates the log prefix ("[12:34:56] [Server thread/INFO]") from the message. The prefix is not indexed.
+_PREFIX_END = ']: '
+
+# Maximum amount of terms a prefix query expands to
+_MAX_PREFIX_TERMS = 1000
+
+# Amount of journal lines read at once while building the index
+_BUILD_PAGE_SIZE = 10000
+
+
+def tokenize(text):
+    """
+    Returns the terms of a console line.
+
+    Dotted names are indexed whole as well as split into their parts.
+
+    >>> sorted(tokenize('[12:00:00] [Server thread/WARN]: java.lang.NullPointerException: Steve'))
+    ['java', 'java.lang.nullpointerexception', 'lang', 'nullpointerexception', 'steve']
+    """
+    message = text.split(_PREFIX_END, 1)[-1]
+    terms = set()
+    for token in _TOKEN.findall(message.casefold()):
+        terms.add(token)
+        if '.' in token:
+            terms.update(token.split('.'))
+    return terms
+
+
+class ConsoleIndex:
+    """
+    An inverted index from term to the sequence numbers of the console lines that contain it.
+
+    Lines are indexed incrementally as they are read. Postings are kept as arrays of sequence numbers in ascending
+    order, which makes them compact, and lets queries bisect them and walk them from the newest line backwards so that
+    they stop as soon as enough results are found.
+
+    When MCAdmin starts, the lines already in the journal are indexed on a background thread; lines read in the
+    meantime are held back and indexed once it finishes.
+
+    The index only covers the lines kept in the journal: when the journal deletes its oldest segment, the postings of
+    the deleted lines are trimmed and the terms left without postings are dropped, so the index does not outgrow the
+    journal.
+    """
+
+    def __init__(self, journal):
+        """
+        :param ConsoleJournal journal: The journal that holds the indexed lines
+        """
+        self._journal = journal
+        self._LOCK = threading.RLock()
+        self._postings = {}
+
+        # Sorted terms, for prefix queries. New terms are merged in lazily.
+        self._sorted_terms = []
+        self._new_terms = set()
+
+        self._indexed_upto = 0
+        # Sequence number below which the postings have been trimmed
+        self._first_seq = 0
+        self._pending = []
+        self.ready = False
+
+    def build(self):
+        """
+        Starts indexing the lines already in the journal on a new thread.
+        """
+        threading.Thread(target=self._build_worker, name='console-index', daemon=True).start()
+
+    def add(self, seq, line):
+        """
+        Indexes a console line.
+
+        :param int seq: Sequence number of the line. Must be greater than that of the last line added.
+        :param ConsoleLine line: The line
+        """
+        with self._LOCK:
+            if self.ready:
+                self._add(seq, line.text)
+            else:
+                self._pending.append((seq, line.text))
+
+    def search(self, query, since=None, until=None, limit=50):
+        """
+        Finds the console lines that contain all terms of a query.
+
+        :param str query: Space-separated terms. A term ending in `*` matches every term that starts with it.
+        :param float since: Only match lines read at or after this time, in seconds since the epoch
+        :param float until: Only match lines read before this time, in seconds since the epoch
+        :param int limit: Maximum amount of lines to return
+        :return list: (seq, ConsoleLine) tuples of the matching lines, newest first
+        """
+        lo = 0 if since is None else self._journal.seq_at(since)
+        hi = self._journal.last_seq + 1 if until is None else self._journal.seq_at(until)
+
+        with self._LOCK:
+            clauses = [clause for word in query.casefold().split() for clause in self._word_clauses(word)]
+            seqs = self._intersect(clauses, lo, hi, limit) if clauses else []
+
+        results = []
+        for seq in seqs:
+            records = self._journal.after(seq - 1, 1)
+            # Lines that fell off the end of the journal are no longer available.
+            if records and records[0][0] == seq:
+                results.append(records[0])
+        return results
+
+    def _build_worker(self):
+        target = self._journal.last_seq
+        _LOGGER.info('Indexing console journal...')
+
+        seq = self._journal.first_seq - 1
+        while seq < target:
+            records = self._journal.after(seq, _BUILD_PAGE_SIZE)
+            if not records:
+                break
+            with self._LOCK:
+                for seq, line in records:
+                    if seq > target:
+                        break
+                    self._add(seq, line.text)
+
+        with self._LOCK:
+            for seq, text in self._pending:
+                if seq > self._indexed_upto:
+                    self._add(seq, text)
+            self._pending = []
+            self.ready = True
+        _LOGGER.info('Console journal indexed: %d terms' % len(self._postings))
+
+    def _add(self, seq, text):
+        for term in tokenize(text):
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = array.array('Q')
+                self._new_terms.add(term)
+            postings.append(seq)
+        self._indexed_upto = seq
+
+        first_seq = self._journal.first_seq
+        if first_seq > self._first_seq:
+            self._trim(first_seq)
+
+    def _trim(self, first_seq):
+        """
+        Drops the postings of the lines below `first_seq`, which are no longer in the journal.
+
+        >>> class Journal:
+        ...     first_seq = 1
+        >>> index = ConsoleIndex(Journal())
+        >>> index._add(1, 'Steve joined'); index._add(2, 'Alex joined')
+        >>> Journal.first_seq = 2
+        >>> index._add(3, 'Alex left')
+        >>> sorted(index._postings), list(index._postings['joined']), list(index._prefix_postings('s'))
+        (['alex', 'joined', 'left'], [2], [])
+        """
+        dropped = []
+        for term, postings in self._postings.items():
+            i = bisect.bisect_left(postings, first_seq)
+            if i == len(postings):
+                dropped.append(term)
+            elif i:
+                del postings[:i]
+        for term in dropped:
+            del self._postings[term]
+        if dropped:
+            # Rebuilt by the next prefix query
+            self._sorted_terms = []
+            self._new_terms = set(self._postings)
+        self._first_seq = first_seq
+
+    def _word_clauses(self, word):
+        """
+        Returns the postings that a line must all be in to match a query word.
+
+        A dotted word matches the same lines as the whole dotted term. A word made of several terms, such as "foo-bar",
+        matches the lines that contain every one of them. If the word ends in `*`, its last term is a prefix.
+
+        :param str word: Casefolded query word
+        :return list: Sorted sequence number lists
+
+        >>> class Journal:
+        ...     first_seq = 1
+        >>> index = ConsoleIndex(Journal())
+        >>> index._add(1, 'foo only'); index._add(2, 'foo-bar'); index._add(3, 'java.lang.Error in foo')
+        >>> [list(clause) for clause in index._word_clauses('foo-bar')]
+        [[1, 2, 3], [2]]
+        >>> [list(clause) for clause in index._word_clauses('java.lang.error')]
+        [[3]]
+        >>> [list(clause) for clause in index._word_clauses('foo-b*')]
+        [[1, 2, 3], [2]]
+        """
+        prefix = word.endswith('*')
+        terms = _TOKEN.findall(word[:-1] if prefix else word)
+        if not terms:
+            return [array.array('Q')]
+        clauses = [self._postings.get(term, array.array('Q')) for term in terms]
+        if prefix:
+            clauses[-1] = self._prefix_postings(terms[-1])
+        return clauses
+
+    def _prefix_postings(self, prefix):
+        """
+        :return list: Sorted union of the postings of every term that starts with the prefix.
+        """
+        if len(self._new_terms) > _MAX_PREFIX_TERMS:
+            self._sorted_terms = sorted(self._postings)
+        else:
+            for term in self._new_terms:
+                bisect.insort(self._sorted_terms, term)
+        self._new_terms = set()
+
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        union = set()
+        for term in self._sorted_terms[start:start + _MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            union.update(self._postings[term])
+        return sorted(union)
+
+    @staticmethod
+    def _intersect(clauses, lo, hi, limit):
+        """
+        :param clauses: Sorted sequence number lists, all of which a result must be in
+        :return list: The greatest `limit` sequence numbers in [lo, hi) that are in all clauses, in descending order
+        """
+        clauses = sorted(clauses, key=len)
+        smallest, others = clauses[0], clauses[1:]
+
+        results = []
+        i = bisect.bisect_left(smallest, hi) - 1
+        while i >= 0 and len(results) < limit:
+            seq = smallest[i]
+            if seq < lo:
+                break
+            if all(_contains(other, seq) for other in others):
+                results.append(seq)
+            i -= 1
+        return results
+
+
+def _contains(sorted_seqs, seq):
+    i = bisect.bisect_left(sorted_seqs, seq)
+    return i < len(sorted_seqs) and sorted_seqs[i] == seq
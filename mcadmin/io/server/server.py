@@ -1,5 +1,3 @@
-import atexit
-import collections
 import datetime
 import glob
 import logging
@@ -10,23 +8,52 @@ import time
 from enum import Enum
 from subprocess import Popen, PIPE
 
-import requests
-
 from mcadmin.config import CONFIG
+from mcadmin.io.files.banned_players import BannedPlayersFileIO
+from mcadmin.io.files.files import PropertiesFileIO, PlayerListFileIO
+from mcadmin.io.files.jar_store import JAR_STORE
 from mcadmin.io.files.server_list import SERVER_LIST
+from mcadmin.io import jobs
+from mcadmin.io.files.whitelist import WhitelistFileIO
+from mcadmin.io.mc_profile import UUID_CACHE
+from mcadmin.io.rcon import RconPool, RconError, RconTimeoutError, DEFAULT_PORT as RCON_DEFAULT_PORT
+from mcadmin.io.server.broker import Broker
+from mcadmin.io.server.commands import CommandChannel, CommandTimeoutError, DEFAULT_TIMEOUT, matcher, \
+    player_list_complete, parse_player_list
+from mcadmin.io.server.console_buffer import ConsoleBuffer
+from mcadmin.io.server.console_reader import ConsoleReader
+from mcadmin.io.server.events import ConsoleParser, PlayerJoined, PlayerLeft
+from mcadmin.io.server.journal import ConsoleJournal
+from mcadmin.io.server.list_sync import ListSync
+from mcadmin.io.server.ping import StatusPoller, DEFAULT_PORT as PING_DEFAULT_PORT
+from mcadmin.io.server.search import ConsoleIndex
+from mcadmin.io.server.sessions import SessionTracker
 
 _EULA_TXT = 'eula.txt'
-_LOGGER = logging.getLogger(__name__)
+_SERVER_PROPERTIES = 'server.properties'
+_WHITELIST_JSON = 'whitelist.json'
+_BANNED_PLAYERS_JSON = 'banned-players.json'
+_USERCACHE_JSON = 'usercache.json'
+
+# Format of the expiry times in usercache.json
+_USERCACHE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S %z'
 
-# Maximum amount of times to try to download a server executable from the internet
-_MAX_DOWNLOAD_ATTEMPTS = 2
+# Directory inside the server directory where MCAdmin keeps its own data about the server
+_STATE_DIR = '.mcadmin'
+_LOGGER = logging.getLogger(__name__)
 
 # Maximum amount of time to wait for a process to end
 _SIGTERM_WAIT_SECONDS = 30
 
-# Maximum amount of lines that there can be inside the console_output deque
+# Maximum amount of lines that there can be inside the console_output buffer
 _CONSOLE_OUTPUT_MAX_LINES = 100
 
+# Topics of the events published to Server.EVENTS
+# Payload: (seq, ConsoleLine) of a line appended to the console output
+TOPIC_CONSOLE = 'console'
+# Payload: the new ServerStatus. Also published when players join or leave.
+TOPIC_STATUS = 'status'
+
 
 def _timedelta_to_seconds(dt):
     return dt.days * 86400 + dt.seconds
@@ -59,60 +86,188 @@ class ServerStatus(Enum):
     DISABLED = 'disabled'
 
 
+class ExitReason(Enum):
+    """
+    Enum for representing why the server process last exited. See Server.exit_reason.
+    """
+    # Stopped through Server.stop()
+    STOPPED = 'stopped'
+    # Did not shut down in time after Server.stop() and was killed
+    KILLED = 'killed'
+    # Exited by itself with a zero exit code, e.g. because someone typed `stop` in the console
+    EXITED = 'exited'
+    # Exited by itself with a non-zero exit code
+    CRASHED = 'crashed'
+
+
 class Server:
+    """
+    A Minecraft Server instance: its directory, the files in it, and the process running it. Instances are kept by the
+    ServerManager.
+    """
 
-    def __init__(self, dir_):
+    def __init__(self, server_id, dir_):
+        """
+        :param str server_id: ID of the instance. Its settings are kept in the config under this ID.
+        :param str dir_: Directory of the server. Created if it does not exist.
+        """
+        self.id = server_id
         self.DIR = dir_
-
-        self.console_output = collections.deque(maxlen=_CONSOLE_OUTPUT_MAX_LINES)
+        os.makedirs(dir_, exist_ok=True)
+
+        self.STATE_DIR = os.path.join(dir_, _STATE_DIR)
+        self.properties = PropertiesFileIO(os.path.join(dir_, _SERVER_PROPERTIES))
+        self.whitelist = WhitelistFileIO(os.path.join(dir_, _WHITELIST_JSON))
+        self.banned_players = BannedPlayersFileIO(os.path.join(dir_, _BANNED_PLAYERS_JSON))
+        try:
+            # Indexing the ban list schedules the expiry of its temporary bans
+            self.banned_players.entries()
+        except ValueError as e:
+            _LOGGER.error('Could not read the ban list of %s: %s' % (server_id, e))
+        # Changes MCAdmin makes to the lists are sent to the server while it runs
+        self.list_sync = ListSync(self)
+        self.whitelist.add_listener(self.list_sync.on_whitelist_change)
+        self.banned_players.add_listener(self.list_sync.on_ban_list_change)
+        # Names and UUIDs of the players that joined, cached by the Minecraft Server
+        self.usercache = PlayerListFileIO(os.path.join(dir_, _USERCACHE_JSON))
+        UUID_CACHE.add_source(self.known_uuid)
+
+        # Every console line is written to the journal. Sequence numbers carry on from the ones already in it.
+        self.journal = ConsoleJournal(os.path.join(self.STATE_DIR, 'journal'))
+        self.console_output = ConsoleBuffer(_CONSOLE_OUTPUT_MAX_LINES, start_seq=self.journal.last_seq + 1)
+        self.search_index = ConsoleIndex(self.journal)
+        self.search_index.build()
+
+        # Turns console lines into typed events. Subscribe to an event type with `self.parser.subscribe()`.
+        self.parser = ConsoleParser()
+
+        self.sessions = SessionTracker(os.path.join(self.STATE_DIR, 'sessions.json'),
+                                       on_change=lambda: self.EVENTS.publish(TOPIC_STATUS, self.status()))
+        self.parser.subscribe(PlayerJoined, self.sessions.on_join)
+        self.parser.subscribe(PlayerLeft, self.sessions.on_leave)
+
+        # Runs console commands and collects their responses. See `self.command()`.
+        self.commands = CommandChannel(self.input_line)
+
+        # RCON connections, used instead of the console when RCON is enabled in server.properties
+        self._rcon = None  # type: RconPool or None
+        self._rcon_key = None
+        self._RCON_LOCK = threading.Lock()
 
         # Notified every time the server status change from ON to OFF or vice-versa.
         self.STATUS_CHANGE = threading.Condition()
 
-        # Notified whenever there is a console output
-        self.OUTPUT_UPDATE = threading.Condition()
+        # Console output and status changes are published here. See the TOPIC_* constants.
+        self.EVENTS = Broker()
+
+        # Pings the server in the background. Its last result is part of the status.
+        self.ping = StatusPoller(self._ping_address, on_change=lambda: self.EVENTS.publish(TOPIC_STATUS, self.status()))
+        self.ping.start()
 
         # Java Process Handle
         self._proc = None  # type: Popen or None
         self._PROC_LOCK = threading.RLock()
 
+        # Set by the exit watcher thread once the current process has exited and been released.
+        self._exited = threading.Event()
+        self._stop_requested = False
+        self._killed = False
+
+        # Exit code and ExitReason of the last process, or None if the server has not exited since MCAdmin started.
+        self.exit_code = None  # type: int or None
+        self.exit_reason = None  # type: ExitReason or None
+
         self._start_time = None  # type: datetime.datetime or None
 
+    def known_uuid(self, name):
+        """
+        Looks up the UUID of a player in the whitelist, ban list and user cache of the server.
+
+        :param str name: Name of the player
+        :return str or None: The UUID, if any of them has it
+        """
+        for list_ in (self.whitelist, self.banned_players):
+            entry = list_.find_name(name)
+            if entry is not None and entry.get('uuid'):
+                return entry['uuid']
+
+        entry = self.usercache.find_name(name)
+        if entry is None or not entry.get('uuid'):
+            return None
+        try:
+            expires = datetime.datetime.strptime(entry.get('expiresOn', ''), _USERCACHE_TIME_FORMAT)
+        except ValueError:
+            return None
+        if expires < datetime.datetime.now(datetime.timezone.utc):
+            return None
+        return entry['uuid']
+
     @property
     def jar(self):
-        return CONFIG.get_use_jar()
+        return CONFIG.get_use_jar(self.id)
 
     def autostart(self, *args, **kwargs):
         """
         Starts the server and automatically downloads the latest stable version no jar is configured. Updates the
         config with the new jar.
 
-        If the jar is configured but not found in the filesystem, it will try to download it.
+        If the jar is configured but not found in the filesystem, it will be linked from the jar store, or downloaded
+        into it if it is not there. Jars already in the server directory are added to the jar store.
         """
+        if self.is_running():
+            raise ServerAlreadyRunningError('Server is already running')
+
         if not self.jar:
             # Jar is not _set
-            CONFIG.set_use_jar(self._download_latest_vanilla_server())
-
-        elif not os.path.exists(self.jarpath()):
-            # Jar is _set but it doesn't exist
-            # Try to download the jar
-            versions = SERVER_LIST.versions()
+            jobs.report('Looking up the latest version')
+            CONFIG.set_use_jar(self.id, self._download_latest_vanilla_server())
 
-            found = [(version, full_name, link)
-                     for version, full_name, link in versions['stable'] + versions['snapshot']
-                     if full_name == self.jar]
-            if len(found) == 0:
-                raise FileNotFoundError('%s not found for download' % self.jar)
-            if len(found) > 1:
-                raise ValueError('More than one link found for %s: %s' % (self.jar, str(found)))
+        elif os.path.exists(self.jarpath()):
+            JAR_STORE.adopt(self.jarpath(), self.jar)
 
-            version, full_name, link = found[0]
-            _LOGGER.info('Downloading %s...' % link)
-            self._download(link, dest_name=full_name)
+        else:
+            # Jar is _set but it doesn't exist
+            self.fetch_jar(self.jar)
 
         assert self.jar
+        jobs.report('Starting')
         self.start(*args, **kwargs)
 
+    def fetch_jar(self, full_name):
+        """
+        Links a jar into the server directory from the jar store, downloading it into the store first if it is not
+        there.
+
+        :param str full_name: Full name of the version
+        :raises FileNotFoundError: If the version is not in the server list
+        :raises IOError: If the download failed
+        """
+        if JAR_STORE.has(full_name):
+            JAR_STORE.link(full_name, self.DIR)
+            return
+
+        jobs.report('Looking up %s' % full_name)
+        entry = SERVER_LIST.index().get(full_name)
+        if entry is None:
+            raise FileNotFoundError('%s not found for download' % full_name)
+
+        _LOGGER.info('Downloading %s...' % entry.link)
+        self._download(entry)
+
+    def use_jar(self, full_name):
+        """
+        Sets the jar that the server runs with from its next start. If the jar store has it, it is linked into the
+        server directory right away. The link to the previous jar is removed unless the server is running with it.
+
+        :param str full_name: Full name of the version
+        """
+        previous = self.jar
+        CONFIG.set_use_jar(self.id, full_name)
+        if JAR_STORE.has(full_name):
+            JAR_STORE.link(full_name, self.DIR)
+        if previous and previous != full_name and not self.is_running():
+            JAR_STORE.release(previous, self.DIR)
+
     def start(self, jvm_params=''):
         """
         Starts the server. Will use the jar in `self.jar`.
@@ -124,8 +279,7 @@ class Server:
                                   the server directory.
         """
         # Create server files directory if it does not exist.
-        if not os.path.exists(self.DIR):
-            os.mkdir(self.DIR)
+        os.makedirs(self.DIR, exist_ok=True)
 
         with self._PROC_LOCK:
             if self.is_running():
@@ -145,50 +299,50 @@ class Server:
             # Start process.
             command = 'java %s -jar %s nogui' % (jvm_params, self.jar)
             self._proc = Popen(command, stdout=PIPE, stdin=PIPE, stderr=PIPE, cwd=self.DIR)
+            self._exited = threading.Event()
+            self._stop_requested = False
+            self._killed = False
+            self._start_time = datetime.datetime.now()
 
             # Start threads.
-            self._start_console_thread()
-            self._start_watchdog_thread()
-            self._notify_status_change()
-            self._start_time = datetime.datetime.now()
+            ConsoleReader(self._proc, self._on_console_line).start()
+            self._start_exit_watcher_thread(self._proc, self._exited)
+        self._notify_status_change()
 
     def stop(self):
         """
         Stops the server.
 
         It will first try to stop the server gracefully with a SIGTERM, but if the server does not close within
-        _SIGTERM_WAIT_SECONDS seconds, the server process will be forcefully terminated.
+        _SIGTERM_WAIT_SECONDS seconds, the server process will be killed.
 
-        This method notifies a status change.
+        The process is released, and the status change notified, by the exit watcher thread as soon as the process
+        exits. This method returns once that has happened.
 
         :raises ServerNotRunningError: if the server is not running
         """
         with self._PROC_LOCK:
-            status = self.status()
-
-            if status == ServerStatus.RUNNING:
-                _LOGGER.info('Waiting at most %s seconds for server to shut down...' % _SIGTERM_WAIT_SECONDS)
-                self._proc.send_signal(signal.SIGTERM)
-                self._proc.wait(_SIGTERM_WAIT_SECONDS)
-
-                return_code = self._proc.poll()
-
-                if return_code is None:
-                    _LOGGER.warning('Server SIGTERM timed out; terminating forcefully.')
-                    self._proc.terminate()
-
-            elif status == ServerStatus.CLOSED:
-                _LOGGER.info('Server process was referenced, but it was already closed. Discarding reference.')
-
-            else:
-                assert status == ServerStatus.DISABLED
+            proc = self._proc
+            if proc is None:
                 raise ServerNotRunningError('Server already stopped')
 
-            self._proc = None
+            self._stop_requested = True
+            exited = self._exited
+            _LOGGER.info('Waiting at most %s seconds for server %s to shut down...' % (_SIGTERM_WAIT_SECONDS, self.id))
+            try:
+                proc.send_signal(signal.SIGTERM)
+            except ProcessLookupError:
+                # Already exited; the exit watcher is about to release it.
+                pass
 
-        _LOGGER.info('Server process closed.')
-        self._notify_status_change()
-        self._start_time = None
+        if not exited.wait(_SIGTERM_WAIT_SECONDS):
+            _LOGGER.warning('Server %s SIGTERM timed out; killing it.' % self.id)
+            with self._PROC_LOCK:
+                self._killed = True
+                proc.kill()
+            exited.wait()
+
+        _LOGGER.info('Server %s process closed.' % self.id)
 
     def is_running(self):
         return self.status() == ServerStatus.RUNNING
@@ -209,14 +363,16 @@ class Server:
             ServerStatus.RUNNING: If server process is referenced and running
             ServerStatus.CLOSED: If server process is referenced but has return code
             ServerStatus.DISABLED: If server process is not referenced
+
+        This does not take any locks nor poll the process: the return code is set by the exit watcher thread as soon as
+        the process exits.
         """
-        with self._PROC_LOCK:
-            if self._proc is None:
-                return ServerStatus.DISABLED
-            return_code = self._proc.poll()
-            if return_code is None:
-                return ServerStatus.RUNNING
-            return ServerStatus.CLOSED
+        proc = self._proc
+        if proc is None:
+            return ServerStatus.DISABLED
+        if proc.returncode is None:
+            return ServerStatus.RUNNING
+        return ServerStatus.CLOSED
 
     def locate_server_file_path(self):
         """
@@ -259,105 +415,182 @@ class Server:
             self._proc.stdin.write(text)
             self._proc.stdin.flush()
 
-    def _download_latest_vanilla_server(self):
+    def command(self, command, match=None, timeout=DEFAULT_TIMEOUT, **kwargs):
         """
-        Downloads the latest vanilla server from the internet and writes the file to the server directory.
-        The filename will be the full name of the version.
+        Runs a command and returns its response. See CommandChannel.execute() for the arguments.
 
-        :returns str: Name of the file
-        :raises IOError: If download failed after _MAX_DOWNLOAD_ATTEMPTS attempts
-        """
-        version, full_name, link = SERVER_LIST.latest_stable_version()
-        _LOGGER.info('Downloading vanilla %s server executable from %s...' % (version, link))
-        self._download(link, full_name)
-        return full_name
+        If RCON is enabled in server.properties, the command is sent over RCON, which also works for a server that
+        MCAdmin did not start; RCON responses are complete, so only `match` applies to them. Otherwise, or if RCON
+        cannot be reached while the server process is running (e.g. because it is still starting), the command is sent
+        to the console.
 
-    def _start_console_thread(self):
+        :param str command: The command
+        :return list: The messages of the response
+        :raise CommandTimeoutError: If the response is not complete in time
+        :raise ServerNotRunningError: if the server is not running
         """
-        Starts the console thread.
+        rcon = self._rcon_pool()
+        if rcon is not None:
+            try:
+                response = rcon.execute(command, timeout)
+            except RconTimeoutError as e:
+                raise CommandTimeoutError(str(e))
+            except (OSError, RconError) as e:
+                if not self.is_running():
+                    raise ServerNotRunningError('Could not reach the server over RCON: %s' % e)
+                _LOGGER.warning('RCON unavailable; sending `%s` to the console instead: %s' % (command, e))
+            else:
+                accept = matcher(match)
+                return [message for message in response.splitlines() if accept(message)]
+
+        return self.commands.execute(command, match=match, timeout=timeout, **kwargs)
+
+    def list_players(self, timeout=DEFAULT_TIMEOUT):
         """
+        Asks the server who is online.
 
-        def _console_worker():
-            """
-            Will read the output from the server process constantly until the server is stopped. It will add the output
-            lines to the `self.console_output` deque and notify self.OUTPUT_UPDATE that the console was updated.
-            """
-            while self.is_running():
+        :return list: The names of the players online
+        :raise CommandTimeoutError: If the server does not answer in time
+        :raise ServerNotRunningError: if the server is not running
+        """
+        return parse_player_list(self.command('list', until=player_list_complete, timeout=timeout))
 
-                # This ugly hack is required because I needed an atomic comparison, so that the code wouldn't try to
-                # access the `proc` variable if it had changed by that point. On top of that, a lock for `proc` should
-                # not be acquired here because `proc.stdout.readline()` is blocking.
+    def _ping_address(self):
+        """
+        :return tuple: (host, port) the server listens on, according to server.properties
+        """
+        properties = self.properties.properties()
+        try:
+            port = int(properties.get('server-port') or PING_DEFAULT_PORT)
+        except ValueError:
+            port = PING_DEFAULT_PORT
+        return properties.get('server-ip') or '127.0.0.1', port
+
+    def _rcon_pool(self):
+        """
+        :return RconPool or None: The RCON connection pool, or None if RCON is not enabled. The pool is replaced when
+                                  the RCON settings change.
+        """
+        properties = self.properties.properties()
+        password = properties.get('rcon.password')
+        if properties.get('enable-rcon') != 'true' or not password:
+            self._close_rcon()
+            return None
 
-                # Line being _set to none indicates that the process is closed.
-                line = self._proc.stdout.readline() \
-                    if self._proc is not None and self._proc.poll() is None \
-                    else None
-                if line is None:
-                    break
+        try:
+            port = int(properties.get('rcon.port') or RCON_DEFAULT_PORT)
+        except ValueError:
+            port = RCON_DEFAULT_PORT
+        key = (properties.get('server-ip') or '127.0.0.1', port, password)
+
+        with self._RCON_LOCK:
+            if self._rcon_key != key:
+                if self._rcon is not None:
+                    self._rcon.close()
+                self._rcon = RconPool(*key)
+                self._rcon_key = key
+            return self._rcon
+
+    def _close_rcon(self):
+        with self._RCON_LOCK:
+            if self._rcon is not None:
+                self._rcon.close()
+            self._rcon = None
+            self._rcon_key = None
 
-                if line != b'':  # Sometimes it reads this and I don't want it
-                    encoded = line.decode('utf-8')
-                    self.console_output.append(encoded)
-                    _LOGGER.debug(encoded)
+    def _download_latest_vanilla_server(self):
+        """
+        Downloads the latest vanilla server into the jar store, unless it is already there, and links it into the server
+        directory. The filename will be the full name of the version.
 
-                    with self.OUTPUT_UPDATE:
-                        self.OUTPUT_UPDATE.notify_all()
+        :returns str: Name of the file
+        :raises IOError: If the download failed
+        """
+        entry = SERVER_LIST.index().latest()[0]
+        _LOGGER.info('Downloading vanilla %s server executable from %s...' % (entry.version, entry.link))
+        self._download(entry)
+        return entry.full_name
 
-        threading.Thread(target=_console_worker).start()
+    def _on_console_line(self, line):
+        """
+        Called by the console reader for every line of output of the server process. Adds the line to the
+        `self.console_output` buffer, the journal and the search index, publishes it to self.EVENTS and feeds it to the
+        console parser and to the command in flight.
 
-    def _start_watchdog_thread(self):
+        :param ConsoleLine line: The line
+        """
+        seq = self.console_output.append(line)
+        try:
+            self.journal.append(seq, line)
+        except OSError as e:
+            _LOGGER.error('Could not write to the console journal: %s' % e)
+        self.search_index.add(seq, line)
+        self.parser.feed(line)
+        self.commands.on_line(line)
+        _LOGGER.debug('[%s] %s' % (line.stream, line.text))
+        self.EVENTS.publish(TOPIC_CONSOLE, (seq, line))
+
+    def _start_exit_watcher_thread(self, proc, exited):
         """
-        Starts the watchdog thread.
+        Starts the exit watcher thread.
+
+        :param Popen proc: Process to watch
+        :param threading.Event exited: Event to set once the process has exited and been released
         """
 
-        def _watchdog_worker():
+        def _exit_watcher():
             """
-            Will call the stop procedure when the server process closes.
+            Blocks on the process until it exits, then releases it and notifies the status change right away. The lock
+            is only taken once the process has exited.
             """
-            while self._proc is not None:
-                if self.status() == ServerStatus.CLOSED:
-                    _LOGGER.debug('[Watchdog] Process is closed; calling stop()')
-                    self.stop()
-                time.sleep(1)
-            _LOGGER.debug('[Watchdog] Quit')
+            return_code = proc.wait()
+
+            with self._PROC_LOCK:
+                if self._killed:
+                    reason = ExitReason.KILLED
+                elif self._stop_requested:
+                    reason = ExitReason.STOPPED
+                elif return_code == 0:
+                    reason = ExitReason.EXITED
+                else:
+                    reason = ExitReason.CRASHED
+
+                self.exit_code = return_code
+                self.exit_reason = reason
+                if self._proc is proc:
+                    self._proc = None
+                    self._start_time = None
+                    self.parser.reset()
+
+            self._close_rcon()
+            self.sessions.end_all(time.time())
+            log = _LOGGER.error if reason == ExitReason.CRASHED else _LOGGER.info
+            log('[Exit watcher] Server %s process exited with code %s (%s)' % (self.id, return_code, reason.value))
+            self._notify_status_change()
+            exited.set()
 
-        threading.Thread(target=_watchdog_worker).start()
+        threading.Thread(target=_exit_watcher, name='exit-watcher-%s' % self.id, daemon=True).start()
 
     def _notify_status_change(self):
         """
-        Notifies all threads waiting on the self.STATUS_CHANGE Condition.
+        Notifies all threads waiting on the self.STATUS_CHANGE Condition and publishes the new status to self.EVENTS.
         """
         with self.STATUS_CHANGE:
             self.STATUS_CHANGE.notify_all()
+        self.EVENTS.publish(TOPIC_STATUS, self.status())
+        self.ping.poke()
 
-    def _on_program_exit(self):
-        """
-        Close the server before exiting the Python interpreter.
+    def _download(self, entry):
         """
-        if self.is_running():
-            _LOGGER.info('Python is exiting: terminating server process.')
-            self.stop()
-
-    def _download(self, link, dest_name):
-        """
-        Downloads a file to the server directory.
+        Downloads a jar into the jar store, unless it is already there, and links it into the server directory. The
+        download is verified against the hash and size in the server list, if it has them.
 
-        :param link: Link to download
-        :param dest_name: Destination name of the file
-        :raises IOError: If download failed after _MAX_DOWNLOAD_ATTEMPTS attempts
+        :param VersionEntry entry: The version
+        :raises IOError: If the download failed
         """
-        for attempt in range(_MAX_DOWNLOAD_ATTEMPTS):
-            try:
-                response = requests.get(link)
-                write_to = os.path.join(os.path.abspath(self.DIR), dest_name)
-                _LOGGER.info('Done. Writing to %s ...' % write_to)
-                with open(write_to, 'wb') as f:
-                    f.write(response.content)
-                return
-            except IOError as e:
-                _LOGGER.error('Could not download server executable. Error: [%s] %s' % (
-                    str(e), '... Retrying' if attempt + 1 < _MAX_DOWNLOAD_ATTEMPTS else ''))
-        raise IOError('Failed to download server executable after %s attempts.' % _MAX_DOWNLOAD_ATTEMPTS)
+        JAR_STORE.fetch(entry.full_name, entry.link, sha1=entry.sha1, size=entry.size)
+        path = JAR_STORE.link(entry.full_name, self.DIR)
+        _LOGGER.info('Done. Linked %s' % path)
 
     def _agree_eula(self):
         """
@@ -377,29 +610,3 @@ class Server:
         """
         if not self.is_running():
             raise ServerNotRunningError('Server needs to be running to do this')
-
-
-_SERVER_DIR = 'server_files'
-if not os.path.exists(_SERVER_DIR):
-    os.mkdir(_SERVER_DIR)
-SERVER = Server(_SERVER_DIR)
-
-# Register the _on_program_exit function to be ran before the Python interpreter quits.
-# noinspection PyProtectedMember
-atexit.register(SERVER._on_program_exit)
-
-if __name__ == '__main__':
-    logging.basicConfig(level=logging.DEBUG)
-    SERVER.start()
-    print('sleep')
-    time.sleep(30)
-    print('end sleep')
-    SERVER.stop()
-
-    import shutil
-
-    shutil.rmtree(SERVER.DIR)
-    SERVER_LIST.delete()
-
-    # noinspection PyProtectedMember
-    assert SERVER._proc is None
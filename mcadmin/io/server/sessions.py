@@ -0,0 +1,195 @@
+"""
+Keeps track of who is online, and of player activity over time.
+"""
+import datetime
+import logging
+import threading
+
+from mcadmin.io.files.files import JsonFileIO
+
+_LOGGER = logging.getLogger(__name__)
+
+# Maximum amount of seconds changes may stay unsaved
+_SAVE_DELAY = 10
+
+# Amount of days daily peaks are kept for
+_DAILY_PEAK_DAYS = 400
+
+# Fields of the rollup file
+_PEAK = 'peak'
+_PEAK_TIME = 'peak_time'
+_DAILY_PEAKS = 'daily_peaks'
+_PLAYERS = 'players'
+
+# Fields of a player's rollup
+_SESSIONS = 'sessions'
+_PLAYTIME = 'playtime'
+_LAST_SESSION = 'last_session'
+_LAST_SEEN = 'last_seen'
+
+
+def _day(timestamp):
+    """
+    >>> _day(0) == datetime.date.fromtimestamp(0).isoformat()
+    True
+    """
+    return datetime.date.fromtimestamp(timestamp).isoformat()
+
+
+class SessionTracker:
+    """
+    Tracks player sessions from the PlayerJoined and PlayerLeft console events.
+
+    Every counter is updated as events arrive, so reading them never requires scanning any logs. The peaks and
+    per-player rollups are saved to a JSON file a few seconds after they change, so that they survive restarts of
+    MCAdmin.
+    """
+
+    def __init__(self, filepath, on_change=None):
+        """
+        :param str filepath: Path of the file to keep the rollups in
+        :param on_change: Function called without arguments whenever someone joins or leaves
+        """
+        self._file = JsonFileIO(filepath)
+        self._on_change = on_change
+        self._LOCK = threading.RLock()
+        self._save_timer = None
+
+        # Player name -> time they joined
+        self._online = {}
+
+        data = self._load()
+        self._peak = data.get(_PEAK, 0)
+        self._peak_time = data.get(_PEAK_TIME)
+        self._daily_peaks = data.get(_DAILY_PEAKS, {})
+        self._players = data.get(_PLAYERS, {})
+
+    def on_join(self, event):
+        """
+        :param PlayerJoined event:
+        """
+        with self._LOCK:
+            self._online[event.player] = event.line.time
+
+            count = len(self._online)
+            day = _day(event.line.time)
+            if count > self._daily_peaks.get(day, 0):
+                self._daily_peaks[day] = count
+            if count > self._peak:
+                self._peak = count
+                self._peak_time = event.line.time
+            self._schedule_save()
+        self._changed()
+
+    def on_leave(self, event):
+        """
+        :param PlayerLeft event:
+        """
+        with self._LOCK:
+            self._end_session(event.player, event.line.time)
+            self._schedule_save()
+        self._changed()
+
+    def end_all(self, timestamp):
+        """
+        Ends the sessions of everyone online. Called when the server stops.
+
+        :param float timestamp: When the server stopped, in seconds since the epoch
+        """
+        with self._LOCK:
+            if not self._online:
+                return
+            for player in list(self._online):
+                self._end_session(player, timestamp)
+            self.save()
+        self._changed()
+
+    def snapshot(self):
+        """
+        :return dict: The current counters:
+            {
+                "online": [<str>],           <- Names of the players online
+                "online_count": <int>,
+                "peak_today": <int>,         <- Most players online at once today
+                "peak": <int>,               <- Most players online at once, ever
+                "peak_time": <float | None>  <- When `peak` was reached, in seconds since the epoch
+            }
+        """
+        with self._LOCK:
+            return {
+                'online': sorted(self._online),
+                'online_count': len(self._online),
+                # Players online since before midnight count towards today's peak, even if nobody joined since
+                'peak_today': max(self._daily_peaks.get(_day(datetime.datetime.now().timestamp()), 0),
+                                  len(self._online)),
+                'peak': self._peak,
+                'peak_time': self._peak_time,
+            }
+
+    def player(self, name):
+        """
+        :param str name: Name of the player
+        :return dict or None: The player's rollup, or None if they were never seen:
+            {
+                "online": <bool>,
+                "sessions": <int>,          <- Amount of finished sessions
+                "playtime": <float>,        <- Total seconds played in finished sessions
+                "last_session": <float>,    <- Length of the last finished session, in seconds
+                "last_seen": <float>        <- When the last session ended, in seconds since the epoch
+            }
+        """
+        with self._LOCK:
+            rollup = self._players.get(name)
+            if rollup is None and name not in self._online:
+                return None
+            result = dict(rollup or {_SESSIONS: 0, _PLAYTIME: 0, _LAST_SESSION: None, _LAST_SEEN: None})
+            result['online'] = name in self._online
+            return result
+
+    def save(self):
+        with self._LOCK:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+
+            # Only keep the most recent daily peaks
+            for day in sorted(self._daily_peaks)[:-_DAILY_PEAK_DAYS]:
+                del self._daily_peaks[day]
+
+            try:
+                self._file.write({
+                    _PEAK: self._peak,
+                    _PEAK_TIME: self._peak_time,
+                    _DAILY_PEAKS: self._daily_peaks,
+                    _PLAYERS: self._players,
+                })
+            except OSError as e:
+                _LOGGER.error('Could not save player sessions: %s' % e)
+
+    def _load(self):
+        try:
+            return self._file.reads()
+        except ValueError as e:
+            _LOGGER.error('Player sessions file is corrupt; starting over: %s' % e)
+            return {}
+
+    def _end_session(self, player, timestamp):
+        joined = self._online.pop(player, None)
+        if joined is None:
+            return
+        duration = max(timestamp - joined, 0)
+        rollup = self._players.setdefault(player, {_SESSIONS: 0, _PLAYTIME: 0})
+        rollup[_SESSIONS] += 1
+        rollup[_PLAYTIME] += duration
+        rollup[_LAST_SESSION] = duration
+        rollup[_LAST_SEEN] = timestamp
+
+    def _schedule_save(self):
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(_SAVE_DELAY, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change()
@@ -22,11 +22,14 @@ login_manager.login_message = 'Please log in'
 
 # Register routes
 # noinspection PyUnresolvedReferences
-from mcadmin.routes import index, register, login, logout
+from mcadmin.routes import index, register, login, logout, jobs
 # noinspection PyUnresolvedReferences
-from mcadmin.routes.panel import console, status, whitelist, banned_players
+from mcadmin.routes.panel import servers, console, status, whitelist, banned_players, search
 # noinspection PyUnresolvedReferences
 from mcadmin.routes.panel.configuration import configuration, versions, properties
+from mcadmin.streaming import STREAM_SERVER
+
+STREAM_SERVER.start()
 
 
 @login_manager.user_loader
@@ -14,11 +14,11 @@ def index():
     This is the landing page of the website.
 
     The end-user should be redirected to the registration page if a password has not been registered for this instance
-    of MCAdmin. If the MCAdmin instance is registered, however, the user will be redirected to the Status Panel page.
+    of MCAdmin. If the MCAdmin instance is registered, however, the user will be redirected to the Servers Panel page.
 
     Naturally, the status panel requires authentication, so the user should be redirected to the login page if they are
-    not yet logged in.
+    not yet logged in. If MCAdmin manages more than one server, the user is shown the list of servers first.
     """
     if not is_registered():
         return redirect(url_for('register'))
-    return redirect(url_for('status_panel'))
+    return redirect(url_for('servers_panel'))
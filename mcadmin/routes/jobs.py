@@ -0,0 +1,96 @@
+"""
+Routes of the background jobs. Jobs are not specific to a server, so the routes are not under /panel/<server_id>/.
+"""
+import json
+
+from flask import request, abort, jsonify, url_for, Response
+from flask_login import login_required
+
+from mcadmin.io.jobs import JOBS, EVENTS, TOPIC_JOB, JobQueueFullError
+from mcadmin.main import app
+from mcadmin.util import sse_message, event_stream
+
+
+def submit_job(key, name, fn, *args, **kwargs):
+    """
+    Runs a function as a background job and responds with the job. See _JobQueue.submit().
+
+    A HTTP 503 Service Unavailable error will be raised if too many jobs are unfinished.
+
+    :return: A HTTP 202 Accepted response with a JSON object of the following schema:
+        "job": <object>   <- The job. See job_status().
+        "url": <str>      <- URL of the job
+        "stream": <str>   <- URL of the event stream of the job
+    """
+    try:
+        job = JOBS.submit(key, name, fn, *args, **kwargs)
+    except JobQueueFullError as e:
+        abort(503, str(e))
+    return jsonify({
+        'job': job.to_dict(),
+        'url': url_for('job_status', job_id=job.id),
+        'stream': url_for('jobs_stream', job=job.id),
+    }), 202
+
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """
+    Responds with a JSON object of the following schema:
+        "id": <str>
+        "name": <str>              <- What the job does
+        "state": <str>             <- {"queued" | "running" | "done" | "failed"}
+        "phase": <str | None>      <- What the job is doing, e.g. "Downloading minecraft_server-1.12.2.jar"
+        "done": <int | None>       <- Amount of work done in the phase, e.g. bytes downloaded
+        "total": <int | None>      <- Amount of work of the phase, if known
+        "eta": <float | None>      <- Estimated seconds left in the phase
+        "error": <str | None>      <- Why the job failed
+        "result": <any>            <- What the job returned, once it is done
+        "created": <float>         <- When the job was submitted, in seconds since the epoch
+        "finished": <float | None> <- When the job finished
+
+    A HTTP 404 Not Found error will be raised if the job is unknown.
+    """
+    job = JOBS.get(job_id)
+    if job is None:
+        abort(404, 'No such job')
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/stream')
+@login_required
+def jobs_stream():
+    """
+    Streams the job every time it changes, in the format of `job_status`. The jobs to follow are given as "job" query
+    arguments; every job is followed if there are none. The current state of the followed jobs is sent first.
+    """
+    return Response(event_stream(EVENTS, JobStream(request.args.getlist('job'))), mimetype='text/event-stream')
+
+
+class JobStream:
+    """
+    Turns job events into the messages of `jobs_stream`.
+    """
+    topics = (TOPIC_JOB,)
+
+    def __init__(self, job_ids):
+        """
+        :param list job_ids: IDs of the jobs to stream. Every job if empty.
+        """
+        self._job_ids = frozenset(job_ids)
+
+    def open(self):
+        if self._job_ids:
+            jobs = [JOBS.get(job_id) for job_id in self._job_ids]
+        else:
+            jobs = JOBS.unfinished()
+        return [sse_message(json.dumps(job.to_dict())) for job in jobs if job is not None]
+
+    def on_batch(self, batch):
+        # A job that changed several times in the batch is sent once, as it is now
+        jobs = {}
+        for _, job in batch:
+            if not self._job_ids or job.id in self._job_ids:
+                jobs[job.id] = job
+        return [sse_message(json.dumps(job.to_dict())) for job in jobs.values()]
@@ -0,0 +1,35 @@
+"""
+The panel routes that manage a server are addressed by the ID of the server instance: /panel/<server_id>/...
+
+The ID is taken out of the view arguments before the view is called and the instance is put in `g.server`, and url_for()
+fills it in from `g.server` when linking to another page of the same server.
+"""
+from flask import g, abort
+
+from mcadmin.io.server.manager import SERVER_MANAGER, ServerNotFoundError
+from mcadmin.main import app
+
+SERVER_ID = 'server_id'
+
+
+@app.url_value_preprocessor
+def _pull_server(endpoint, values):
+    if values is None or SERVER_ID not in values:
+        return
+    try:
+        g.server = SERVER_MANAGER.get(values.pop(SERVER_ID))
+    except ServerNotFoundError:
+        abort(404, 'No such server')
+
+
+@app.url_defaults
+def _add_server_id(endpoint, values):
+    if SERVER_ID in values or g.get('server') is None:
+        return
+    if app.url_map.is_endpoint_expecting(endpoint, SERVER_ID):
+        values[SERVER_ID] = g.server.id
+
+
+@app.context_processor
+def _inject_servers():
+    return {'servers': SERVER_MANAGER.servers(), 'current_server': g.get('server')}
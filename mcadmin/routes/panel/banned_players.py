@@ -1,24 +1,24 @@
-from flask import render_template, flash, redirect, url_for
+from flask import render_template, flash, redirect, url_for, g
 from flask_login import login_required
 
 from mcadmin.exception import PublicError
 from mcadmin.forms.banned_players import BanPlayerForm, PardonPlayerForm
-from mcadmin.io.files.banned_players import BANNED_PLAYERS
+from mcadmin.io.files.banned_players import parse_duration
 from mcadmin.main import app
 
 
-@app.route('/panel/banned_players')
+@app.route('/panel/<server_id>/banned_players')
 @login_required
 def banned_players_panel():
     ban_form = BanPlayerForm()
     pardon_form = PardonPlayerForm()
 
-    ban_list = BANNED_PLAYERS.reads()
+    ban_list = g.server.banned_players.entries()
 
     return render_template('panel/banned_players.html', ban_form=ban_form, pardon_form=pardon_form, ban_list=ban_list)
 
 
-@app.route('/panel/banned_players/ban', methods=['POST'])
+@app.route('/panel/<server_id>/banned_players/ban', methods=['POST'])
 @login_required
 def ban_player():
     ban_form = BanPlayerForm()
@@ -26,16 +26,21 @@ def ban_player():
     if ban_form.validate_on_submit():
         name = ban_form.name.data
         reason = ban_form.reason.data
+        # A permanent ban if no duration is given
+        duration = parse_duration(ban_form.duration.data) if ban_form.duration.data else None
         try:
-            BANNED_PLAYERS.ban(name, reason)
-            flash('User %s banned.' % name)
+            g.server.banned_players.ban(name, reason, duration)
+            if duration is None:
+                flash('User %s banned.' % name)
+            else:
+                flash('User %s banned for %s.' % (name, ban_form.duration.data))
         except PublicError as e:
             flash('Error: ' + str(e))
 
     return redirect(url_for('banned_players_panel'))
 
 
-@app.route('/panel/banned_players/pardon', methods=['POST'])
+@app.route('/panel/<server_id>/banned_players/pardon', methods=['POST'])
 @login_required
 def pardon_player():
     pardon_form = PardonPlayerForm()
@@ -43,7 +48,7 @@ def pardon_player():
     if pardon_form.validate_on_submit():
         name = pardon_form.name.data
         try:
-            BANNED_PLAYERS.pardon(name)
+            g.server.banned_players.pardon(name)
             flash('User %s pardoned.' % name)
         except PublicError as e:
             flash('Error: ' + str(e))
@@ -4,7 +4,7 @@ from flask_login import login_required
 from mcadmin.main import app
 
 
-@app.route('/panel/configuration')
+@app.route('/panel/<server_id>/configuration')
 @login_required
 def configuration_panel():
     """
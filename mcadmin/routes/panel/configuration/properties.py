@@ -1,12 +1,11 @@
-from flask import flash, redirect, url_for, render_template
+from flask import flash, redirect, url_for, render_template, g
 from flask_login import login_required
 
 from mcadmin.forms.config.server_properties import ServerPropertiesForm
-from mcadmin.io.files.server_properties import SERVER_PROPERTIES
 from mcadmin.main import app
 
 
-@app.route('/panel/configuration/properties', methods=['GET', 'POST'])
+@app.route('/panel/<server_id>/configuration/properties', methods=['GET', 'POST'])
 @login_required
 def edit_server_properties():
     """
@@ -16,9 +15,9 @@ def edit_server_properties():
     form = ServerPropertiesForm()
 
     if form.validate_on_submit():
-        SERVER_PROPERTIES.write(form.properties.data)
+        g.server.properties.write(form.properties.data)
         flash('Server properties updated.')
         return redirect(url_for('edit_server_properties'))
 
-    form.properties.data = SERVER_PROPERTIES.reads()
+    form.properties.data = g.server.properties.reads()
     return render_template('panel/config/properties.html', form=form)
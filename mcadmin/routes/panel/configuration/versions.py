@@ -1,25 +1,40 @@
-from flask import render_template, flash
+from flask import render_template, flash, g
 from flask_login import login_required
 
-from mcadmin.config import CONFIG, _F_USE_JAR
 from mcadmin.forms.config.version_form import SetVersionForm
+from mcadmin.io.files.jar_store import JAR_STORE
 from mcadmin.io.files.server_list import SERVER_LIST
-from mcadmin.io.server.server import SERVER
+from mcadmin.io.jobs import JOBS, JobQueueFullError
 from mcadmin.main import app
 
 
-@app.route('/panel/configuration/versions', methods=['GET', 'POST'])
+@app.route('/panel/<server_id>/configuration/versions', methods=['GET', 'POST'])
 @login_required
 def server_versions():
     version_form = SetVersionForm()
-    versions = SERVER_LIST.versions()
+    index = SERVER_LIST.index()
+    job = None
 
     if version_form.is_submitted() and version_form.validate():
-        # Update configuration with the new jar name
-        CONFIG.set_use_jar(version_form.jar_name.data)
-        flash('Server executable _set to be %s. It will be used next time the server boots.' % SERVER.jar)
+        # Update configuration with the new jar name. Versions in the jar store are linked into the directory right
+        # away.
+        g.server.use_jar(version_form.jar_name.data)
+        flash('Server executable _set to be %s. It will be used next time the server boots.' % g.server.jar)
+
+        # Known versions that are not in the jar store are downloaded in the background instead of on the next start
+        if not JAR_STORE.has(g.server.jar) and index.get(g.server.jar):
+            try:
+                job = JOBS.submit(('fetch_jar', g.server.id, g.server.jar), 'Download %s' % g.server.jar,
+                                  g.server.fetch_jar, g.server.jar)
+            except JobQueueFullError as e:
+                flash('Could not download %s: %s' % (g.server.jar, e))
+
+    # Releases newer than the current jar, if the current jar is a known version
+    newer = index.newer_than(g.server.jar) if index.get(g.server.jar) else ()
 
     return render_template('panel/config/server_versions.html',
-                           current_jar=SERVER.jar,
+                           current_jar=g.server.jar,
                            version_form=version_form,
-                           versions=versions)
+                           versions=index.versions,
+                           newer=newer,
+                           job=job)
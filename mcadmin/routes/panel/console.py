@@ -1,18 +1,29 @@
 import logging
+import re
 
-from flask import render_template, Response, request, abort
+from flask import render_template, Response, request, abort, jsonify, g
 from flask_login import login_required
 
 from mcadmin.main import app
-from mcadmin.io.server.server import SERVER, ServerNotRunningError
-from mcadmin.util import require_json
+from mcadmin.io.server.commands import CommandTimeoutError, DEFAULT_TIMEOUT
+from mcadmin.io.server.server import ServerNotRunningError, TOPIC_CONSOLE, TOPIC_STATUS
+from mcadmin.util import require_json, last_event_id, sse_message, event_stream
 
 _LOGGER = logging.getLogger(__name__)
 _SERVER_NOT_RUNNING_ERR_CODE = 'mcadmin:err:server_not_running'
 _MAX_INPUT_LENGTH = 255
 
+# Amount of lines of history rendered into the console page
+_HISTORY_PAGE_SIZE = 100
 
-@app.route('/panel/console', methods=['GET', 'POST'])
+# Maximum amount of lines returned by a single request to the history API
+_MAX_HISTORY_PAGE_SIZE = 1000
+
+# Maximum amount of seconds a request to the command API may wait for a response
+_MAX_COMMAND_TIMEOUT = 30
+
+
+@app.route('/panel/<server_id>/console', methods=['GET', 'POST'])
 @login_required
 def console_panel():
     """
@@ -21,8 +32,12 @@ def console_panel():
     GET:
         Will simply render the console_panel.html template.
         Template arguments:
-            `console_history`: The console output buffer that should be displayed to the user so they can see what went
-            on the console while they were not looking.
+            `console_history`: The last page of the console journal, which should be displayed to the user so they can
+            see what went on the console while they were not looking. Older pages can be loaded from
+            `console_panel_history`.
+            `console_first_id`: Sequence number of the first line in `console_history`.
+            `console_last_id`: Sequence number of the last line in `console_history`. The page resumes the console
+            stream from it so that no line is lost between rendering the page and opening the stream.
 
     POST:
         Receives a JSON object with the following schema:
@@ -37,7 +52,11 @@ def console_panel():
             - "input_line" is over MAX_INPUT_LENGTH characters long
     """
     if request.method == 'GET':
-        return render_template('panel/console.html', console_history=''.join(SERVER.console_output))
+        history = g.server.journal.tail(_HISTORY_PAGE_SIZE)
+        return render_template('panel/console.html',
+                               console_history='\n'.join(line.text for _, line in history),
+                               console_first_id=history[0][0] if history else '',
+                               console_last_id=history[-1][0] if history else g.server.console_output.last_seq)
 
     assert request.method == 'POST'
     require_json()
@@ -52,41 +71,185 @@ def console_panel():
         abort(400, 'Input line must not exceed %d characters.' % _MAX_INPUT_LENGTH)
 
     try:
-        SERVER.input_line(input_line)
+        g.server.input_line(input_line)
     except ServerNotRunningError:
         return 'Server is not running', 409
 
     return '', 204
 
 
-@app.route('/panel/console/stream')
+@app.route('/panel/<server_id>/console/command', methods=['POST'])
+@login_required
+def console_panel_command():
+    """
+    Runs a console command and responds with its output.
+
+    Receives a JSON object with the following schema:
+        "command": <str>    <- Console command to run
+        "match": <str>      <- Optional. Regular expression that the lines of the response match. Without it, every line
+                               read while the command runs is returned.
+        "until": <str>      <- Optional. Regular expression that the last line of the response matches. Without it, the
+                               response ends once the console goes quiet.
+        "timeout": <float>  <- Optional. Maximum amount of seconds to wait. Defaults to DEFAULT_TIMEOUT, and may not
+                               exceed MAX_COMMAND_TIMEOUT.
+
+    Responds with a JSON object of the following schema:
+        "lines": [<str>]    <- The lines of the response, without their log prefix
+
+    A HTTP 409 Conflict response will be returned if the server is not running.
+
+    A HTTP 504 Gateway Timeout response will be returned if the response is not complete within the timeout. It has
+    the same schema, with the lines received until then.
+
+    A HTTP 400 Bad Request error will be raised if:
+        - "command" key is not present or has no value
+        - "command" is over MAX_INPUT_LENGTH characters long
+        - "match" or "until" is not a valid regular expression
+        - "timeout" is not a positive number under MAX_COMMAND_TIMEOUT
+    """
+    require_json()
+    data = request.get_json()
+    assert data is not None
+
+    command = data.get('command')
+    if not command or not isinstance(command, str):
+        abort(400, 'No `command`')
+    elif len(command) > _MAX_INPUT_LENGTH:
+        abort(400, 'Command must not exceed %d characters.' % _MAX_INPUT_LENGTH)
+
+    timeout = data.get('timeout', DEFAULT_TIMEOUT)
+    if not isinstance(timeout, (int, float)) or not 0 < timeout <= _MAX_COMMAND_TIMEOUT:
+        abort(400, 'Timeout must be a positive number of seconds not over %d' % _MAX_COMMAND_TIMEOUT)
+
+    patterns = {}
+    for key in ('match', 'until'):
+        if data.get(key) is not None:
+            try:
+                patterns[key] = re.compile(data[key])
+            except (re.error, TypeError):
+                abort(400, 'Invalid `%s`' % key)
+
+    try:
+        lines = g.server.command(command, timeout=timeout, **patterns)
+    except ServerNotRunningError:
+        return 'Server is not running', 409
+    except CommandTimeoutError as e:
+        return jsonify({'lines': e.messages}), 504
+
+    return jsonify({'lines': lines})
+
+
+@app.route('/panel/<server_id>/console/history')
+@login_required
+def console_panel_history():
+    """
+    Pages through the console journal.
+
+    Query arguments (at most one of `after`, `before`, `since` and `until`):
+        "after": <int>    <- Return the lines after this sequence number
+        "before": <int>   <- Return the lines before this sequence number
+        "since": <float>  <- Return the lines read at or after this time, in seconds since the epoch
+        "until": <float>  <- Return the lines read before this time, in seconds since the epoch
+        "limit": <int>    <- Maximum amount of lines to return. Defaults to HISTORY_PAGE_SIZE.
+
+    If none of them is given, the last page of the journal is returned.
+
+    Responds with a JSON object of the following schema:
+        "lines": [                  <- Oldest first
+            {
+                "id": <int>,        <- Sequence number of the line
+                "time": <float>,    <- When the line was read, in seconds since the epoch
+                "stream": <str>,    <- "stdout" or "stderr"
+                "text": <str>
+            }
+        ]
+
+    A HTTP 400 Bad Request error will be raised if an argument is not a number or more than one position is given.
+    """
+    limit = request.args.get('limit', _HISTORY_PAGE_SIZE, type=int)
+    if limit is None or limit < 0:
+        abort(400, 'Invalid limit')
+    limit = min(limit, _MAX_HISTORY_PAGE_SIZE)
+
+    pagers = {
+        'after': (g.server.journal.after, int),
+        'before': (g.server.journal.before, int),
+        'since': (g.server.journal.since, float),
+        'until': (g.server.journal.until, float),
+    }
+    given = [arg for arg in pagers if arg in request.args]
+    if len(given) > 1:
+        abort(400, 'Only one of %s may be given' % ', '.join(pagers))
+
+    if given:
+        pager, type_ = pagers[given[0]]
+        try:
+            position = type_(request.args[given[0]])
+        except ValueError:
+            abort(400, 'Invalid %s' % given[0])
+        records = pager(position, limit)
+    else:
+        records = g.server.journal.tail(limit)
+
+    return jsonify({
+        'lines': [{'id': seq, 'time': line.time, 'stream': line.stream, 'text': line.text} for seq, line in records]
+    })
+
+
+@app.route('/panel/<server_id>/console/stream')
 @login_required
 def console_panel_stream():
     """
     Returns a Response (type: text/event-stream) to be consumed by an EventSource.
 
-    The Minecraft Server console's messages will be streamed.
-    If the server is not running, SERVER_NOT_RUNNING_ERR_CODE will be streamed instead every 10 seconds.
+    The Minecraft Server console's messages will be streamed. Every message carries the sequence number of its line as
+    its event ID. If the client sends a `Last-Event-ID` (see `last_event_id()`), every line after that ID that is
+    still in the console buffer is replayed first, so a reconnecting client does not miss any lines.
 
+    If the server is not running, SERVER_NOT_RUNNING_ERR_CODE will be streamed instead when the stream opens and every
+    time the server stops.
+
+    Lines are received in batches from the `EVENTS` of the server. If the client falls too far behind, the broker drops
+    it and the stream ends; the EventSource then reconnects and catches up from the console buffer.
     """
+    return Response(event_stream(g.server.EVENTS, ConsoleStream(g.server, last_event_id())),
+                    mimetype='text/event-stream')
 
-    def generator():
-        try:
-            is_first_iter = True
-            while True:
-                with SERVER.OUTPUT_UPDATE:
-                    if SERVER.is_running():
-                        # Do not attempt to send any data in first loop iteration.
-                        # This is because there is usually no data to send.
-                        if not is_first_iter:
-                            yield 'data: ' + str(SERVER.console_output[-1]) + '\n\n'
-                        SERVER.OUTPUT_UPDATE.wait()
-                    else:
-                        yield 'data: ' + _SERVER_NOT_RUNNING_ERR_CODE + '\n\n'
-                        SERVER.OUTPUT_UPDATE.wait()
-                is_first_iter = False
-        except GeneratorExit as e:
-            # This means the user quit the console page
-            _LOGGER.debug('GeneratorExit console_panel_stream: ' + str(e))
-
-    return Response(generator(), mimetype='text/event-stream')
+
+class ConsoleStream:
+    """
+    Turns console events into the messages of `console_panel_stream`.
+    """
+    topics = (TOPIC_CONSOLE, TOPIC_STATUS)
+
+    def __init__(self, server, resume_from=None):
+        """
+        :param Server server: The server to stream the console of
+        :param int resume_from: ID of the last line the client received. If None, only new lines are streamed.
+        """
+        self._server = server
+        self._last_seq = server.console_output.last_seq if resume_from is None else resume_from
+
+    def open(self):
+        messages = []
+        entries = self._server.console_output.since(self._last_seq)
+        for seq, line in entries:
+            messages.append(sse_message(line.text, seq))
+        self._last_seq = entries[-1][0] if entries else min(self._last_seq, self._server.console_output.last_seq)
+
+        if not self._server.is_running():
+            messages.append(sse_message(_SERVER_NOT_RUNNING_ERR_CODE))
+        return messages
+
+    def on_batch(self, batch):
+        messages = []
+        for topic, item in batch:
+            if topic == TOPIC_CONSOLE:
+                seq, line = item
+                # Lines replayed by open() may be received again from the broker.
+                if seq > self._last_seq:
+                    messages.append(sse_message(line.text, seq))
+                    self._last_seq = seq
+            elif not self._server.is_running():
+                messages.append(sse_message(_SERVER_NOT_RUNNING_ERR_CODE))
+        return messages
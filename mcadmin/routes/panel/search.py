@@ -0,0 +1,60 @@
+from flask import render_template, request, abort, jsonify, g
+from flask_login import login_required
+
+from mcadmin.main import app
+
+# Default and maximum amount of lines returned by a search
+_DEFAULT_LIMIT = 50
+_MAX_LIMIT = 500
+
+
+@app.route('/panel/<server_id>/search')
+@login_required
+def search_panel():
+    """
+    Renders the console search page. The searching itself is done by `search_query`.
+    """
+    return render_template('panel/search.html')
+
+
+@app.route('/panel/<server_id>/search/query')
+@login_required
+def search_query():
+    """
+    Searches the console history.
+
+    Query arguments:
+        "q": <str>        <- Space-separated terms that must all be in a line. A term ending in "*" is a prefix.
+        "since": <float>  <- Only match lines read at or after this time, in seconds since the epoch (Optional)
+        "until": <float>  <- Only match lines read before this time, in seconds since the epoch (Optional)
+        "limit": <int>    <- Maximum amount of lines to return (Optional)
+
+    Responds with a JSON object of the following schema:
+        "lines": [                  <- Newest first
+            {
+                "id": <int>,        <- Sequence number of the line
+                "time": <float>,    <- When the line was read, in seconds since the epoch
+                "stream": <str>,    <- "stdout" or "stderr"
+                "text": <str>
+            }
+        ],
+        "indexing": <bool>          <- True if older history is still being indexed, so results may be incomplete
+
+    A HTTP 400 Bad Request error will be raised if "q" is missing or another argument is not a number.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        abort(400, 'No query')
+
+    try:
+        since = float(request.args['since']) if request.args.get('since') else None
+        until = float(request.args['until']) if request.args.get('until') else None
+        limit = min(int(request.args.get('limit', _DEFAULT_LIMIT)), _MAX_LIMIT)
+    except ValueError:
+        abort(400, 'Invalid argument')
+
+    records = g.server.search_index.search(query, since=since, until=until, limit=limit)
+    return jsonify({
+        'lines': [{'id': seq, 'time': line.time, 'stream': line.stream, 'text': line.text} for seq, line in records],
+        'indexing': not g.server.search_index.ready
+    })
@@ -0,0 +1,64 @@
+from flask import render_template, request, abort, redirect, url_for
+from flask_login import login_required
+
+from mcadmin.io.server.manager import SERVER_MANAGER, ServerNotFoundError
+from mcadmin.main import app
+from mcadmin.routes.jobs import submit_job
+from mcadmin.util import require_json
+
+
+@app.route('/panel', methods=['GET', 'POST'])
+@login_required
+def servers_panel():
+    """
+    Lists the server instances, and starts or stops many of them at once.
+
+    GET:
+        Renders the list of servers. If there is only one server, redirects to its status panel instead.
+
+    POST:
+        Will take a JSON object of the following schema:
+            "action": <str>,           <- {"start" | "stop"}
+            "servers": [<str>] | None  <- IDs of the servers to start or stop (Optional). Defaults to every server that
+                                          is not running for "start", and every server that is running for "stop".
+            "jvm_args": <str | None>   <- JVM Arguments used with the "start" action (Optional)
+
+        The servers are started or stopped in parallel, in a background job. Responds with a HTTP 202 Accepted and the
+        job (see submit_job()). The result of the job is a JSON object that maps the ID of each server to null if it
+        started or stopped, or to an error message otherwise.
+
+        A HTTP 400 Bad Request response will be sent if the action is unknown, and a HTTP 404 Not Found if one of the
+        servers does not exist.
+    """
+    if request.method == 'GET':
+        servers = SERVER_MANAGER.servers()
+        if len(servers) == 1:
+            return redirect(url_for('status_panel', server_id=servers[0].id))
+        return render_template('panel/servers.html')
+
+    assert request.method == 'POST'
+    require_json()
+
+    data = request.get_json()
+    assert data is not None
+
+    action = data.get('action')
+    server_ids = data.get('servers')
+    if action not in ('start', 'stop'):
+        abort(400, 'Unknown action')
+    if server_ids is not None:
+        for server_id in server_ids:
+            try:
+                SERVER_MANAGER.get(server_id)
+            except ServerNotFoundError:
+                abort(404, 'No such server: %s' % server_id)
+
+    def run():
+        if action == 'start':
+            errors = SERVER_MANAGER.start_all(server_ids, jvm_params=data.get('jvm_args', ''))
+        else:
+            errors = SERVER_MANAGER.stop_all(server_ids)
+        return {server_id: str(e) if e is not None else None for server_id, e in errors.items()}
+
+    key = (action, tuple(server_ids) if server_ids is not None else None)
+    return submit_job(key, '%s servers' % action.capitalize(), run)
@@ -1,18 +1,18 @@
 import json
 import logging
 
-from flask import render_template, request, abort, Response
+from flask import render_template, request, abort, Response, jsonify, g
 from flask_login import login_required
 
-from mcadmin.config import CONFIG
-from mcadmin.io.server.server import SERVER, ServerAlreadyRunningError, ServerNotRunningError
+from mcadmin.io.server.server import TOPIC_STATUS
 from mcadmin.main import app
-from mcadmin.util import require_json
+from mcadmin.routes.jobs import submit_job
+from mcadmin.util import require_json, sse_message, event_stream
 
 _LOGGER = logging.getLogger(__name__)
 
 
-@app.route('/panel/status', methods=['GET', 'POST'])
+@app.route('/panel/<server_id>/status', methods=['GET', 'POST'])
 @login_required
 def status_panel():
     """
@@ -35,7 +35,11 @@ def status_panel():
 
         Actions:
             "turn_on": Start the server. If the server is already started, it will respond with a HTTP 409 Conflict.
+                       Otherwise it responds with a HTTP 202 Accepted and the job that starts the server, which may
+                       have to download the jar first (see submit_job()).
             "turn_off": Stop the server. If the server is not running, it will respond with a HTTP 409 Conflict.
+                        Otherwise it responds with a HTTP 202 Accepted and the job that stops the server, since the
+                        server may take a while to shut down (see submit_job()).
 
         Optional Keys:
             "jvm_args": Used in conjunction with the "turn_on" action. These JVM arguments will be passed to the server
@@ -66,7 +70,7 @@ def status_panel():
         abort(400, 'Unknown action')
 
 
-@app.route('/panel/status/stream')
+@app.route('/panel/<server_id>/status/stream')
 @login_required
 def status_panel_stream():
     """
@@ -74,57 +78,130 @@ def status_panel_stream():
     {
         "is_server_running": <boolean>,  <- True if the server is running; false otherwise
         "uptime": <int>,                 <- Running time of the server in milliseconds
-        "peak_activity": <int>           <- Highest amounts of simultaneous players connected
+        "peak_activity": <int>,          <- Highest amounts of simultaneous players connected
+        "peak_today": <int>,             <- Highest amounts of simultaneous players connected today
+        "players_online": <int>,         <- Amount of players connected
+        "server_version": <str>,         <- Jar the server runs with
+        "exit_code": <int | None>,       <- Exit code of the last server process, if it exited
+        "exit_reason": <str | None>,     <- Why the last server process exited. See ExitReason.
+        "ping": {                        <- What the server answered to the last Server List Ping, or None if it did
+                                            not answer
+            "latency": <float>,          <- Round trip time in milliseconds
+            "version": <str>,
+            "players_online": <int>,
+            "players_max": <int>,
+            "motd": <str>,
+            "time": <float>              <- When the server answered, in seconds since the epoch
+        }
     }
+
+    Status changes are received in batches from the `EVENTS` of the server, so a burst of changes results in a single
+    message.
+    """
+
+    return Response(event_stream(g.server.EVENTS, StatusStream(g.server)), mimetype='text/event-stream')
+
+
+class StatusStream:
+    """
+    Turns status events into the messages of `status_panel_stream`.
+    """
+    topics = (TOPIC_STATUS,)
+
+    def __init__(self, server):
+        """
+        :param Server server: The server to stream the status of
+        """
+        self._server = server
+
+    def open(self):
+        return [sse_message(json.dumps(status_message(self._server)))]
+
+    def on_batch(self, batch):
+        return self.open()
+
+
+def status_message(server):
     """
+    :param Server server: The server
+    :return dict: The message streamed by `status_panel_stream`.
+    """
+    uptime = server.uptime()
+    if uptime is None:
+        uptime = -1
+    players = server.sessions.snapshot()
+    return {
+        'is_server_running': server.is_running(),
+        'uptime': uptime,
+        'peak_activity': players['peak'],
+        'peak_today': players['peak_today'],
+        'players_online': players['online_count'],
+        'server_version': server.jar,
+        'exit_code': server.exit_code,
+        'exit_reason': server.exit_reason.value if server.exit_reason is not None else None,
+        'ping': ping_message(server)
+    }
+
+
+def ping_message(server):
+    """
+    :param Server server: The server
+    :return dict or None: The `ping` field of the message streamed by `status_panel_stream`
+    """
+    result = server.ping.result
+    if result is None:
+        return None
+    return {
+        'latency': result.latency,
+        'version': result.version,
+        'players_online': result.players_online,
+        'players_max': result.players_max,
+        'motd': result.motd,
+        'time': result.time,
+    }
+
+
+@app.route('/panel/<server_id>/status/players')
+@login_required
+def status_players():
+    """
+    Responds with the player activity counters as a JSON object (see SessionTracker.snapshot()).
 
-    def generator():
-        try:
-            while True:
-                uptime = SERVER.uptime()
-                if uptime is None:
-                    uptime = -1
-                msg = {
-                    'is_server_running': SERVER.is_running(),
-                    'uptime': uptime,
-                    'peak_activity': 0,
-                    'server_version': CONFIG.get_use_jar()
-                }
-                yield 'data: ' + json.dumps(msg) + '\n\n'
-                with SERVER.STATUS_CHANGE:
-                    SERVER.STATUS_CHANGE.wait()
-        except GeneratorExit as e:
-            _LOGGER.debug('GeneratorExit status_panel_stream: ' + str(e))
+    If the "name" query argument is given, responds with that player's session rollup instead (see
+    SessionTracker.player()), or with a HTTP 404 Not Found if the player was never seen.
+    """
+    name = request.args.get('name')
+    if name is None:
+        return jsonify(g.server.sessions.snapshot())
 
-    return Response(generator(), mimetype='text/event-stream')
+    rollup = g.server.sessions.player(name)
+    if rollup is None:
+        abort(404, 'Player not seen')
+    return jsonify(rollup)
 
 
 def turn_on(jvm_args):
     """
-    Turns the server on.
+    Turns the server on in a background job. Submitting it again while it runs responds with the same job.
 
     Returns a HTTP 409 Conflict response if the server is already running.
 
     :param jvm_args: Arguments used in the initialization of the JVM.
-    :return flask.Response: HTTP 204 No Content
+    :return flask.Response: HTTP 202 Accepted with the job
     """
-    try:
-        SERVER.autostart(jvm_params=jvm_args)
-        return Response(status=204)
-    except ServerAlreadyRunningError:
+    if g.server.is_running():
         abort(409, 'Server is already running')
+    return submit_job(('start', g.server.id), 'Start server %s' % g.server.id, g.server.autostart, jvm_params=jvm_args)
 
 
 def turn_off():
     """
-    Turns the server off.
+    Turns the server off in a background job. Submitting it again while it runs responds with the same job.
 
     Returns a HTTP 409 Conflict response if the server is not running.
 
-    :return flask.Response: HTTP 204 No Content
+    :return flask.Response: HTTP 202 Accepted with the job
     """
-    try:
-        SERVER.stop()
-        return Response(status=204)
-    except ServerNotRunningError:
+    if not g.server.is_running():
         abort(409, 'Server is not running')
+    return submit_job(('stop', g.server.id), 'Stop server %s' % g.server.id, g.server.stop)
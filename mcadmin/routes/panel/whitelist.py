@@ -1,22 +1,40 @@
-from flask import render_template, flash, redirect, url_for
+import codecs
+import collections
+import hashlib
+import itertools
+import json
+import os
+
+from flask import render_template, flash, redirect, url_for, g, request, abort, Response, stream_with_context
 from flask_login import login_required
 
 from mcadmin.exception import PublicError
-from mcadmin.forms.whitelist import WhitelistForm
+from mcadmin.forms.whitelist import WhitelistForm, WhitelistImportForm
 from mcadmin.io import mc_profile
-from mcadmin.io.files.whitelist import WHITELIST
+from mcadmin.io.files.whitelist import FORMATS, FORMAT_CSV, FORMAT_TEXT, FORMAT_JSON, MAX_IMPORT_ENTRIES, parse_import
 from mcadmin.main import app
+from mcadmin.routes.jobs import submit_job
+
+# Formats of imports by the content type of the uploaded file, for uploads without a format
+_FORMAT_BY_MIMETYPE = {
+    'text/csv': FORMAT_CSV,
+    'text/plain': FORMAT_TEXT,
+    'application/json': FORMAT_JSON,
+}
+
+_MIMETYPE_BY_FORMAT = {format_: mimetype for mimetype, format_ in _FORMAT_BY_MIMETYPE.items()}
 
 
-@app.route('/panel/whitelist')
+@app.route('/panel/<server_id>/whitelist')
 @login_required
 def whitelist_panel():
     form = WhitelistForm()
-    users = WHITELIST.reads()
-    return render_template('panel/whitelist.html', form=form, users=users)
+    import_form = WhitelistImportForm()
+    users = g.server.whitelist.entries()
+    return render_template('panel/whitelist.html', form=form, import_form=import_form, users=users)
 
 
-@app.route('/panel/whitelist/add', methods=['POST'])
+@app.route('/panel/<server_id>/whitelist/add', methods=['POST'])
 @login_required
 def whitelist_add():
     form = WhitelistForm()
@@ -25,7 +43,7 @@ def whitelist_add():
         name = form.name.data
         try:
             uuid = mc_profile.mc_uuid(name)
-            WHITELIST.add(name, uuid)
+            g.server.whitelist.add(name, uuid)
             flash('%s added to whitelist' % name)
         except PublicError as e:
             flash('Error: ' + str(e))
@@ -33,7 +51,7 @@ def whitelist_add():
     return redirect(url_for('whitelist_panel'))
 
 
-@app.route('/panel/whitelist/remove', methods=['POST'])
+@app.route('/panel/<server_id>/whitelist/remove', methods=['POST'])
 @login_required
 def whitelist_remove():
     form = WhitelistForm()
@@ -41,9 +59,85 @@ def whitelist_remove():
     if form.validate_on_submit():
         name = form.name.data
         try:
-            WHITELIST.remove(name)
+            g.server.whitelist.remove(name)
             flash('%s removed from whitelist' % name)
         except PublicError as e:
             flash('Error: ' + str(e))
 
     return redirect(url_for('whitelist_panel'))
+
+
+@app.route('/panel/<server_id>/whitelist/import', methods=['POST'])
+@login_required
+def whitelist_import():
+    """
+    Adds many players to the whitelist at once.
+
+    The entries are uploaded as the "file" field of a WhitelistImportForm, which carries a CSRF token like every other
+    form. Their format is one of FORMATS, given in the "format" field, or else guessed from the extension or content
+    type of the uploaded file. The upload is parsed in the request; the UUIDs that are not in it are looked up in a
+    background job, which writes the whitelist once. Importing the same entries again while the job runs responds with
+    the same job.
+
+    Responds with a HTTP 202 Accepted and the job (see submit_job()). The result of the job is a JSON object of the
+    following schema:
+        "counts": {<status>: <int>}     <- Amount of entries of every status
+        "results": [{
+            "name": <str>,
+            "uuid": <str or null>,
+            "status": <str>,            <- One of the STATUS_ constants of mcadmin.io.files.whitelist
+            "error": <str or null>
+        }]
+
+    A HTTP 400 Bad Request error will be raised if the form is not valid (e.g. its CSRF token is missing), the format
+    is unknown, or the entries cannot be parsed or are more than MAX_IMPORT_ENTRIES.
+    """
+    form = WhitelistImportForm()
+    if not form.validate_on_submit():
+        abort(400, 'Invalid import form: %s' % '; '.join(error for errors in form.errors.values() for error in errors))
+
+    upload = form.file.data
+    format_ = form.format.data
+    if not format_:
+        format_ = os.path.splitext(upload.filename or '')[1].lstrip('.').lower()
+    if not format_:
+        format_ = _FORMAT_BY_MIMETYPE.get(upload.mimetype)
+    if format_ not in FORMATS:
+        abort(400, 'Format must be one of: %s' % ', '.join(FORMATS))
+
+    stream = codecs.getreader('utf-8-sig')(upload.stream)
+    try:
+        players = list(itertools.islice(parse_import(stream, format_), MAX_IMPORT_ENTRIES + 1))
+    except ValueError as e:
+        abort(400, 'Could not import: %s' % e)
+    if len(players) > MAX_IMPORT_ENTRIES:
+        abort(400, 'Could not import: an import may not have more than %d entries' % MAX_IMPORT_ENTRIES)
+
+    whitelist = g.server.whitelist
+
+    def run():
+        report = whitelist.import_players(players)
+        counts = collections.Counter(result['status'] for result in report)
+        return {'counts': counts, 'results': report}
+
+    digest = hashlib.sha1(json.dumps(players).encode('utf-8')).hexdigest()
+    return submit_job(('whitelist_import', g.server.id, digest), 'Import %d players into the whitelist of %s'
+                      % (len(players), g.server.id), run)
+
+
+@app.route('/panel/<server_id>/whitelist/export')
+@login_required
+def whitelist_export():
+    """
+    Downloads the whitelist in the format of the "format" query argument, one of FORMATS. Defaults to CSV.
+
+    A HTTP 400 Bad Request error will be raised if the format is unknown.
+    """
+    format_ = request.args.get('format', FORMAT_CSV)
+    if format_ not in FORMATS:
+        abort(400, 'Format must be one of: %s' % ', '.join(FORMATS))
+
+    filename = 'whitelist-%s.%s' % (g.server.id, format_)
+    return Response(stream_with_context(g.server.whitelist.export(format_)),
+                    mimetype=_MIMETYPE_BY_FORMAT[format_],
+                    headers={'Content-Disposition': 'attachment; filename="%s"' % filename})
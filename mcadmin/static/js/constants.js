@@ -2,8 +2,11 @@ HIDDEN = 'hidden';
 NOT_APPLICABLE = 'N/A';
 MA_CONSTS = {
     SERVER_SHUTDOWN_ERR_CODE: 'mcadmin:err:server_not_running',
-    CONSOLE_PANEL_STREAM: '/panel/console/stream',
-    STATUS_PANEL_STREAM: '/panel/status/stream',
+    // Paths of the streams of the server the page is about. Set by panel/_template.html.
+    CONSOLE_PANEL_STREAM: '',
+    STATUS_PANEL_STREAM: '',
+    // Origin of the asyncio streaming tier. Empty if the streams should be opened on the origin of the page.
+    STREAM_ORIGIN: '',
     EVENTSOURCE_DISCONNECT_MSG: 'The EventSource was closed due to an error. This could mean that you lost connection' +
         ' to the console or that the server administration software was shut down.',
 };
@@ -0,0 +1,81 @@
+/**
+ * Follows a background job until it finishes.
+ *
+ * @param {Object} submitted The response of a route that submitted the job: {job, url, stream}
+ * @param {function(Object)} onChange Called with the job every time it changes
+ * @param {function(Object)} onFinish Called with the job once it is done or failed
+ */
+function watchJob(submitted, onChange, onFinish) {
+    var finished = false;
+
+    function update(job) {
+        if (finished) {
+            return;
+        }
+        onChange(job);
+        if (job['state'] === 'done' || job['state'] === 'failed') {
+            finished = true;
+            onFinish(job);
+        }
+    }
+
+    update(submitted['job']);
+    if (finished) {
+        return;
+    }
+
+    var eventSource = new EventSource(MA_CONSTS.STREAM_ORIGIN + submitted['stream'], {withCredentials: true});
+
+    eventSource.onmessage = function (msg) {
+        update(JSON.parse(msg.data));
+        if (finished) {
+            this.close();
+        }
+    };
+
+    eventSource.onerror = function () {
+        this.close();
+        pollJob(submitted['url'], update, function () {
+            return finished;
+        });
+    };
+}
+
+/**
+ * Polls a job every second, for when its event stream is closed.
+ */
+function pollJob(url, update, isFinished) {
+    var xhr = new XMLHttpRequest();
+    xhr.open('GET', url, true);
+
+    xhr.onreadystatechange = function () {
+        if (xhr.readyState !== 4) {
+            return;
+        }
+        if (xhr.status === 200) {
+            update(JSON.parse(xhr.responseText));
+        }
+        if (!isFinished() && xhr.status !== 404) {
+            setTimeout(function () {
+                pollJob(url, update, isFinished);
+            }, 1000);
+        }
+    };
+
+    xhr.send();
+}
+
+/**
+ * @param {Object} job
+ * @return {string} What the job is doing, e.g. "Downloading minecraft_server-1.12.2.jar: 42% (about 10 s left)"
+ */
+function describeJob(job) {
+    var text = job['phase'] || job['name'];
+    if (job['total']) {
+        text += ': ' + Math.floor(100 * job['done'] / job['total']) + '%';
+    }
+    if (job['eta'] !== null) {
+        text += ' (about ' + Math.ceil(job['eta']) + ' s left)';
+    }
+    return text;
+}
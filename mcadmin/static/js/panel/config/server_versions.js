@@ -13,8 +13,29 @@ var jarInputInput;
     useSnapshotCheckbox.addEventListener('change', onUseSnapshotCheckboxChange);
     useCustomCheckbox.addEventListener('change', onUseCustomCheckboxChange);
     jarInputInput.addEventListener('change', onJarInputInputChange);
+    initDownloadProgress();
 })();
 
+/**
+ * Shows the progress of the download of the version that was just set, if it is not in the jar store.
+ */
+function initDownloadProgress() {
+    var downloadParagraph = document.getElementById('version-download');
+    if (!downloadParagraph) {
+        return;
+    }
+
+    watchJob({
+        'job': JSON.parse(downloadParagraph.dataset.job),
+        'url': downloadParagraph.dataset.url,
+        'stream': downloadParagraph.dataset.stream
+    }, function (job) {
+        downloadParagraph.innerText = describeJob(job);
+    }, function (job) {
+        downloadParagraph.innerText = job['state'] === 'done' ? job['name'] + ': done' : 'Error: ' + job['error'];
+    });
+}
+
 /**
  * @this HTMLSelectElement
  * @param {Event} ev
@@ -2,23 +2,30 @@
 
 var consoleBox; // TextArea
 var consoleInput;
+var loadOlderBtn;
 
 (function () {
     consoleBox = document.getElementById('console-box');
     consoleInput = document.getElementById('console-input');
+    loadOlderBtn = document.getElementById('console-load-older');
     initEventSource();
     initConsoleInput();
+    initLoadOlderBtn();
 
     // Strip spaces around console text
     consoleBox.value = consoleBox.value.trim();
 })();
 
 function initEventSource() {
-    var eventSource = new EventSource(MA_CONSTS.CONSOLE_PANEL_STREAM);
+    // Resume right after the last line rendered into the console box. When the EventSource reconnects by itself, the
+    // browser sends the ID of the last line it received in the Last-Event-ID header, which takes precedence.
+    var url = MA_CONSTS.STREAM_ORIGIN + MA_CONSTS.CONSOLE_PANEL_STREAM
+        + '?last_event_id=' + encodeURIComponent(consoleBox.dataset.lastId);
+    var eventSource = new EventSource(url, {withCredentials: true});
 
     eventSource.onerror = function () {
+        // Do not close the EventSource: it reconnects on its own and the server replays the lines we missed.
         console.error(MA_CONSTS.EVENTSOURCE_DISCONNECT_MSG);
-        this.close();
     };
 
     eventSource.onmessage = function (msg) {
@@ -63,4 +70,39 @@ function initConsoleInput() {
             return false;
         }
     });
-}
\ No newline at end of file
+}
+function initLoadOlderBtn() {
+    if (!loadOlderBtn.dataset.firstId) {
+        loadOlderBtn.classList.add(HIDDEN);
+        return;
+    }
+
+    loadOlderBtn.addEventListener('click', function () {
+        var xhr = new XMLHttpRequest();
+        xhr.open('GET', loadOlderBtn.dataset.url + '?before=' + encodeURIComponent(loadOlderBtn.dataset.firstId), true);
+
+        xhr.onreadystatechange = function () {
+            if (xhr.readyState !== 4) {
+                return;
+            }
+            if (xhr.status !== 200) {
+                console.error('Could not load console history. XHR Status: ' + xhr.status);
+                return;
+            }
+
+            var lines = JSON.parse(xhr.responseText)['lines'];
+            if (lines.length === 0) {
+                loadOlderBtn.classList.add(HIDDEN);
+                return;
+            }
+
+            var text = lines.map(function (line) {
+                return line['text'];
+            }).join('\n');
+            consoleBox.value = text + '\n' + consoleBox.value;
+            loadOlderBtn.dataset.firstId = lines[0]['id'];
+        };
+
+        xhr.send();
+    });
+}
@@ -0,0 +1,75 @@
+var searchForm,
+    searchTerms,
+    searchSince,
+    searchUntil,
+    searchStatus,
+    searchResults;
+
+(function () {
+    searchForm = document.getElementById('search-form');
+    searchTerms = document.getElementById('search-terms');
+    searchSince = document.getElementById('search-since');
+    searchUntil = document.getElementById('search-until');
+    searchStatus = document.getElementById('search-status');
+    searchResults = document.getElementById('search-results');
+    searchForm.addEventListener('submit', onSearchFormSubmit);
+})();
+
+/**
+ * @param {HTMLInputElement} input A datetime-local input
+ * @returns {string} Seconds since the epoch, or an empty string if the input is empty
+ */
+function epochSeconds(input) {
+    return input.value ? String(new Date(input.value).getTime() / 1000) : '';
+}
+
+/**
+ * @param {Event} ev
+ */
+function onSearchFormSubmit(ev) {
+    ev.preventDefault();
+
+    var params = 'q=' + encodeURIComponent(searchTerms.value);
+    var since = epochSeconds(searchSince);
+    var until = epochSeconds(searchUntil);
+    if (since) params += '&since=' + since;
+    if (until) params += '&until=' + until;
+
+    var xhr = new XMLHttpRequest();
+    xhr.open('GET', searchForm.dataset.url + '?' + params, true);
+
+    xhr.onreadystatechange = function () {
+        if (xhr.readyState !== 4) {
+            return;
+        }
+        if (xhr.status !== 200) {
+            searchStatus.innerText = 'Search failed (' + xhr.status + ')';
+            return;
+        }
+        showResults(JSON.parse(xhr.responseText));
+    };
+
+    searchStatus.innerText = 'Searching...';
+    xhr.send();
+}
+
+function showResults(data) {
+    var lines = data['lines'];
+
+    searchStatus.innerText = lines.length + ' line(s) found.';
+    if (data['indexing']) {
+        searchStatus.innerText += ' Older history is still being indexed; results may be incomplete.';
+    }
+
+    searchResults.innerHTML = '';
+    lines.forEach(function (line) {
+        var row = document.createElement('tr');
+        var time = document.createElement('td');
+        var text = document.createElement('td');
+        time.innerText = new Date(line['time'] * 1000).toLocaleString();
+        text.innerText = line['text'];
+        row.appendChild(time);
+        row.appendChild(text);
+        searchResults.appendChild(row);
+    });
+}
@@ -0,0 +1,49 @@
+var statusParagraph;
+
+(function () {
+    statusParagraph = document.getElementById('servers-status');
+    initActionBtn(document.getElementById('servers-start'), 'start', 'Starting servers...');
+    initActionBtn(document.getElementById('servers-stop'), 'stop', 'Stopping servers...');
+})();
+
+function initActionBtn(btn, action, progressText) {
+    btn.addEventListener('click', function () {
+        var xhr = new XMLHttpRequest();
+        xhr.open('POST', btn.dataset.url, true);
+        xhr.setRequestHeader('Content-Type', 'application/json');
+
+        xhr.onreadystatechange = function () {
+            if (xhr.readyState !== 4) {
+                return;
+            }
+            if (xhr.status !== 202) {
+                statusParagraph.innerText = 'Error: XHR Status ' + xhr.status;
+                return;
+            }
+
+            watchJob(JSON.parse(xhr.responseText), function (job) {
+                statusParagraph.innerText = describeJob(job);
+            }, function (job) {
+                if (job['state'] === 'failed') {
+                    statusParagraph.innerText = 'Error: ' + job['error'];
+                    return;
+                }
+
+                var errors = job['result'];
+                var failed = Object.keys(errors).filter(function (serverId) {
+                    return errors[serverId] !== null;
+                });
+                if (failed.length === 0) {
+                    window.location.reload();
+                } else {
+                    statusParagraph.innerText = failed.map(function (serverId) {
+                        return serverId + ': ' + errors[serverId];
+                    }).join('\n');
+                }
+            });
+        };
+
+        statusParagraph.innerText = progressText;
+        xhr.send(JSON.stringify({'action': action}));
+    });
+}
@@ -3,7 +3,10 @@ var isServerOn,
     serverStatusSpan,
     uptimeSpan,
     peakActivitySpan,
-    serverVersionSpan;
+    playersOnlineSpan,
+    serverVersionSpan,
+    pingSpan,
+    serverJobParagraph;
 
 /**
  * @param seconds
@@ -34,14 +37,17 @@ var uptime = new Uptime(-1);
     serverStatusSpan = document.getElementById('server-status');
     uptimeSpan = document.getElementById('uptime');
     peakActivitySpan = document.getElementById('peak-activity');
+    playersOnlineSpan = document.getElementById('players-online');
     serverVersionSpan = document.getElementById('server-version');
+    pingSpan = document.getElementById('ping');
+    serverJobParagraph = document.getElementById('server-job');
     initEventSource();
     initServerSwitchBtnListener();
     initUptimeCounter();
 })();
 
 function initEventSource() {
-    var eventSource = new EventSource(MA_CONSTS.STATUS_PANEL_STREAM);
+    var eventSource = new EventSource(MA_CONSTS.STREAM_ORIGIN + MA_CONSTS.STATUS_PANEL_STREAM, {withCredentials: true});
 
     eventSource.onerror = function () {
         console.error(MA_CONSTS.EVENTSOURCE_DISCONNECT_MSG);
@@ -53,6 +59,7 @@ function initEventSource() {
         var isServerRunning = data['is_server_running'];
         var peakActivity = data['peak_activity'];
         var serverVersion = data['server_version'];
+        var exitReason = data['exit_reason'];
 
         uptime.setSeconds(data['uptime']);
 
@@ -62,6 +69,9 @@ function initEventSource() {
         } else {
             serverSwitchBtn.innerText = 'Turn ON';
             serverStatusSpan.innerText = 'OFF';
+            if (exitReason) {
+                serverStatusSpan.innerText += ' (' + exitReason + ', exit code ' + data['exit_code'] + ')';
+            }
         }
 
         if (serverVersion) {
@@ -71,7 +81,15 @@ function initEventSource() {
         }
 
         isServerOn = isServerRunning;
-        peakActivitySpan.innerText = peakActivity;
+        peakActivitySpan.innerText = peakActivity + ' (today: ' + data['peak_today'] + ')';
+        playersOnlineSpan.innerText = data['players_online'];
+
+        var ping = data['ping'];
+        if (ping) {
+            pingSpan.innerText = 'Yes (' + Math.round(ping['latency']) + ' ms) ' + ping['motd'];
+        } else {
+            pingSpan.innerText = 'No';
+        }
     }
 }
 
@@ -86,6 +104,15 @@ function initServerSwitchBtnListener() {
             if (xhr.readyState === 4) {
                 console.log('XHR Status: ' + xhr.status);
                 console.log('XHR Response Text: ' + xhr.responseText);
+                if (xhr.status === 202) {
+                    // Starting and stopping the server run as jobs: starting may have to download the jar first,
+                    // and stopping waits for the server to shut down
+                    watchJob(JSON.parse(xhr.responseText), function (job) {
+                        serverJobParagraph.innerText = describeJob(job);
+                    }, function (job) {
+                        serverJobParagraph.innerText = job['state'] === 'failed' ? 'Error: ' + job['error'] : '';
+                    });
+                }
             }
         };
 
@@ -0,0 +1,49 @@
+(function () {
+    var form = document.getElementById('whitelist-import');
+    var statusParagraph = document.getElementById('whitelist-import-status');
+
+    form.addEventListener('submit', function (event) {
+        event.preventDefault();
+
+        var xhr = new XMLHttpRequest();
+        xhr.open('POST', form.action, true);
+
+        xhr.onreadystatechange = function () {
+            if (xhr.readyState !== 4) {
+                return;
+            }
+            if (xhr.status !== 202) {
+                statusParagraph.innerText = 'Error: XHR Status ' + xhr.status;
+                return;
+            }
+
+            watchJob(JSON.parse(xhr.responseText), function (job) {
+                statusParagraph.innerText = describeJob(job);
+            }, function (job) {
+                if (job['state'] === 'failed') {
+                    statusParagraph.innerText = 'Error: ' + job['error'];
+                    return;
+                }
+
+                var report = job['result'];
+                var summary = Object.keys(report.counts).map(function (status) {
+                    return status + ': ' + report.counts[status];
+                }).join(', ');
+                var problems = report.results.filter(function (result) {
+                    return result.status !== 'added';
+                }).map(function (result) {
+                    return result.name + ': ' + result.status + (result.error ? ' (' + result.error + ')' : '');
+                });
+
+                if (report.counts.added && problems.length === 0) {
+                    window.location.reload();
+                } else {
+                    statusParagraph.innerText = [summary].concat(problems).join('\n');
+                }
+            });
+        };
+
+        statusParagraph.innerText = 'Importing...';
+        xhr.send(new FormData(form));
+    });
+})();
@@ -0,0 +1,270 @@
+"""
+An asyncio streaming tier for the Server-Sent Event routes.
+
+The Flask `/stream` routes pin one worker thread per open EventSource for as long as the page stays open. This module
+serves the same streams from a single event loop thread on a separate port (see `Config.get_stream_port()`), where an
+idle connection costs a coroutine instead of a thread. Pages connect to it when it is running and fall back to the Flask
+routes otherwise.
+
+Requests are authenticated with the same session and remember cookies that Flask-Login uses, by running
+`login_required` inside a Flask request context built from the incoming request.
+"""
+import asyncio
+import ipaddress
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from flask import request, g
+from flask_login import login_required
+from werkzeug.exceptions import HTTPException
+
+from mcadmin.config import CONFIG
+from mcadmin.io import jobs
+from mcadmin.io.server.broker import SubscriptionClosedError
+from mcadmin.io.server.manager import SERVER_MANAGER
+from mcadmin.main import app
+from mcadmin.routes.jobs import JobStream
+from mcadmin.routes.panel.console import ConsoleStream
+from mcadmin.routes.panel.status import StatusStream
+from mcadmin.util import last_event_id, SSE_KEEPALIVE, SSE_KEEPALIVE_SECONDS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Channel of the events of the background jobs. The channel of the events of a server is its ID.
+_JOBS_CHANNEL = ('jobs',)
+
+# Streams served by the tier, by the endpoint of the Flask route they mirror: (channel, stream factory)
+_STREAMS = {
+    'console_panel_stream': (lambda: g.server.id, lambda: ConsoleStream(g.server, last_event_id())),
+    'status_panel_stream': (lambda: g.server.id, lambda: StatusStream(g.server)),
+    'jobs_stream': (lambda: _JOBS_CHANNEL, lambda: JobStream(request.args.getlist('job'))),
+}
+
+# Maximum amount of time to wait for a client to send its request headers
+_REQUEST_TIMEOUT_SECONDS = 10
+
+# Maximum amount of event batches queued for a client before it is considered too slow and disconnected
+_CLIENT_QUEUE_SIZE = 256
+
+# Maximum amount of pending connections
+_BACKLOG = 1024
+
+# Maximum amount of time start() waits for the tier to bind its port
+_START_TIMEOUT_SECONDS = 5
+
+
+def _is_authorized():
+    """
+    :return bool: True if the request in the current request context would be let through by `login_required`.
+    """
+    try:
+        return login_required(lambda: True)() is True
+    except HTTPException:
+        return False
+
+
+def _is_loopback(host):
+    """
+    >>> _is_loopback('127.0.0.1'), _is_loopback('localhost'), _is_loopback('::1'), _is_loopback('0.0.0.0')
+    (True, True, True, False)
+    >>> _is_loopback('example.com')
+    False
+    """
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class _Client:
+    def __init__(self, task, channel):
+        self.task = task
+        self.channel = channel
+        self.queue = asyncio.Queue(_CLIENT_QUEUE_SIZE)
+
+
+class StreamServer:
+    """
+    Serves the streams in _STREAMS from an asyncio event loop running on its own thread.
+
+    A single subscription to each broker feeds every client of its channel: the `EVENTS` of each server for the streams
+    of that server, and the job events for the job streams. Batches received from the broker are handed to the event
+    loop and copied into each client's bounded queue.
+    """
+
+    def __init__(self):
+        self._loop = None  # type: asyncio.AbstractEventLoop or None
+        # Channel -> set of _Client
+        self._clients = {}
+        self._started = threading.Event()
+        self.running = False
+
+    def start(self):
+        """
+        Starts the tier on the host and port set in the config. Does nothing if the tier is disabled.
+        If the port cannot be bound, an error is logged and the pages keep using the Flask routes.
+        """
+        port = CONFIG.get_stream_port()
+        if port is None:
+            _LOGGER.info('Streaming tier is disabled.')
+            return
+
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._serve, args=(CONFIG.get_stream_host(), port), name='stream-server',
+                         daemon=True).start()
+        self._started.wait(_START_TIMEOUT_SECONDS)
+
+    def origin_for(self, req):
+        """
+        :param req: The Flask request of the page that is going to open a stream
+        :return str or None: The origin that the page should open its streams at, or None if the page should use the
+                             Flask routes.
+        """
+        # Browsers refuse to open plain HTTP streams from HTTPS pages.
+        if not self.running or req.is_secure:
+            return None
+        hostname = urlsplit('//' + req.host).hostname
+        # A tier bound to the loopback interface cannot be reached by remote pages.
+        if _is_loopback(CONFIG.get_stream_host()) and not _is_loopback(hostname):
+            return None
+        if ':' in hostname:
+            hostname = '[%s]' % hostname
+        return 'http://%s:%d' % (hostname, CONFIG.get_stream_port())
+
+    def _serve(self, host, port):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(asyncio.start_server(self._handle, host, port, backlog=_BACKLOG))
+        except OSError as e:
+            _LOGGER.error('Could not start the streaming tier on %s:%d: %s' % (host, port, e))
+            self._started.set()
+            return
+
+        brokers = [(server.id, server.EVENTS) for server in SERVER_MANAGER.servers()] + [(_JOBS_CHANNEL, jobs.EVENTS)]
+        for channel, broker in brokers:
+            threading.Thread(target=self._bridge_worker, args=(channel, broker), name='stream-bridge-%s' % (channel,),
+                             daemon=True).start()
+        _LOGGER.info('Streaming tier listening on %s:%d' % (host, port))
+        self.running = True
+        self._started.set()
+        self._loop.run_forever()
+
+    def _bridge_worker(self, channel, broker):
+        """
+        Hands the batches published to the broker of a channel over to the event loop.
+        """
+        while True:
+            with broker.subscribe() as sub:
+                try:
+                    while True:
+                        self._loop.call_soon_threadsafe(self._dispatch, channel, sub.get())
+                except SubscriptionClosedError:
+                    # The event loop is not keeping up. Clients will reconnect and catch up by themselves.
+                    _LOGGER.warning('Streaming tier fell behind; disconnecting all clients of %s.' % (channel,))
+                    self._loop.call_soon_threadsafe(self._drop_all, channel)
+
+    def _dispatch(self, channel, batch):
+        for client in list(self._clients.get(channel, ())):
+            try:
+                client.queue.put_nowait(batch)
+            except asyncio.QueueFull:
+                _LOGGER.warning('Stream client is too slow; disconnecting it.')
+                self._drop(client)
+
+    def _drop(self, client):
+        self._clients.get(client.channel, set()).discard(client)
+        client.task.cancel()
+
+    def _drop_all(self, channel):
+        for client in list(self._clients.get(channel, ())):
+            self._drop(client)
+
+    async def _handle(self, reader, writer):
+        client = None
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), _REQUEST_TIMEOUT_SECONDS)
+            request_line, *header_lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = request_line.split(' ', 2)
+            headers = [tuple(x.strip() for x in line.split(':', 1)) for line in header_lines if ':' in line]
+
+            with app.test_request_context(target, method=method, headers=headers):
+                entry = _STREAMS.get(request.url_rule.endpoint) if request.url_rule is not None else None
+                if entry is None or method != 'GET':
+                    await self._respond(writer, '404 Not Found')
+                    return
+                if not _is_authorized():
+                    await self._respond(writer, '401 Unauthorized')
+                    return
+                try:
+                    # Puts the server addressed by the URL in `g.server`, as it does for the Flask routes.
+                    app.preprocess_request()
+                except HTTPException:
+                    await self._respond(writer, '404 Not Found')
+                    return
+                cors = self._cors_headers(request)
+
+                # Register before opening the stream, so that no event published in between is missed.
+                channel, factory = entry
+                client = _Client(asyncio.current_task(), channel())
+                self._clients.setdefault(client.channel, set()).add(client)
+                stream = factory()
+                opening = stream.open()
+
+            await self._respond(writer, '200 OK', cors + [
+                ('Content-Type', 'text/event-stream'),
+                ('Cache-Control', 'no-cache'),
+            ], ''.join(opening))
+
+            topics = set(stream.topics)
+            while True:
+                try:
+                    batch = await asyncio.wait_for(client.queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(SSE_KEEPALIVE.encode())
+                else:
+                    events = [e for e in batch if e[0] in topics]
+                    if events:
+                        writer.write(''.join(stream.on_batch(events)).encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            # Malformed or incomplete request
+            pass
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            if client is not None:
+                self._clients[client.channel].discard(client)
+            writer.close()
+
+    @staticmethod
+    def _cors_headers(req):
+        """
+        Pages are served by Flask on another port, which makes them a different origin. Only pages served from the same
+        host as the tier are allowed to read the streams.
+        """
+        origin = req.headers.get('Origin')
+        if origin is None or urlsplit(origin).hostname != urlsplit('//' + req.host).hostname:
+            return []
+        return [
+            ('Access-Control-Allow-Origin', origin),
+            ('Access-Control-Allow-Credentials', 'true'),
+            ('Vary', 'Origin'),
+        ]
+
+    @staticmethod
+    async def _respond(writer, status, headers=(), body=''):
+        head = 'HTTP/1.1 %s\r\nConnection: close\r\n' % status
+        head += ''.join('%s: %s\r\n' % header for header in headers)
+        writer.write((head + '\r\n' + body).encode())
+        await writer.drain()
+
+
+STREAM_SERVER = StreamServer()
+
+
+@app.context_processor
+def _inject_stream_origin():
+    return {'stream_origin': STREAM_SERVER.origin_for(request)}
@@ -1,7 +1,18 @@
 # mcadmin/util.py
+import logging
 
 from flask import request, abort
 
+from mcadmin.io.server.broker import SubscriptionClosedError
+
+_LOGGER = logging.getLogger(__name__)
+
+# A Server-Sent Events comment. Sent periodically on idle streams so that closed connections are noticed.
+SSE_KEEPALIVE = ': keepalive\n\n'
+
+# Amount of seconds an idle event stream waits before sending SSE_KEEPALIVE
+SSE_KEEPALIVE_SECONDS = 15
+
 
 def require_json():
     """
@@ -9,3 +20,66 @@ def require_json():
     """
     if not request.is_json:
         abort(400, 'Expected JSON')
+
+
+def last_event_id():
+    """
+    Returns the ID of the last Server-Sent Event the client received, as an integer.
+
+    Browsers send it in the `Last-Event-ID` header when an EventSource reconnects. Pages may also pass it in the
+    `last_event_id` query argument when they first open the stream.
+
+    :return int or None: The ID, or None if the client did not send one or sent an invalid one.
+    """
+    value = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def sse_message(data, event_id=None):
+    """
+    Formats a Server-Sent Event.
+
+    :param str data: Event data. May span multiple lines.
+    :param event_id: ID of the event, if any
+    :return str: The formatted event
+
+    >>> sse_message('hello', 3)
+    'id: 3\\ndata: hello\\n\\n'
+    >>> sse_message('a\\nb')
+    'data: a\\ndata: b\\n\\n'
+    """
+    msg = '' if event_id is None else 'id: %s\n' % event_id
+    for line in data.split('\n'):
+        msg += 'data: ' + line + '\n'
+    return msg + '\n'
+
+
+def event_stream(broker, stream):
+    """
+    Generator of Server-Sent Events to be used as the body of a text/event-stream Response.
+
+    :param Broker broker: Broker to receive events from
+    :param stream: Object that turns events into Server-Sent Events. It must have:
+                    `topics`: The topics to subscribe to
+                    `open()`: Returns the messages to send as soon as the stream opens
+                    `on_batch(batch)`: Returns the messages to send for a batch of events received from the broker
+    """
+    name = type(stream).__name__
+    try:
+        # Subscribe before opening the stream, so that no event published in between is missed.
+        with broker.subscribe(stream.topics) as sub:
+            yield from stream.open()
+            while True:
+                batch = sub.get(SSE_KEEPALIVE_SECONDS)
+                if batch is None:
+                    yield SSE_KEEPALIVE
+                else:
+                    yield from stream.on_batch(batch)
+    except SubscriptionClosedError:
+        _LOGGER.debug('%s subscriber fell behind; closing stream' % name)
+    except GeneratorExit as e:
+        # This means the user left the page
+        _LOGGER.debug('GeneratorExit %s: %s' % (name, e))